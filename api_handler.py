@@ -1,347 +1,988 @@
-import requests
-import json
-from datetime import datetime # Per formattare la data dell'ultimo aggiornamento
-
-COINGECKO_API_BASE_URL = "https://api.coingecko.com/api/v3"
-
-def get_asset_price(asset_id, currency):
-    """
-    Recupera il prezzo corrente, la variazione 24h, il volume 24h 
-    e l'ultimo aggiornamento per un dato asset_id e valuta.
-    """
-    url = f"{COINGECKO_API_BASE_URL}/simple/price"
-    params = {
-        'ids': asset_id,
-        'vs_currencies': currency,
-        'include_24hr_vol': 'true',
-        'include_24hr_change': 'true',
-        'include_last_updated_at': 'true'
-    }
-
-    try:
-        response = requests.get(url, params=params, timeout=10) # Timeout di 10 secondi
-        response.raise_for_status()  # Solleva un'eccezione per errori HTTP (4xx o 5xx)
-        data = response.json()
-
-        if asset_id in data and currency in data[asset_id]:
-            asset_data = data[asset_id]
-            price = asset_data.get(currency)
-            change_24h = asset_data.get(f'{currency}_24h_change')
-            volume_24h = asset_data.get(f'{currency}_24h_vol')
-            last_updated_timestamp = asset_data.get('last_updated_at')
-            
-            last_updated_str = "N/D"
-            if last_updated_timestamp:
-                last_updated_dt = datetime.fromtimestamp(last_updated_timestamp)
-                last_updated_str = last_updated_dt.strftime('%Y-%m-%d %H:%M:%S')
-
-            return {
-                "price": price,
-                "change_24h": change_24h,
-                "volume_24h": volume_24h,
-                "last_updated": last_updated_str,
-                "currency": currency.upper()
-            }
-        else:
-            return {"error": f"Dati non trovati per {asset_id} in {currency}."}
-
-    except requests.exceptions.Timeout:
-        return {"error": "Richiesta API scaduta (timeout)."}
-    except requests.exceptions.HTTPError as http_err:
-        return {"error": f"Errore HTTP: {http_err}"}
-    except requests.exceptions.RequestException as req_err:
-        return {"error": f"Errore nella richiesta API: {req_err}"}
-    except json.JSONDecodeError:
-        return {"error": "Errore nella decodifica della risposta JSON dall'API."}
-    except Exception as e:
-        return {"error": f"Un errore imprevisto è occorso: {e}"}
-    
-def get_watchlist_prices(asset_ids_list, vs_currencies_list):
-    """
-    Recupera i prezzi e altri dati per una lista di asset_ids
-    contro una lista di valute.
-    """
-    if not asset_ids_list or not vs_currencies_list:
-        return {"error": "La lista degli ID asset e delle valute non può essere vuota."}
-
-    ids_string = ",".join(asset_ids_list)
-    vs_currencies_string = ",".join(vs_currencies_list)
-
-    url = f"{COINGECKO_API_BASE_URL}/simple/price"
-    params = {
-        'ids': ids_string,
-        'vs_currencies': vs_currencies_string,
-        'include_24hr_vol': 'true',
-        'include_24hr_change': 'true',
-        'include_last_updated_at': 'true'
-    }
-
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Formattiamo i dati per ogni asset richiesto
-        results = {}
-        for asset_id in asset_ids_list:
-            if asset_id in data:
-                asset_data = data[asset_id]
-                formatted_asset_data = {}
-                for currency in vs_currencies_list:
-                    if currency in asset_data:
-                        price = asset_data.get(currency)
-                        change_24h = asset_data.get(f'{currency}_24h_change')
-                        volume_24h = asset_data.get(f'{currency}_24h_vol')
-                        
-                        formatted_asset_data[currency] = {
-                            "price": price,
-                            "change_24h": change_24h,
-                            "volume_24h": volume_24h,
-                        }
-                
-                last_updated_timestamp = asset_data.get('last_updated_at')
-                last_updated_str = "N/D"
-                if last_updated_timestamp:
-                    last_updated_dt = datetime.fromtimestamp(last_updated_timestamp)
-                    last_updated_str = last_updated_dt.strftime('%Y-%m-%d %H:%M:%S')
-                formatted_asset_data['last_updated'] = last_updated_str
-                results[asset_id] = formatted_asset_data
-            else:
-                results[asset_id] = {"error": f"Dati non trovati per {asset_id}."}
-        return results
-
-    except requests.exceptions.Timeout:
-        return {"error": "Richiesta API watchlist scaduta (timeout)."}
-    except requests.exceptions.HTTPError as http_err:
-        return {"error": f"Errore HTTP watchlist: {http_err}"}
-    except requests.exceptions.RequestException as req_err:
-        return {"error": f"Errore richiesta API watchlist: {req_err}"}
-    except json.JSONDecodeError:
-        return {"error": "Errore decodifica JSON watchlist."}
-    except Exception as e:
-        return {"error": f"Errore imprevisto watchlist: {e}"}
-    
-def get_market_cap_ranking(vs_currency='usd', top_n=10, page=1):
-    """
-    Recupera le prime top_n criptovalute ordinate per capitalizzazione di mercato.
-    """
-    url = f"{COINGECKO_API_BASE_URL}/coins/markets"
-    params = {
-        'vs_currency': vs_currency,
-        'order': 'market_cap_desc', # Ordina per capitalizzazione di mercato decrescente
-        'per_page': top_n,          # Numero di risultati per pagina
-        'page': page,               # Pagina dei risultati da recuperare
-        'sparkline': 'false',       # Non includere dati sparkline
-        'price_change_percentage': '1h,24h,7d' # Includi variazioni di prezzo
-    }
-
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json() # Questa è una lista di dizionari
-        
-        # Estraiamo e formattiamo i dati che ci interessano
-        ranked_list = []
-        for rank_idx, coin_data in enumerate(data, start=1): # Usiamo rank_idx per il rank se non fornito o per controllo
-            rank = coin_data.get('market_cap_rank', rank_idx)
-            asset_id = coin_data.get('id')
-            symbol = coin_data.get('symbol', '').upper()
-            name = coin_data.get('name')
-            current_price = coin_data.get('current_price')
-            market_cap = coin_data.get('market_cap')
-            total_volume = coin_data.get('total_volume')
-            price_change_24h = coin_data.get('price_change_percentage_24h')
-            # Aggiungiamo anche la variazione a 1h e 7d se vogliamo, visto che l'API la fornisce
-            price_change_1h = None
-            price_change_7d = None
-            if coin_data.get('price_change_percentage_1h_in_currency') is not None:
-                 price_change_1h = coin_data.get('price_change_percentage_1h_in_currency')
-            if coin_data.get('price_change_percentage_7d_in_currency') is not None:
-                 price_change_7d = coin_data.get('price_change_percentage_7d_in_currency')
-
-            ranked_list.append({
-                "rank": rank,
-                "id": asset_id,
-                "symbol": symbol,
-                "name": name,
-                "current_price": current_price,
-                "market_cap": market_cap,
-                "total_volume_24h": total_volume,
-                "price_change_24h": price_change_24h,
-                "price_change_1h": price_change_1h,
-                "price_change_7d": price_change_7d,
-                "vs_currency": vs_currency.upper()
-            })
-        return ranked_list
-
-    except requests.exceptions.Timeout:
-        return {"error": "Richiesta API Market Cap scaduta (timeout)."}
-    except requests.exceptions.HTTPError as http_err:
-        return {"error": f"Errore HTTP Market Cap: {http_err}"}
-    except requests.exceptions.RequestException as req_err:
-        return {"error": f"Errore richiesta API Market Cap: {req_err}"}
-    except json.JSONDecodeError:
-        return {"error": "Errore decodifica JSON Market Cap."}
-    except Exception as e:
-        return {"error": f"Errore imprevisto Market Cap: {e}"}
-    
-def get_historical_market_data(asset_id, vs_currency, days='max', interval='daily'):
-    """
-    Recupera i dati storici (prezzi, market cap, volumi) per un asset.
-    'days' può essere un numero o 'max'.
-    'interval' può essere 'daily' o, per periodi brevi, anche orario (ma l'API lo fornisce solo per certi 'days').
-    """
-    url = f"{COINGECKO_API_BASE_URL}/coins/{asset_id}/market_chart"
-    params = {
-        'vs_currency': vs_currency,
-        'days': days,
-        'interval': interval # 'daily' per dati giornalieri
-        # 'precision': 'full' # per la massima precisione decimale, opzionale
-    }
-
-    try:
-        response = requests.get(url, params=params, timeout=20) # Timeout più lungo per dati potenzialmente grandi
-        response.raise_for_status()
-        data = response.json() # Contiene 'prices', 'market_caps', 'total_volumes'
-        
-        # I dati sono liste di [timestamp, valore]
-        # Li trasformiamo in un formato più leggibile
-        formatted_data = {
-            "asset_id": asset_id,
-            "vs_currency": vs_currency,
-            "data_points": []
-        }
-        
-        # Assumiamo che tutte le liste abbiano la stessa lunghezza e gli stessi timestamp
-        # Prendiamo i prezzi come riferimento per la lunghezza
-        if 'prices' in data and data['prices']:
-            for i in range(len(data['prices'])):
-                timestamp_ms = data['prices'][i][0]
-                # Converti timestamp da millisecondi a secondi per datetime
-                dt_object = datetime.fromtimestamp(timestamp_ms / 1000)
-                date_str = dt_object.strftime("%Y-%m-%d %H:%M:%S") # O solo "%Y-%m-%d" se 'daily'
-
-                price = data['prices'][i][1]
-                market_cap = data['market_caps'][i][1] if i < len(data.get('market_caps', [])) else None
-                total_volume = data['total_volumes'][i][1] if i < len(data.get('total_volumes', [])) else None
-                
-                formatted_data["data_points"].append({
-                    "timestamp": timestamp_ms,
-                    "date": date_str,
-                    "price": price,
-                    "market_cap": market_cap,
-                    "total_volume": total_volume
-                })
-        else:
-            return {"error": f"Nessun dato storico sui prezzi trovato per {asset_id}."}
-            
-        return formatted_data
-
-    except requests.exceptions.Timeout:
-        return {"error": "Richiesta API Dati Storici scaduta (timeout)."}
-    except requests.exceptions.HTTPError as http_err:
-        return {"error": f"Errore HTTP Dati Storici: {http_err}"}
-    except requests.exceptions.RequestException as req_err:
-        return {"error": f"Errore richiesta API Dati Storici: {req_err}"}
-    except json.JSONDecodeError:
-        return {"error": "Errore decodifica JSON Dati Storici."}
-    except Exception as e:
-        return {"error": f"Errore imprevisto Dati Storici: {e}"}
-
-# Esempio di come usare la nuova funzione (puoi testarlo qui)
-if __name__ == "__main__":
-    print("--- Test get_asset_price ---")
-    test_asset = "bitcoin"
-    test_currency = "usd"
-    price_info = get_asset_price(test_asset, test_currency)
-    if "error" in price_info:
-        print(f"Errore per {test_asset}: {price_info['error']}")
-    else:
-        print(f"Informazioni per {test_asset.capitalize()}:")
-        print(f"  Prezzo: {price_info.get('price')} {price_info.get('currency')}")
-        # Assicurati che change_24h sia un numero prima di formattarlo
-        change_24h_val = price_info.get('change_24h')
-        if isinstance(change_24h_val, (int, float)):
-            print(f"  Variazione 24h: {change_24h_val:.2f}%")
-        else:
-            print(f"  Variazione 24h: {change_24h_val}") # Stampa N/D o il valore come è
-        
-        volume_24h_val = price_info.get('volume_24h')
-        if isinstance(volume_24h_val, (int, float)):
-            print(f"  Volume 24h: {volume_24h_val:,.2f} {price_info.get('currency')}")
-        else:
-            print(f"  Volume 24h: {volume_24h_val} {price_info.get('currency')}")
-            
-        print(f"  Ultimo aggiornamento: {price_info.get('last_updated')}")
-
-    test_asset_error = "nonexistentcoin"
-    price_info_error = get_asset_price(test_asset_error, test_currency)
-    if "error" in price_info_error:
-        print(f"\nTest Errore per '{test_asset_error}': {price_info_error['error']}")
-
-    print("\n--- Test get_watchlist_prices ---")
-    watchlist_test_ids = ["bitcoin", "ethereum", "cardano"]
-    watchlist_test_currencies = ["usd", "eur"]
-    watchlist_data = get_watchlist_prices(watchlist_test_ids, watchlist_test_currencies)
-
-    if isinstance(watchlist_data, dict) and "error" in watchlist_data: # Controllo se è un dizionario di errore globale
-        print(f"Errore Watchlist: {watchlist_data['error']}")
-    elif isinstance(watchlist_data, dict): # Se è un dizionario di risultati
-        for asset_id, data_by_currency in watchlist_data.items():
-            print(f"\nAsset: {asset_id.capitalize()}")
-            if isinstance(data_by_currency, dict) and "error" in data_by_currency:
-                print(f"  Errore per {asset_id}: {data_by_currency['error']}")
-                continue
-            
-            # Gestione per la struttura dati di get_watchlist_prices
-            last_updated_val = data_by_currency.get('last_updated', 'N/D')
-            for currency_key, details in data_by_currency.items():
-                if currency_key == 'last_updated': # Salta la chiave 'last_updated' qui
-                    continue
-                print(f"  Valuta: {currency_key.upper()}")
-                print(f"    Prezzo: {details.get('price', 'N/D')}")
-                
-                change_24h_detail = details.get('change_24h')
-                if isinstance(change_24h_detail, (int, float)):
-                     print(f"    Variazione 24h: {change_24h_detail:.2f}%")
-                else:
-                    print(f"    Variazione 24h: {change_24h_detail}")
-
-                volume_24h_detail = details.get('volume_24h')
-                if isinstance(volume_24h_detail, (int, float)):
-                    print(f"    Volume 24h: {volume_24h_detail:,.2f}")
-                else:
-                    print(f"    Volume 24h: {volume_24h_detail}")
-
-            print(f"  Ultimo aggiornamento: {last_updated_val}")
-    else:
-        print("Errore: formato dati watchlist non riconosciuto.")
-
-
-    print("\n--- Test get_market_cap_ranking ---")
-    top_coins = get_market_cap_ranking(vs_currency='eur', top_n=3) # Ridotto a 3 per brevità output
-
-    if isinstance(top_coins, dict) and "error" in top_coins:
-        print(f"Errore Market Cap: {top_coins['error']}")
-    elif isinstance(top_coins, list):
-        print(f"Top 3 coins in EUR:")
-        for coin in top_coins:
-            print(f"  Rank: {coin.get('rank', 'N/A')}, Nome: {coin.get('name', 'N/A')} ({coin.get('symbol', 'N/A')}), "
-                  f"Prezzo: {coin.get('current_price', 'N/A')} {coin.get('vs_currency', '')}, "
-                  f"Mkt Cap: {coin.get('market_cap', 'N/A')} {coin.get('vs_currency', '')}")
-    else:
-        print("Errore: formato dati market cap non riconosciuto.")
-    
-    print("\n--- Test Dati Storici ---")
-    historical_data = get_historical_market_data(asset_id='bitcoin', vs_currency='usd', days='7')
-
-    if isinstance(historical_data, dict) and "error" in historical_data:
-        print(f"Errore Dati Storici: {historical_data['error']}")
-    elif isinstance(historical_data, dict) and "data_points" in historical_data:
-        print(f"Dati storici per {historical_data['asset_id']} in {historical_data['vs_currency']} (primi 3 punti):")
-        for point in historical_data["data_points"][:3]: # Stampa solo i primi 3 per brevità
-            print(f"  Data: {point['date']}, Prezzo: {point['price']:.2f}, "
-                  f"Mkt Cap: {point['market_cap']:.0f}, Volume: {point['total_volume']:.0f}")
-        print(f"  ... e altri {len(historical_data['data_points']) - 3} punti.")
-    else:
+import requests
+from requests.adapters import HTTPAdapter
+import json
+import sqlite3
+import threading
+import time
+import random
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone # Per formattare la data dell'ultimo aggiornamento
+from email.utils import parsedate_to_datetime # Per leggere l'header Retry-After in formato data
+
+from historical_series import HistoricalSeries
+from history_store import (get_history_store, last_complete_timestamp, resample_tail,
+                           STORE_SYNC_MIN_INTERVAL)
+
+COINGECKO_API_BASE_URL = "https://api.coingecko.com/api/v3"
+
+# --- CONFIGURAZIONE DEL CLIENT HTTP CONDIVISO ---
+HTTP_POOL_CONNECTIONS = 4  # Numero di host diversi di cui teniamo un pool (a noi ne serve uno solo)
+HTTP_POOL_MAXSIZE = 10     # Connessioni keep-alive riutilizzabili per host (>= thread che lavorano insieme)
+DEFAULT_TIMEOUT = 10       # Timeout in secondi per gli endpoint non elencati sotto
+
+# Timeout per endpoint: lo storico può essere molto grande, quindi gli diamo più tempo
+ENDPOINT_TIMEOUTS = {
+    "simple/price": 10,
+    "coins/markets": 10,
+    "market_chart": 20,
+    "range": 20, # /coins/{id}/market_chart/range
+}
+
+# --- CONFIGURAZIONE DELLA CACHE DELLE RISPOSTE ---
+# Durata (secondi) delle risposte in cache per endpoint. I prezzi spot cambiano spesso,
+# lo storico giornaliero quasi mai. La chiave "<endpoint>:daily" vale per interval=daily.
+CACHE_TTLS = {
+    "simple/price": 30,
+    "coins/markets": 60,
+    "market_chart": 300,
+    "market_chart:daily": 3600,
+}
+CACHE_DEFAULT_TTL = 30
+CACHE_MAX_ENTRIES = 256               # Numero massimo di risposte tenute in memoria
+CACHE_MAX_BYTES = 32 * 1024 * 1024    # Dimensione massima (circa) delle risposte in cache
+
+# --- LIMITE DI RICHIESTE LATO CLIENT (il piano gratuito di CoinGecko è molto restrittivo) ---
+RATE_LIMIT_PER_MINUTE = 30   # Richieste al minuto consentite in media
+RATE_LIMIT_BURST = 5         # Richieste che possono partire subito una dopo l'altra
+RETRY_MAX_ATTEMPTS = 4       # Tentativi aggiuntivi dopo un 429 o un 5xx
+RETRY_BASE_DELAY = 1.0       # Attesa base (secondi) del backoff esponenziale
+RETRY_MAX_DELAY = 60.0       # Attesa massima fra due tentativi
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# --- RICHIESTE DIVISE IN BLOCCHI ---
+WATCHLIST_MAX_IDS_PER_REQUEST = 100        # ID per singola chiamata a /simple/price
+WATCHLIST_MAX_CURRENCIES_PER_REQUEST = 10  # Valute per singola chiamata a /simple/price
+WATCHLIST_MAX_QUERY_CHARS = 1500           # Lunghezza massima di 'ids' / 'vs_currencies' nell'URL
+MARKETS_MAX_PER_PAGE = 250                 # Monete per pagina accettate da /coins/markets
+FANOUT_MAX_WORKERS = 4                     # Thread che scaricano i blocchi in parallelo
+
+
+def _lookup_by_endpoint(table, endpoint, default):
+    """Cerca un valore per endpoint: prima il percorso esatto, poi l'ultimo segmento (es. 'market_chart')."""
+    endpoint = endpoint.strip("/")
+    if endpoint in table:
+        return table[endpoint]
+    return table.get(endpoint.rsplit("/", 1)[-1], default)
+
+
+class ApiClient:
+    """
+    Client HTTP condiviso da tutte le funzioni del modulo.
+    Usa una requests.Session con un pool di connessioni keep-alive, così le chiamate
+    successive a CoinGecko riutilizzano la stessa connessione TCP/TLS invece di rifare
+    ogni volta connect e handshake.
+    Il pool di urllib3 è thread-safe: lo stesso client può essere usato dai thread delle schede.
+    """
+    def __init__(self, base_url=COINGECKO_API_BASE_URL, pool_connections=HTTP_POOL_CONNECTIONS,
+                 pool_maxsize=HTTP_POOL_MAXSIZE, timeouts=None, default_timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = dict(ENDPOINT_TIMEOUTS if timeouts is None else timeouts)
+        self.default_timeout = default_timeout
+
+        self.session = requests.Session()
+        # pool_block=False: se tutte le connessioni sono occupate ne apriamo una temporanea invece di bloccare
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate", # Le risposte JSON compresse sono molto più piccole
+            "User-Agent": "PyCryptoDesk",
+        })
+
+    def timeout_for(self, endpoint):
+        """Restituisce il timeout per un endpoint (es. 'coins/bitcoin/market_chart' -> 'market_chart')."""
+        return _lookup_by_endpoint(self.timeouts, endpoint, self.default_timeout)
+
+    def get(self, endpoint, params=None, timeout=None):
+        """Esegue una GET su base_url/endpoint riutilizzando il pool di connessioni."""
+        url = f"{self.base_url}/{endpoint.strip('/')}"
+        if timeout is None:
+            timeout = self.timeout_for(endpoint)
+        return self.session.get(url, params=params, timeout=timeout)
+
+    def close(self):
+        self.session.close()
+
+
+# Client usato da tutte le funzioni qui sotto
+http_client = ApiClient()
+
+def configure_http_client(**client_kwargs):
+    """
+    Sostituisce il client condiviso con uno nuovo (es. pool più grande o timeout diversi).
+    Accetta gli stessi argomenti di ApiClient.
+    """
+    global http_client
+    old_client = http_client
+    http_client = ApiClient(**client_kwargs)
+    old_client.close()
+    return http_client
+
+
+class ResponseCache:
+    """
+    Cache in memoria, thread-safe, delle risposte JSON già decodificate.
+    Le voci sono indicizzate per endpoint + parametri normalizzati, scadono dopo un TTL
+    che dipende dall'endpoint e vengono espulse in ordine LRU quando si superano
+    il numero massimo di voci o la dimensione massima in byte.
+    I dati restituiti sono condivisi: chi li legge non deve modificarli.
+    """
+    def __init__(self, ttls=None, default_ttl=CACHE_DEFAULT_TTL,
+                 max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # chiave -> (scadenza, dimensione, dati)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(endpoint, params):
+        """
+        Costruisce la chiave di cache. I parametri vengono normalizzati (minuscolo, spazi rimossi,
+        liste separate da virgola ordinate) così 'bitcoin,ethereum' e 'ethereum,bitcoin' coincidono.
+        """
+        normalized = []
+        for name, value in sorted((params or {}).items()):
+            value = str(value).strip().lower()
+            if "," in value:
+                value = ",".join(sorted(part.strip() for part in value.split(",")))
+            normalized.append((name, value))
+        return (endpoint.strip("/"), tuple(normalized))
+
+    def ttl_for(self, endpoint, params=None):
+        interval = str((params or {}).get("interval", "")).lower()
+        if interval:
+            specific_ttl = _lookup_by_endpoint(self.ttls, f"{endpoint.strip('/')}:{interval}", None)
+            if specific_ttl is not None:
+                return specific_ttl
+        return _lookup_by_endpoint(self.ttls, endpoint, self.default_ttl)
+
+    def get(self, key):
+        """Restituisce i dati in cache o None (scaduti o assenti)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, data = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key) # Usata di recente
+            self.hits += 1
+            return data
+
+    def put(self, key, data, ttl, size):
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, data)
+            self.current_bytes += size
+            # Espulsione LRU finché non rientriamo nei limiti
+            while self._entries and (len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Cache condivisa da tutte le funzioni del modulo
+response_cache = ResponseCache()
+
+def get_cache_stats():
+    """Statistiche della cache delle risposte (voci, byte, hit e miss) e delle richieste unite."""
+    stats = response_cache.stats()
+    stats["coalesced"] = single_flight.coalesced
+    return stats
+
+def clear_response_cache():
+    response_cache.clear()
+
+class RateLimiter:
+    """
+    Token bucket condiviso da tutto il processo.
+    Ogni richiesta consuma un gettone; i gettoni si ricaricano a velocità costante fino a 'capacity'.
+    Se non ci sono gettoni la chiamata aspetta in coda invece di fallire.
+    pause() blocca tutte le richieste per un certo tempo (es. dopo un 429 con Retry-After).
+    """
+    def __init__(self, rate_per_minute=RATE_LIMIT_PER_MINUTE, capacity=RATE_LIMIT_BURST):
+        self.rate = rate_per_minute / 60.0 # gettoni al secondo
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._listeners = [] # Funzioni chiamate quando cambia la coda o la pausa (vedi add_listener)
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def add_listener(self, callback):
+        """
+        Registra callback(status) da chiamare quando una richiesta inizia o smette di aspettare
+        la quota, o quando arriva una pausa. 'status' è lo stesso dizionario di status().
+        La chiamata avviene nel thread della richiesta, fuori dal lock del limitatore.
+        """
+        with self._cond:
+            self._listeners.append(callback)
+
+    def _notify(self):
+        if not self._listeners:
+            return
+        status = self.status()
+        for callback in list(self._listeners):
+            try:
+                callback(status)
+            except Exception as e:
+                print(f"Errore in un listener del limitatore: {e}")
+
+    def _take_token(self):
+        """Prende un gettone se disponibile (restituisce 0), altrimenti i secondi da aspettare. Va chiamata con il lock."""
+        now = time.monotonic()
+        self._refill(now)
+        wait_time = self._paused_until - now
+        if wait_time > 0:
+            return wait_time
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Prende un gettone, aspettando se necessario."""
+        with self._cond:
+            wait_time = self._take_token()
+            if wait_time <= 0:
+                return # Caso normale: nessuna attesa e nessuna notifica
+            self._waiting += 1
+        self._notify()
+        try:
+            with self._cond:
+                while wait_time > 0:
+                    self._cond.wait(wait_time)
+                    wait_time = self._take_token()
+        finally:
+            with self._cond:
+                self._waiting -= 1
+            self._notify()
+
+    def pause(self, seconds):
+        """Sospende tutte le richieste per 'seconds' secondi (non accorcia una pausa già più lunga)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0 # Alla ripresa ripartiamo piano
+            self._cond.notify_all()
+        self._notify()
+
+    @property
+    def queue_depth(self):
+        """Numero di richieste attualmente in attesa di un gettone."""
+        with self._cond:
+            return self._waiting
+
+    def status(self):
+        with self._cond:
+            return {
+                "queue_depth": self._waiting,
+                "paused_for": max(0.0, self._paused_until - time.monotonic()),
+            }
+
+
+# Limitatore usato da tutte le funzioni del modulo
+rate_limiter = RateLimiter()
+
+def get_rate_limit_status():
+    """
+    Stato del limitatore: 'queue_depth' (richieste in attesa di quota) e
+    'paused_for' (secondi di pausa rimasti dopo un 429). Utile alla GUI per
+    mostrare "in attesa di quota" invece di un errore.
+    """
+    return rate_limiter.status()
+
+def add_rate_limit_listener(callback):
+    """
+    Chiama callback(status) a ogni cambiamento dello stato del limitatore (stesso dizionario
+    di get_rate_limit_status()), così la GUI non deve interrogarlo periodicamente.
+    Attenzione: la callback gira nel thread che ha fatto la richiesta.
+    """
+    rate_limiter.add_listener(callback)
+
+def _retry_delay(response, attempt):
+    """
+    Calcola l'attesa prima del prossimo tentativo: rispetta Retry-After se presente
+    (secondi o data HTTP), altrimenti backoff esponenziale con jitter casuale.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), RETRY_MAX_DELAY) + random.uniform(0, RETRY_BASE_DELAY)
+    backoff = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(backoff / 2, backoff)
+
+def _get_with_retry(endpoint, params):
+    """
+    GET attraverso il limitatore. Su 429 e 5xx riprova con backoff; un 429 mette in pausa
+    tutto il processo, così anche le altre schede smettono di consumare quota.
+    Dopo l'ultimo tentativo restituisce comunque la risposta (raise_for_status la gestirà).
+    """
+    for attempt in range(RETRY_MAX_ATTEMPTS + 1):
+        rate_limiter.acquire()
+        response = http_client.get(endpoint, params=params)
+        if response.status_code not in RETRY_STATUS_CODES or attempt == RETRY_MAX_ATTEMPTS:
+            return response
+        delay = _retry_delay(response, attempt)
+        print(f"API: risposta {response.status_code} da '{endpoint}', nuovo tentativo fra {delay:.1f}s...")
+        if response.status_code == 429:
+            rate_limiter.pause(delay)
+        else:
+            time.sleep(delay)
+    return response
+
+class SingleFlight:
+    """
+    Unisce le richieste identiche in corso: se più thread chiedono la stessa chiave
+    mentre la prima richiesta è ancora in volo, aspettano lo stesso Future e ricevono
+    lo stesso risultato (o la stessa eccezione) invece di fare ognuno la propria chiamata.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {} # chiave -> Future
+        self.coalesced = 0   # Richieste risparmiate perché unite a una già in corso
+
+    def do(self, key, function):
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+
+# Richieste in volo condivise da tutto il modulo
+single_flight = SingleFlight()
+
+def fetch_json(endpoint, params=None, use_cache=True):
+    """
+    Esegue la GET sull'endpoint e restituisce il JSON decodificato, passando prima dalla cache.
+    Le eccezioni di requests (timeout, errori HTTP, JSON non valido) vengono propagate al chiamante.
+    Richieste identiche già in corso vengono unite (vedi SingleFlight).
+    """
+    cache_key = ResponseCache.make_key(endpoint, params)
+    if use_cache:
+        cached_data = response_cache.get(cache_key)
+        if cached_data is not None:
+            return cached_data
+
+    def fetch_from_network():
+        response = _get_with_retry(endpoint, params)
+        response.raise_for_status()  # Solleva un'eccezione per errori HTTP (4xx o 5xx)
+        data = response.json()
+        if use_cache:
+            # Salviamo in cache prima di liberare chi aspetta, così i chiamanti successivi trovano già i dati
+            response_cache.put(cache_key, data, response_cache.ttl_for(endpoint, params), len(response.content))
+        return data
+
+    # Chiamanti concorrenti con stesso endpoint e parametri condividono un'unica richiesta HTTP
+    return single_flight.do(cache_key, fetch_from_network)
+
+# Pool condiviso per scaricare in parallelo i blocchi di una stessa richiesta
+# (il limitatore decide comunque quante richieste partono davvero)
+fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="api-fanout")
+
+def get_asset_price(asset_id, currency):
+    """
+    Recupera il prezzo corrente, la variazione 24h, il volume 24h 
+    e l'ultimo aggiornamento per un dato asset_id e valuta.
+    """
+    params = {
+        'ids': asset_id,
+        'vs_currencies': currency,
+        'include_24hr_vol': 'true',
+        'include_24hr_change': 'true',
+        'include_last_updated_at': 'true'
+    }
+
+    try:
+        data = fetch_json("simple/price", params)
+
+        if asset_id in data and currency in data[asset_id]:
+            asset_data = data[asset_id]
+            price = asset_data.get(currency)
+            change_24h = asset_data.get(f'{currency}_24h_change')
+            volume_24h = asset_data.get(f'{currency}_24h_vol')
+            last_updated_timestamp = asset_data.get('last_updated_at')
+            
+            last_updated_str = "N/D"
+            if last_updated_timestamp:
+                last_updated_dt = datetime.fromtimestamp(last_updated_timestamp)
+                last_updated_str = last_updated_dt.strftime('%Y-%m-%d %H:%M:%S')
+
+            return {
+                "price": price,
+                "change_24h": change_24h,
+                "volume_24h": volume_24h,
+                "last_updated": last_updated_str,
+                "currency": currency.upper()
+            }
+        else:
+            return {"error": f"Dati non trovati per {asset_id} in {currency}."}
+
+    except requests.exceptions.Timeout:
+        return {"error": "Richiesta API scaduta (timeout)."}
+    except requests.exceptions.HTTPError as http_err:
+        return {"error": f"Errore HTTP: {http_err}"}
+    except requests.exceptions.RequestException as req_err:
+        return {"error": f"Errore nella richiesta API: {req_err}"}
+    except json.JSONDecodeError:
+        return {"error": "Errore nella decodifica della risposta JSON dall'API."}
+    except Exception as e:
+        return {"error": f"Un errore imprevisto è occorso: {e}"}
+    
+def _chunk_values(values, max_items, max_chars):
+    """
+    Divide una lista di valori in blocchi con al massimo max_items elementi e
+    al massimo max_chars caratteri una volta uniti con le virgole (limite sulla lunghezza dell'URL).
+    I duplicati vengono rimossi mantenendo l'ordine.
+    """
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for value in dict.fromkeys(values):
+        added_length = len(value) + (1 if current_chunk else 0) # +1 per la virgola
+        if current_chunk and (len(current_chunk) >= max_items or current_length + added_length > max_chars):
+            chunks.append(current_chunk)
+            current_chunk = []
+            current_length = 0
+            added_length = len(value)
+        current_chunk.append(value)
+        current_length += added_length
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+def _watchlist_error_message(exc):
+    """Traduce un'eccezione di un blocco della watchlist nel messaggio di errore usato dalla GUI."""
+    if isinstance(exc, requests.exceptions.Timeout):
+        return "Richiesta API watchlist scaduta (timeout)."
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return f"Errore HTTP watchlist: {exc}"
+    if isinstance(exc, requests.exceptions.RequestException):
+        return f"Errore richiesta API watchlist: {exc}"
+    if isinstance(exc, json.JSONDecodeError):
+        return "Errore decodifica JSON watchlist."
+    return f"Errore imprevisto watchlist: {exc}"
+
+def _fetch_watchlist_batch(asset_ids, vs_currencies):
+    params = {
+        'ids': ",".join(asset_ids),
+        'vs_currencies': ",".join(vs_currencies),
+        'include_24hr_vol': 'true',
+        'include_24hr_change': 'true',
+        'include_last_updated_at': 'true'
+    }
+    return fetch_json("simple/price", params)
+
+def get_watchlist_prices(asset_ids_list, vs_currencies_list):
+    """
+    Recupera i prezzi e altri dati per una lista di asset_ids
+    contro una lista di valute.
+    Liste lunghe vengono divise in blocchi (vedi WATCHLIST_MAX_IDS_PER_REQUEST) scaricati in parallelo;
+    se un blocco fallisce, l'errore viene riportato solo sugli asset di quel blocco.
+    """
+    if not asset_ids_list or not vs_currencies_list:
+        return {"error": "La lista degli ID asset e delle valute non può essere vuota."}
+
+    try:
+        id_batches = _chunk_values(asset_ids_list, WATCHLIST_MAX_IDS_PER_REQUEST, WATCHLIST_MAX_QUERY_CHARS)
+        currency_batches = _chunk_values(vs_currencies_list, WATCHLIST_MAX_CURRENCIES_PER_REQUEST, WATCHLIST_MAX_QUERY_CHARS)
+        batches = [(ids, currencies) for ids in id_batches for currencies in currency_batches]
+
+        data = {}          # asset_id -> dati grezzi uniti da tutti i blocchi
+        batch_errors = {}  # asset_id -> messaggio di errore del blocco che lo conteneva
+        if len(batches) == 1:
+            # Caso comune (watchlist piccola): nessun bisogno di thread aggiuntivi
+            data = _fetch_watchlist_batch(*batches[0])
+        else:
+            futures = {fanout_executor.submit(_fetch_watchlist_batch, ids, currencies): ids
+                       for ids, currencies in batches}
+            for future in as_completed(futures):
+                try:
+                    batch_data = future.result()
+                except Exception as exc:
+                    error_msg = _watchlist_error_message(exc)
+                    for asset_id in futures[future]:
+                        batch_errors.setdefault(asset_id, error_msg)
+                    continue
+                for asset_id, asset_data in batch_data.items():
+                    data.setdefault(asset_id, {}).update(asset_data)
+
+            if not data and batch_errors:
+                # Tutti i blocchi sono falliti: restituiamo un errore globale come prima
+                return {"error": next(iter(batch_errors.values()))}
+
+        # Formattiamo i dati per ogni asset richiesto
+        results = {}
+        for asset_id in asset_ids_list:
+            if asset_id in data:
+                asset_data = data[asset_id]
+                formatted_asset_data = {}
+                for currency in vs_currencies_list:
+                    if currency in asset_data:
+                        price = asset_data.get(currency)
+                        change_24h = asset_data.get(f'{currency}_24h_change')
+                        volume_24h = asset_data.get(f'{currency}_24h_vol')
+                        
+                        formatted_asset_data[currency] = {
+                            "price": price,
+                            "change_24h": change_24h,
+                            "volume_24h": volume_24h,
+                        }
+                
+                last_updated_timestamp = asset_data.get('last_updated_at')
+                last_updated_str = "N/D"
+                if last_updated_timestamp:
+                    last_updated_dt = datetime.fromtimestamp(last_updated_timestamp)
+                    last_updated_str = last_updated_dt.strftime('%Y-%m-%d %H:%M:%S')
+                formatted_asset_data['last_updated'] = last_updated_str
+                # Valore grezzo (secondi Unix o None): permette di capire se il dato è cambiato dall'ultima richiesta
+                formatted_asset_data['last_updated_ts'] = last_updated_timestamp
+                results[asset_id] = formatted_asset_data
+            elif asset_id in batch_errors:
+                results[asset_id] = {"error": batch_errors[asset_id]}
+            else:
+                results[asset_id] = {"error": f"Dati non trovati per {asset_id}."}
+        return results
+
+    except Exception as e:
+        return {"error": _watchlist_error_message(e)}
+    
+def _ranking_error_message(exc):
+    """Traduce un'eccezione della classifica nel messaggio di errore usato dalla GUI."""
+    if isinstance(exc, requests.exceptions.Timeout):
+        return "Richiesta API Market Cap scaduta (timeout)."
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return f"Errore HTTP Market Cap: {exc}"
+    if isinstance(exc, requests.exceptions.RequestException):
+        return f"Errore richiesta API Market Cap: {exc}"
+    if isinstance(exc, json.JSONDecodeError):
+        return "Errore decodifica JSON Market Cap."
+    return f"Errore imprevisto Market Cap: {exc}"
+
+def _fetch_ranking_page(vs_currency, per_page, page):
+    """Scarica e formatta una singola pagina di /coins/markets."""
+    params = {
+        'vs_currency': vs_currency,
+        'order': 'market_cap_desc', # Ordina per capitalizzazione di mercato decrescente
+        'per_page': per_page,       # Numero di risultati per pagina
+        'page': page,               # Pagina dei risultati da recuperare
+        'sparkline': 'false',       # Non includere dati sparkline
+        'price_change_percentage': '1h,24h,7d' # Includi variazioni di prezzo
+    }
+    data = fetch_json("coins/markets", params) # Questa è una lista di dizionari
+
+    # Estraiamo e formattiamo i dati che ci interessano
+    ranked_list = []
+    first_rank = (page - 1) * per_page + 1
+    for rank_idx, coin_data in enumerate(data, start=first_rank): # Usiamo rank_idx per il rank se non fornito o per controllo
+        rank = coin_data.get('market_cap_rank', rank_idx)
+        asset_id = coin_data.get('id')
+        symbol = coin_data.get('symbol', '').upper()
+        name = coin_data.get('name')
+        current_price = coin_data.get('current_price')
+        market_cap = coin_data.get('market_cap')
+        total_volume = coin_data.get('total_volume')
+        price_change_24h = coin_data.get('price_change_percentage_24h')
+        # Aggiungiamo anche la variazione a 1h e 7d se vogliamo, visto che l'API la fornisce
+        price_change_1h = None
+        price_change_7d = None
+        if coin_data.get('price_change_percentage_1h_in_currency') is not None:
+             price_change_1h = coin_data.get('price_change_percentage_1h_in_currency')
+        if coin_data.get('price_change_percentage_7d_in_currency') is not None:
+             price_change_7d = coin_data.get('price_change_percentage_7d_in_currency')
+
+        ranked_list.append({
+            "rank": rank,
+            "id": asset_id,
+            "symbol": symbol,
+            "name": name,
+            "current_price": current_price,
+            "market_cap": market_cap,
+            "total_volume_24h": total_volume,
+            "price_change_24h": price_change_24h,
+            "price_change_1h": price_change_1h,
+            "price_change_7d": price_change_7d,
+            "vs_currency": vs_currency.upper()
+        })
+    return ranked_list
+
+def _ranking_window(top_n, page):
+    """
+    Rank richiesti e pagine dell'API che li contengono. 'page' conta pagine da top_n monete, come il
+    parametro page dell'API con per_page=top_n: page=2, top_n=100 sono sempre i rank 101-200, anche quando
+    oltre MARKETS_MAX_PER_PAGE monete l'API va interrogata a pagine da MARKETS_MAX_PER_PAGE.
+    Restituisce (per_page, primo_rank, ultimo_rank, numeri delle pagine dell'API).
+    """
+    per_page = min(top_n, MARKETS_MAX_PER_PAGE)
+    first_rank = (page - 1) * top_n + 1
+    last_rank = first_rank + top_n - 1
+    api_pages = range((first_rank - 1) // per_page + 1, (last_rank - 1) // per_page + 2)
+    return per_page, first_rank, last_rank, api_pages
+
+def iter_market_cap_ranking(vs_currency='usd', top_n=10, page=1):
+    """
+    Versione "a flusso" di get_market_cap_ranking (stesso significato di top_n e page): scarica in
+    parallelo le pagine dell'API (al massimo MARKETS_MAX_PER_PAGE monete ciascuna) e restituisce ogni
+    pagina appena arriva (non per forza in ordine), come {"page": n, "coins": [...]} oppure
+    {"page": n, "error": "..."}, dove n è il numero della pagina dell'API (l'ordine delle pagine è
+    l'ordine della classifica). Utile per riempire una tabella progressivamente.
+    Le monete già restituite in una pagina precedente vengono scartate (la classifica può
+    cambiare mentre scarichiamo le pagine); se per questo ne mancano, alla fine viene scaricata
+    anche la pagina successiva per arrivare a top_n.
+    Se il generatore viene chiuso prima della fine (close(), o chi lo usa smette di iterarlo),
+    le pagine ancora in coda vengono annullate: non consumano richieste del limitatore.
+    """
+    per_page, first_rank, last_rank, api_pages = _ranking_window(top_n, page)
+    seen_ids = set()
+    failed = False
+    last_page_full = False
+    futures = {fanout_executor.submit(_fetch_ranking_page, vs_currency, per_page, api_page): api_page
+               for api_page in api_pages}
+    try:
+        for future in as_completed(futures):
+            page_number = futures[future]
+            try:
+                coins = future.result()
+            except Exception as exc:
+                failed = True
+                yield {"page": page_number, "error": _ranking_error_message(exc)}
+                continue
+            if page_number == api_pages[-1]:
+                last_page_full = len(coins) == per_page
+            page_first_rank = (page_number - 1) * per_page + 1
+            unique_coins = []
+            for position, coin in enumerate(coins, start=page_first_rank):
+                if position < first_rank or position > last_rank: # Le pagine agli estremi escono dall'intervallo
+                    continue
+                if coin["id"] in seen_ids:
+                    continue
+                seen_ids.add(coin["id"])
+                unique_coins.append(coin)
+            yield {"page": page_number, "coins": unique_coins}
+    finally:
+        # Le pagine già partite finiscono comunque; quelle ancora in coda non partono più
+        for future in futures:
+            future.cancel()
+
+    missing = top_n - len(seen_ids)
+    if missing > 0 and not failed and last_page_full:
+        # Alcuni duplicati sono stati scartati: i rank mancanti sono all'inizio della pagina successiva
+        page_number = api_pages[-1] + 1
+        try:
+            coins = _fetch_ranking_page(vs_currency, per_page, page_number)
+        except Exception as exc:
+            yield {"page": page_number, "error": _ranking_error_message(exc)}
+            return
+        extra_coins = [coin for coin in coins if coin["id"] not in seen_ids][:missing]
+        yield {"page": page_number, "coins": extra_coins}
+
+def get_market_cap_ranking(vs_currency='usd', top_n=10, page=1):
+    """
+    Recupera top_n criptovalute ordinate per capitalizzazione di mercato. 'page' conta pagine da top_n
+    monete: page=1 sono le prime top_n, page=2 le top_n successive, e così via.
+    top_n può superare il limite di una pagina dell'API (MARKETS_MAX_PER_PAGE): in quel caso
+    le pagine necessarie vengono scaricate in parallelo, senza duplicati, e unite in un'unica lista ordinata.
+    """
+    try:
+        if top_n <= MARKETS_MAX_PER_PAGE:
+            return _fetch_ranking_page(vs_currency, top_n, page)
+
+        coins_by_page = {}
+        for page_result in iter_market_cap_ranking(vs_currency, top_n, page):
+            if "error" in page_result:
+                return {"error": page_result["error"]}
+            coins_by_page[page_result["page"]] = page_result["coins"]
+
+        # Uniamo le pagine in ordine; i duplicati fra pagine sono già stati scartati,
+        # ma vanno rimossi di nuovo perché le pagine sono arrivate in ordine sparso
+        ranked_list = []
+        seen_ids = set()
+        for page_number in sorted(coins_by_page):
+            for coin in coins_by_page[page_number]:
+                if coin["id"] not in seen_ids:
+                    seen_ids.add(coin["id"])
+                    ranked_list.append(coin)
+        return ranked_list[:top_n]
+
+    except Exception as e:
+        return {"error": _ranking_error_message(e)}
+    
+def _load_from_store(asset_id, vs_currency, granularity, days, max_age=None):
+    """Legge la serie dall'archivio locale se lo copre; un errore dell'archivio non blocca la richiesta di rete."""
+    try:
+        series = get_history_store().load_if_covered(asset_id, vs_currency, granularity, days, max_age=max_age)
+    except sqlite3.Error as e:
+        print(f"Archivio storico non leggibile, uso la rete: {e}")
+        return None
+    if series is not None and len(series) > 0:
+        return series
+    return None
+
+def _save_to_store(asset_id, vs_currency, granularity, series, full_history):
+    try:
+        get_history_store().save(asset_id, vs_currency, granularity, series, full_history=full_history)
+    except sqlite3.Error as e:
+        print(f"Impossibile salvare nell'archivio storico: {e}")
+
+def _sync_store_and_load(asset_id, vs_currency, granularity, days):
+    """
+    Sincronizzazione incrementale: se l'archivio copre già il periodo richiesto, scarica con
+    /market_chart/range solo i punti successivi all'ultima candela completa salvata, li unisce
+    all'archivio (la candela parziale di oggi viene sovrascritta) e restituisce la serie.
+    Restituisce None se l'archivio non copre il periodo (serve uno scaricamento completo).
+    Gli errori di rete vengono propagati al chiamante.
+    """
+    store = get_history_store()
+    try:
+        coverage = store.coverage(asset_id, vs_currency, granularity)
+    except sqlite3.Error as e:
+        print(f"Archivio storico non leggibile, uso la rete: {e}")
+        return None
+    if not store.covers(coverage, granularity, days):
+        return None
+
+    if time.time() - coverage["fetched_at"] >= STORE_SYNC_MIN_INTERVAL:
+        after_ms = last_complete_timestamp(coverage["last_timestamp"], granularity)
+        params = {
+            'vs_currency': vs_currency,
+            'from': after_ms // 1000, # L'endpoint range vuole i secondi
+            'to': int(time.time()),
+        }
+        data = fetch_json(f"coins/{asset_id}/market_chart/range", params, use_cache=False)
+        tail = resample_tail(HistoricalSeries.from_market_chart(data), granularity, after_ms)
+        print(f"API: sincronizzati {len(tail)} punti per {asset_id}/{vs_currency} ({granularity}).")
+        try:
+            store.replace_tail(asset_id, vs_currency, granularity, after_ms, tail)
+        except sqlite3.Error as e:
+            print(f"Impossibile salvare nell'archivio storico: {e}")
+            return None
+    return _load_from_store(asset_id, vs_currency, granularity, days, max_age=float("inf"))
+
+def get_historical_market_data(asset_id, vs_currency, days='max', interval='daily', columnar=False, use_store=False,
+                               sync_to_now=False, cancel_token=None):
+    """
+    Recupera i dati storici (prezzi, market cap, volumi) per un asset.
+    'days' può essere un numero o 'max'.
+    'interval' può essere 'daily' o, per periodi brevi, anche orario (ma l'API lo fornisce solo per certi 'days').
+    Con columnar=True il risultato contiene "series" (un HistoricalSeries con array numpy)
+    invece della lista "data_points": molto più veloce e leggero per serie lunghe.
+    Con use_store=True i dati vengono letti dall'archivio locale (history_store) se lo coprono
+    e sono recenti, altrimenti vengono scaricati e salvati nell'archivio.
+    Con sync_to_now=True (implica use_store) se l'archivio copre già il periodo viene scaricata
+    solo la parte mancante fino ad adesso, invece di tutta la serie.
+    'cancel_token' (opzionale) è un oggetto con l'attributo 'cancelled': se la richiesta viene
+    annullata mentre aspetta la rete, la risposta non viene né convertita né salvata.
+    """
+    params = {
+        'vs_currency': vs_currency,
+        'days': days,
+        'interval': interval # 'daily' per dati giornalieri
+        # 'precision': 'full' # per la massima precisione decimale, opzionale
+    }
+    granularity = interval or "auto" # Chiave della serie nell'archivio locale
+
+    try:
+        if cancel_token is not None and cancel_token.cancelled:
+            return {"error": "Richiesta Dati Storici annullata.", "cancelled": True}
+        use_store = use_store or sync_to_now
+        series = None
+        if sync_to_now:
+            series = _sync_store_and_load(asset_id, vs_currency, granularity, days)
+        elif use_store:
+            series = _load_from_store(asset_id, vs_currency, granularity, days)
+        if series is None:
+            # Timeout più lungo e TTL di cache più lunga per i dati giornalieri (vedi ENDPOINT_TIMEOUTS e CACHE_TTLS)
+            data = fetch_json(f"coins/{asset_id}/market_chart", params) # Contiene 'prices', 'market_caps', 'total_volumes'
+            if cancel_token is not None and cancel_token.cancelled:
+                return {"error": "Richiesta Dati Storici annullata.", "cancelled": True}
+            
+            # I dati sono liste di [timestamp, valore]: li convertiamo in colonne numpy.
+            # Come prima, market cap e volumi sono allineati ai prezzi per posizione.
+            series = HistoricalSeries.from_market_chart(data)
+            if use_store and len(series) > 0:
+                _save_to_store(asset_id, vs_currency, granularity, series, full_history=str(days) == "max")
+
+        if len(series) == 0:
+            return {"error": f"Nessun dato storico sui prezzi trovato per {asset_id}."}
+
+        formatted_data = {
+            "asset_id": asset_id,
+            "vs_currency": vs_currency,
+        }
+        if columnar:
+            formatted_data["series"] = series
+        else:
+            # Vista compatibile: lista di dizionari con la data già formattata
+            formatted_data["data_points"] = series.to_data_points()
+        return formatted_data
+
+    except requests.exceptions.Timeout:
+        return {"error": "Richiesta API Dati Storici scaduta (timeout)."}
+    except requests.exceptions.HTTPError as http_err:
+        return {"error": f"Errore HTTP Dati Storici: {http_err}"}
+    except requests.exceptions.RequestException as req_err:
+        return {"error": f"Errore richiesta API Dati Storici: {req_err}"}
+    except json.JSONDecodeError:
+        return {"error": "Errore decodifica JSON Dati Storici."}
+    except Exception as e:
+        return {"error": f"Errore imprevisto Dati Storici: {e}"}
+
+# Esempio di come usare la nuova funzione (puoi testarlo qui)
+if __name__ == "__main__":
+    print("--- Test get_asset_price ---")
+    test_asset = "bitcoin"
+    test_currency = "usd"
+    price_info = get_asset_price(test_asset, test_currency)
+    if "error" in price_info:
+        print(f"Errore per {test_asset}: {price_info['error']}")
+    else:
+        print(f"Informazioni per {test_asset.capitalize()}:")
+        print(f"  Prezzo: {price_info.get('price')} {price_info.get('currency')}")
+        # Assicurati che change_24h sia un numero prima di formattarlo
+        change_24h_val = price_info.get('change_24h')
+        if isinstance(change_24h_val, (int, float)):
+            print(f"  Variazione 24h: {change_24h_val:.2f}%")
+        else:
+            print(f"  Variazione 24h: {change_24h_val}") # Stampa N/D o il valore come è
+        
+        volume_24h_val = price_info.get('volume_24h')
+        if isinstance(volume_24h_val, (int, float)):
+            print(f"  Volume 24h: {volume_24h_val:,.2f} {price_info.get('currency')}")
+        else:
+            print(f"  Volume 24h: {volume_24h_val} {price_info.get('currency')}")
+            
+        print(f"  Ultimo aggiornamento: {price_info.get('last_updated')}")
+
+    test_asset_error = "nonexistentcoin"
+    price_info_error = get_asset_price(test_asset_error, test_currency)
+    if "error" in price_info_error:
+        print(f"\nTest Errore per '{test_asset_error}': {price_info_error['error']}")
+
+    print("\n--- Test get_watchlist_prices ---")
+    watchlist_test_ids = ["bitcoin", "ethereum", "cardano"]
+    watchlist_test_currencies = ["usd", "eur"]
+    watchlist_data = get_watchlist_prices(watchlist_test_ids, watchlist_test_currencies)
+
+    if isinstance(watchlist_data, dict) and "error" in watchlist_data: # Controllo se è un dizionario di errore globale
+        print(f"Errore Watchlist: {watchlist_data['error']}")
+    elif isinstance(watchlist_data, dict): # Se è un dizionario di risultati
+        for asset_id, data_by_currency in watchlist_data.items():
+            print(f"\nAsset: {asset_id.capitalize()}")
+            if isinstance(data_by_currency, dict) and "error" in data_by_currency:
+                print(f"  Errore per {asset_id}: {data_by_currency['error']}")
+                continue
+            
+            # Gestione per la struttura dati di get_watchlist_prices
+            last_updated_val = data_by_currency.get('last_updated', 'N/D')
+            for currency_key, details in data_by_currency.items():
+                if currency_key in ('last_updated', 'last_updated_ts'): # Salta le chiavi 'last_updated' qui
+                    continue
+                print(f"  Valuta: {currency_key.upper()}")
+                print(f"    Prezzo: {details.get('price', 'N/D')}")
+                
+                change_24h_detail = details.get('change_24h')
+                if isinstance(change_24h_detail, (int, float)):
+                     print(f"    Variazione 24h: {change_24h_detail:.2f}%")
+                else:
+                    print(f"    Variazione 24h: {change_24h_detail}")
+
+                volume_24h_detail = details.get('volume_24h')
+                if isinstance(volume_24h_detail, (int, float)):
+                    print(f"    Volume 24h: {volume_24h_detail:,.2f}")
+                else:
+                    print(f"    Volume 24h: {volume_24h_detail}")
+
+            print(f"  Ultimo aggiornamento: {last_updated_val}")
+    else:
+        print("Errore: formato dati watchlist non riconosciuto.")
+
+
+    print("\n--- Test get_market_cap_ranking ---")
+    top_coins = get_market_cap_ranking(vs_currency='eur', top_n=3) # Ridotto a 3 per brevità output
+
+    if isinstance(top_coins, dict) and "error" in top_coins:
+        print(f"Errore Market Cap: {top_coins['error']}")
+    elif isinstance(top_coins, list):
+        print(f"Top 3 coins in EUR:")
+        for coin in top_coins:
+            print(f"  Rank: {coin.get('rank', 'N/A')}, Nome: {coin.get('name', 'N/A')} ({coin.get('symbol', 'N/A')}), "
+                  f"Prezzo: {coin.get('current_price', 'N/A')} {coin.get('vs_currency', '')}, "
+                  f"Mkt Cap: {coin.get('market_cap', 'N/A')} {coin.get('vs_currency', '')}")
+    else:
+        print("Errore: formato dati market cap non riconosciuto.")
+    
+    print("\n--- Test Dati Storici ---")
+    historical_data = get_historical_market_data(asset_id='bitcoin', vs_currency='usd', days='7')
+
+    if isinstance(historical_data, dict) and "error" in historical_data:
+        print(f"Errore Dati Storici: {historical_data['error']}")
+    elif isinstance(historical_data, dict) and "data_points" in historical_data:
+        print(f"Dati storici per {historical_data['asset_id']} in {historical_data['vs_currency']} (primi 3 punti):")
+        for point in historical_data["data_points"][:3]: # Stampa solo i primi 3 per brevità
+            print(f"  Data: {point['date']}, Prezzo: {point['price']:.2f}, "
+                  f"Mkt Cap: {point['market_cap']:.0f}, Volume: {point['total_volume']:.0f}")
+        print(f"  ... e altri {len(historical_data['data_points']) - 3} punti.")
+    else:
         print("Errore: formato dati storici non riconosciuto.")
\ No newline at end of file
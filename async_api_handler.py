@@ -0,0 +1,67 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import api_handler
+
+# Thread che eseguono davvero le chiamate HTTP, e quindi richieste "in volo" contemporaneamente:
+# il ritmo lo decide comunque il limitatore di api_handler, quindi ne bastano pochi
+# (nessun thread per singola richiesta)
+ASYNC_MAX_WORKERS = 8
+
+
+class AsyncApiClient:
+    """
+    Versione asyncio delle quattro funzioni pubbliche di api_handler, con gli stessi
+    valori di ritorno e gli stessi dizionari di errore.
+    Le richieste passano dal client HTTP condiviso di api_handler (pool di connessioni,
+    cache, limitatore e richieste unite) e vengono eseguite su un piccolo pool fisso di thread;
+    un semaforo grande quanto il pool fa aspettare sul loop le coroutine in più, invece di
+    accodarle nell'executor. Un client va usato da un solo event loop.
+    """
+    def __init__(self, max_workers=ASYNC_MAX_WORKERS):
+        self.max_concurrency = max_workers # Oltre i thread del pool non si guadagna concorrenza
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-api")
+        self._semaphore = None # Creato al primo uso, dentro il loop che userà il client
+
+    async def _run(self, function, *args, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def get_asset_price(self, asset_id, currency):
+        return await self._run(api_handler.get_asset_price, asset_id, currency)
+
+    async def get_watchlist_prices(self, asset_ids_list, vs_currencies_list):
+        return await self._run(api_handler.get_watchlist_prices, asset_ids_list, vs_currencies_list)
+
+    async def get_market_cap_ranking(self, vs_currency='usd', top_n=10, page=1):
+        return await self._run(api_handler.get_market_cap_ranking, vs_currency, top_n, page)
+
+    async def get_historical_market_data(self, asset_id, vs_currency, days='max', interval='daily', columnar=False,
+                                         use_store=False, sync_to_now=False, cancel_token=None):
+        return await self._run(api_handler.get_historical_market_data, asset_id, vs_currency, days, interval,
+                               columnar=columnar, use_store=use_store, sync_to_now=sync_to_now,
+                               cancel_token=cancel_token)
+
+    async def get_many_asset_prices(self, pairs):
+        """Prezzi per molte coppie (asset_id, valuta) in parallelo; i risultati sono nello stesso ordine."""
+        return await asyncio.gather(*(self.get_asset_price(asset_id, currency) for asset_id, currency in pairs))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# Esempio d'uso (puoi testarlo eseguendo questo file direttamente)
+if __name__ == "__main__":
+    async def main():
+        client = AsyncApiClient()
+        pairs = [("bitcoin", "usd"), ("ethereum", "eur"), ("cardano", "usd")]
+        results = await client.get_many_asset_prices(pairs)
+        for (asset_id, currency), price_info in zip(pairs, results):
+            print(f"{asset_id} in {currency}: {price_info}")
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import api_handler
+import config_manager
+import exporters
+
+BATCH_DOWNLOAD_WORKERS = 4   # Scaricamenti contemporanei (il limitatore di api_handler decide comunque il ritmo)
+BATCH_PARTS_DIR = ".batch_parts" # Serie già scaricate in attesa di essere unite nel file unico
+
+
+def read_ids_file(path):
+    """Legge un file con un ID per riga (le righe vuote e quelle che iniziano con # vengono ignorate)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip().lower() for line in f if line.strip() and not line.startswith("#")]
+
+def watchlist_ids(app_config=None):
+    """ID della watchlist salvata in config.json."""
+    app_config = app_config or config_manager.load_config()
+    return list(app_config.get("watchlist_ids", config_manager.DEFAULT_CONFIG["watchlist_ids"]))
+
+def top_ids(vs_currency, top_n):
+    """ID delle prime top_n monete per capitalizzazione (o {"error": ...})."""
+    ranking = api_handler.get_market_cap_ranking(vs_currency, top_n)
+    if isinstance(ranking, dict):
+        return ranking
+    return [coin["id"] for coin in ranking if coin.get("id")]
+
+
+def _unique(asset_ids):
+    seen = set()
+    return [asset_id for asset_id in asset_ids if not (asset_id in seen or seen.add(asset_id))]
+
+def _run_name(vs_currency, days, file_format, combined):
+    return f"{'tutti' if combined else 'batch'}_{vs_currency}_{days}d_{file_format}"
+
+def asset_file_name(asset_id, vs_currency, days, file_format):
+    """Nome del file di un singolo asset (come quello proposto da DownloadTab, più la valuta)."""
+    return f"{asset_id}_{days}d_storico_{vs_currency}.{file_format}"
+
+def _part_path(target_path):
+    """
+    File temporaneo (vuoto) accanto a target_path, con un nome diverso per ogni scrittura: due download
+    dello stesso asset (es. uno interrotto che non ha ancora finito e uno nuovo) non si pestano i piedi.
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(target_path)}-", suffix=".part",
+                                     dir=os.path.dirname(os.path.abspath(target_path)))
+    os.close(fd)
+    return temp_path
+
+def _write_json_atomic(data, path):
+    # Stessa tecnica di config_manager: file temporaneo nella stessa cartella, poi rinomina atomica
+    fd, temp_path = tempfile.mkstemp(prefix=".checkpoint-", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+_checkpoint_locks = {} # percorso del checkpoint -> Lock condiviso da tutte le esecuzioni del processo
+_checkpoint_locks_guard = threading.Lock()
+
+def _checkpoint_lock(path):
+    with _checkpoint_locks_guard:
+        return _checkpoint_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class BatchCheckpoint:
+    """
+    Stato di avanzamento di un download multiplo, salvato in un file JSON nella cartella di destinazione
+    dopo ogni asset completato. Il file dipende da valuta, giorni, formato e modalità (file per asset o unico),
+    quindi rilanciando lo stesso download si riparte dagli asset non ancora completati.
+    """
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.assets = {} # asset_id -> {"status": "done", "file": ..., "rows": n} oppure {"status": "error", "error": ...}
+        self._lock = _checkpoint_lock(path) # Le scritture sullo stesso file vanno in fila, anche fra esecuzioni diverse
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Checkpoint '{self.path}' illeggibile, si riparte da zero: {e}")
+            return
+        if data.get("settings") == self.settings:
+            self.assets = data.get("assets", {})
+
+    def completed(self, asset_id):
+        entry = self.assets.get(asset_id)
+        return bool(entry) and entry.get("status") == "done" and os.path.exists(entry.get("file", ""))
+
+    def remove(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def record(self, asset_id, entry):
+        with self._lock:
+            self.assets[asset_id] = entry
+            _write_json_atomic({"settings": self.settings, "updated_at": time.time(), "assets": self.assets}, self.path)
+
+
+def _download_asset(asset_id, vs_currency, days, target_path, file_format, compression, use_store, cancel_token):
+    """Scarica e scrive un asset; il file compare con il nome definitivo solo quando è completo."""
+    data = api_handler.get_historical_market_data(asset_id, vs_currency, str(days), columnar=True, use_store=use_store,
+                                                  cancel_token=cancel_token)
+    if "error" in data:
+        return data
+    temp_path = _part_path(target_path)
+    try:
+        rows = exporters.export_history(data, temp_path, file_format, compression=compression)
+        os.replace(temp_path, target_path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return {"error": f"Errore durante il salvataggio: {e}"}
+    return {"status": "done", "file": target_path, "rows": rows}
+
+
+def batch_download(asset_ids, vs_currency, days, output_dir, file_format="csv",
+                   compression=exporters.DEFAULT_COMPRESSION, combined=False, workers=BATCH_DOWNLOAD_WORKERS,
+                   resume=True, progress=None, cancel_token=None, use_store=True):
+    """
+    Scarica i dati storici di più asset in parallelo ('workers' thread, sempre entro il limite di
+    richieste di api_handler) e li scrive in output_dir: un file per asset, oppure con combined=True
+    un unico file con la colonna "asset_id" (vedi exporters.COMBINED_FORMATS).
+    L'avanzamento viene salvato in un checkpoint dopo ogni asset: con resume=True gli asset già
+    completati in un'esecuzione precedente (interrotta o con errori) con le stesse impostazioni vengono
+    saltati. Un download concluso senza errori né interruzioni elimina il checkpoint.
+    progress(evento) riceve un dizionario con asset_id, status ("done", "skipped", "error"),
+    completed e total. cancel_token (oggetto con 'cancelled') ferma il download fra un asset e l'altro.
+    Con use_store=True le serie passano dall'archivio locale (history_store), come nel grafico.
+    Restituisce un riepilogo con gli asset scaricati, saltati, gli errori e, se combined, il file unico.
+    """
+    file_format = file_format.lower()
+    if combined and file_format not in exporters.COMBINED_FORMATS:
+        return {"error": f"Formato '{file_format}' non supportato per il file unico."}
+    asset_ids = _unique(asset_id.strip().lower() for asset_id in asset_ids if asset_id.strip())
+    os.makedirs(output_dir, exist_ok=True)
+
+    run_name = _run_name(vs_currency, days, file_format, combined)
+    settings = {"vs_currency": vs_currency, "days": str(days), "file_format": file_format,
+                "compression": compression, "combined": combined}
+    checkpoint = BatchCheckpoint(os.path.join(output_dir, f".{run_name}.checkpoint.json"), settings)
+    if resume:
+        checkpoint.load()
+
+    if combined:
+        # Le serie vanno prima in NPZ non compressi (veloci da scrivere e rileggere in memory-map)
+        parts_dir = os.path.join(output_dir, BATCH_PARTS_DIR, run_name)
+        os.makedirs(parts_dir, exist_ok=True)
+        target = lambda asset_id: os.path.join(parts_dir, f"{asset_id}.npz")
+        asset_format, asset_compression = "npz", None
+    else:
+        target = lambda asset_id: os.path.join(output_dir, asset_file_name(asset_id, vs_currency, days, file_format))
+        asset_format, asset_compression = file_format, compression
+
+    summary = {"done": [], "skipped": [], "errors": {}, "cancelled": False}
+    total = len(asset_ids)
+    def report(asset_id, status):
+        if progress is not None:
+            completed = len(summary["done"]) + len(summary["skipped"]) + len(summary["errors"])
+            progress({"asset_id": asset_id, "status": status, "completed": completed, "total": total})
+
+    to_download = []
+    for asset_id in asset_ids:
+        if checkpoint.completed(asset_id):
+            summary["skipped"].append(asset_id)
+            report(asset_id, "skipped")
+        else:
+            to_download.append(asset_id)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(_download_asset, asset_id, vs_currency, days, target(asset_id), asset_format,
+                                   asset_compression, use_store, cancel_token): asset_id for asset_id in to_download}
+        for future in as_completed(futures):
+            asset_id = futures[future]
+            if cancel_token is not None and cancel_token.cancelled:
+                summary["cancelled"] = True
+                for pending in futures:
+                    pending.cancel() # Quelli non ancora partiti non partono; il checkpoint resta per riprendere
+            try:
+                result = future.result()
+            except Exception as e: # Anche i future annullati (CancelledError) finiscono qui
+                result = {"error": f"{type(e).__name__}: {e}", "cancelled": future.cancelled()}
+            if result.get("cancelled"):
+                continue
+            if "error" in result:
+                summary["errors"][asset_id] = result["error"]
+                checkpoint.record(asset_id, {"status": "error", "error": result["error"]})
+                report(asset_id, "error")
+            else:
+                summary["done"].append(asset_id)
+                checkpoint.record(asset_id, result)
+                report(asset_id, "done")
+
+    if combined and not summary["cancelled"]:
+        summary["combined_file"] = _merge_parts(asset_ids, checkpoint, output_dir, run_name, file_format,
+                                                compression, vs_currency, summary)
+        if summary["combined_file"] and not summary["errors"]:
+            # Download completo: parti e checkpoint non servono più (un nuovo avvio riscarica tutto)
+            shutil.rmtree(os.path.join(output_dir, BATCH_PARTS_DIR, run_name), ignore_errors=True)
+            checkpoint.remove()
+    elif not combined and not summary["cancelled"] and not summary["errors"]:
+        # Tutti i file sono al loro posto: il checkpoint serve solo a riprendere un download interrotto,
+        # quindi un nuovo avvio con le stesse impostazioni deve riscaricare dati aggiornati
+        checkpoint.remove()
+    return summary
+
+def _merge_parts(asset_ids, checkpoint, output_dir, run_name, file_format, compression, vs_currency, summary):
+    """Unisce le serie scaricate (nell'ordine della lista di asset) nel file unico; None se manca tutto."""
+    ready = [asset_id for asset_id in asset_ids if checkpoint.completed(asset_id)]
+    if not ready:
+        return None
+    path = os.path.join(output_dir, f"{run_name}.{file_format}")
+    parts = ((asset_id, exporters.load_npz(checkpoint.assets[asset_id]["file"])["series"]) for asset_id in ready)
+    temp_path = _part_path(path)
+    try:
+        exporters.export_combined(parts, temp_path, file_format, {"vs_currency": vs_currency},
+                                  compression=compression)
+        os.replace(temp_path, path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        summary["errors"]["(file unico)"] = f"Errore durante il salvataggio: {e}"
+        return None
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scarica i dati storici di più asset, riprendendo i download interrotti.")
+    parser.add_argument("asset_ids", nargs="*", help="ID CoinGecko degli asset (es. bitcoin ethereum)")
+    parser.add_argument("--ids-file", help="File con un ID per riga (le righe che iniziano con # vengono ignorate)")
+    parser.add_argument("--watchlist", action="store_true", help="Aggiunge gli asset della watchlist di config.json")
+    parser.add_argument("--top", type=int, default=0, help="Aggiunge le prime N monete per capitalizzazione")
+    parser.add_argument("--vs", default="usd", help="Valuta di riferimento (default: usd)")
+    parser.add_argument("--days", default="365", help="Giorni di storico o 'max' (default: 365)")
+    parser.add_argument("--format", default="csv", choices=exporters.available_formats(), help="Formato dei file")
+    parser.add_argument("--compression", default=exporters.DEFAULT_COMPRESSION,
+                        help="Compressione per NPZ/Parquet/Arrow ('none' per nessuna)")
+    parser.add_argument("--combined", action="store_true", help="Un unico file con tutti gli asset")
+    parser.add_argument("--out", default="downloads", help="Cartella di destinazione (default: downloads)")
+    parser.add_argument("--workers", type=int, default=BATCH_DOWNLOAD_WORKERS)
+    parser.add_argument("--restart", action="store_true", help="Ignora il checkpoint e riscarica tutto")
+    args = parser.parse_args(argv)
+
+    vs_currency = args.vs.lower()
+    asset_ids = [asset_id.lower() for asset_id in args.asset_ids]
+    if args.ids_file:
+        asset_ids += read_ids_file(args.ids_file)
+    if args.watchlist:
+        asset_ids += watchlist_ids()
+    if args.top:
+        ranked = top_ids(vs_currency, args.top)
+        if isinstance(ranked, dict):
+            print(f"Errore classifica: {ranked['error']}")
+            return 1
+        asset_ids += ranked
+    if not asset_ids:
+        parser.error("indica almeno un asset (argomenti, --ids-file, --watchlist o --top)")
+
+    def print_progress(event):
+        print(f"[{event['completed']}/{event['total']}] {event['asset_id']}: {event['status']}")
+
+    start = time.perf_counter()
+    compression = None if args.compression.lower() == "none" else args.compression.lower()
+    summary = batch_download(asset_ids, vs_currency, args.days, args.out, args.format, compression, args.combined,
+                             args.workers, resume=not args.restart, progress=print_progress)
+    if "error" in summary:
+        print(f"Errore: {summary['error']}")
+        return 1
+    for asset_id, error in sorted(summary["errors"].items()):
+        print(f"{asset_id}: ERRORE {error}")
+    if summary.get("combined_file"):
+        print(f"File unico: {summary['combined_file']}")
+    print(f"{len(summary['done'])} scaricati, {len(summary['skipped'])} già presenti, "
+          f"{len(summary['errors'])} errori in {time.perf_counter() - start:.2f}s.")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
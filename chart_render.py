@@ -0,0 +1,175 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+# Solo la figura e il backend Agg: niente pyplot né Tk, si può usare anche su un server senza display
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.dates as mdates
+
+import downsampling
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+# Stile dei grafici dei prezzi, condiviso da ChartTab e dai grafici generati senza interfaccia
+PRICE_LINE_STYLE = {"color": "dodgerblue", "linewidth": 1.5}
+FIGURE_SIZE = (7, 5) # Pollici
+FIGURE_DPI = 100
+
+RENDER_FORMATS = ("png", "svg")
+RENDER_FETCH_WORKERS = 4 # Scaricamenti in parallelo nel processo principale (il limitatore decide comunque il ritmo)
+
+
+# --- Stile condiviso ---
+
+def timestamps_to_mpl(timestamps_ms):
+    """Timestamp in millisecondi -> date di matplotlib (giorni dall'epoca configurata), senza oggetti datetime."""
+    epoch_offset = mdates.date2num(datetime(1970, 1, 1, tzinfo=timezone.utc))
+    return np.asarray(timestamps_ms) / MS_PER_DAY + epoch_offset
+
+def setup_price_axes(figure, ax):
+    """Applica lo stile fisso del grafico dei prezzi e restituisce la linea (ancora vuota) da riempire con set_data."""
+    (price_line,) = ax.plot([], [], **PRICE_LINE_STYLE)
+    ax.xaxis_date() # L'asse X contiene date di matplotlib
+    ax.set_xlabel("Data", fontsize=10)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    # Migliora la formattazione delle date sull'asse X
+    figure.autofmt_xdate()
+    return price_line
+
+def fit_price_axes(ax, prices):
+    """
+    Adatta gli assi alla serie appena messa nella linea: X in automatico (riattivando l'autoscala, che
+    zoom e spostamenti disattivano), Y dai prezzi originali, perché la linea contiene solo i punti ridotti.
+    """
+    ax.set_autoscale_on(True)
+    ax.relim()
+    ax.autoscale_view(scaley=False)
+    limits = downsampling.value_limits(prices)
+    if limits is not None:
+        ax.set_ylim(*limits)
+
+def set_price_labels(ax, asset_id, vs_currency):
+    """Titolo ed etichetta Y, che dipendono dall'asset mostrato."""
+    ax.set_title(f"Andamento Prezzo di {asset_id.capitalize()} ({vs_currency.upper()})", fontsize=14)
+    ax.set_ylabel(f"Prezzo in {vs_currency.upper()}", fontsize=10)
+
+
+# --- Disegno (eseguito nei processi del pool) ---
+
+def render_price_chart(asset_id, vs_currency, timestamps_ms, prices, output_path, image_format="png",
+                       figure_size=FIGURE_SIZE, dpi=FIGURE_DPI):
+    """
+    Disegna il grafico dei prezzi con il backend Agg e lo salva in output_path (PNG o SVG).
+    La serie viene ridotta alla larghezza in pixel dell'immagine prima del disegno.
+    Restituisce un dizionario con il percorso, i punti disegnati e i secondi impiegati.
+    """
+    start = time.perf_counter()
+    figure = Figure(figsize=figure_size, dpi=dpi)
+    FigureCanvasAgg(figure) # Collega la figura al backend Agg (nessuna finestra)
+    ax = figure.add_subplot(1, 1, 1)
+    price_line = setup_price_axes(figure, ax)
+    set_price_labels(ax, asset_id, vs_currency)
+
+    width_px = int(figure_size[0] * dpi)
+    x_values, y_values = downsampling.downsample(timestamps_to_mpl(timestamps_ms), prices, width_px)
+    price_line.set_data(x_values, y_values)
+    fit_price_axes(ax, prices)
+    figure.savefig(output_path, format=image_format)
+    return {"asset_id": asset_id, "path": output_path, "points": len(x_values),
+            "render_seconds": time.perf_counter() - start}
+
+
+# --- Scaricamento (nel processo principale) e distribuzione sui processi ---
+
+def _fetch_series(asset_id, vs_currency, days):
+    # api_handler (e il suo limitatore) restano nel processo principale: i processi del pool disegnano soltanto
+    import api_handler
+    start = time.perf_counter()
+    result = api_handler.get_historical_market_data(asset_id, vs_currency, days, columnar=True, use_store=True)
+    result["fetch_seconds"] = time.perf_counter() - start
+    return result
+
+def render_charts(asset_ids, vs_currency="usd", days=365, output_dir="charts", image_format="png", workers=None,
+                  dpi=FIGURE_DPI):
+    """
+    Genera un grafico per ogni asset in output_dir (file <asset>_<valuta>_<giorni>d.<formato>).
+    I dati vengono scaricati in parallelo nel processo principale e, appena arrivano, il disegno
+    viene affidato a un ProcessPoolExecutor ('workers' processi, default: numero di CPU): il disegno
+    sfrutta tutti i core invece di essere limitato dal GIL.
+    Restituisce una lista di dizionari (uno per asset) con tempi di scaricamento e disegno, o "error".
+    """
+    image_format = image_format.lower()
+    if image_format not in RENDER_FORMATS:
+        raise ValueError(f"Formato non supportato: {image_format} (usa {', '.join(RENDER_FORMATS)})")
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as render_pool, \
+            ThreadPoolExecutor(max_workers=RENDER_FETCH_WORKERS) as fetch_pool:
+        fetch_futures = {fetch_pool.submit(_fetch_series, asset_id, vs_currency, days): asset_id for asset_id in asset_ids}
+        render_futures = {}
+        for future in as_completed(fetch_futures):
+            asset_id = fetch_futures[future]
+            data = future.result()
+            if "error" in data:
+                results.append({"asset_id": asset_id, "error": data["error"]})
+                continue
+            series = data["series"]
+            output_path = os.path.join(output_dir, f"{asset_id}_{vs_currency}_{days}d.{image_format}")
+            render_future = render_pool.submit(render_price_chart, asset_id, vs_currency, series.timestamp,
+                                               series.price, output_path, image_format, FIGURE_SIZE, dpi)
+            render_futures[render_future] = (asset_id, data["fetch_seconds"])
+
+        for future in as_completed(render_futures):
+            asset_id, fetch_seconds = render_futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"asset_id": asset_id, "error": f"Errore durante il disegno: {e}"}
+            result["fetch_seconds"] = fetch_seconds
+            results.append(result)
+    return results
+
+
+def _read_ids_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip().lower() for line in f if line.strip() and not line.startswith("#")]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera grafici dei prezzi (PNG/SVG) senza interfaccia grafica.")
+    parser.add_argument("asset_ids", nargs="*", help="ID CoinGecko degli asset (es. bitcoin ethereum)")
+    parser.add_argument("--ids-file", help="File con un ID per riga (le righe che iniziano con # vengono ignorate)")
+    parser.add_argument("--vs", default="usd", help="Valuta di riferimento (default: usd)")
+    parser.add_argument("--days", default="365", help="Giorni di storico o 'max' (default: 365)")
+    parser.add_argument("--format", default="png", choices=RENDER_FORMATS, help="Formato delle immagini")
+    parser.add_argument("--out", default="charts", help="Cartella di destinazione (default: charts)")
+    parser.add_argument("--workers", type=int, default=None, help="Processi per il disegno (default: numero di CPU)")
+    parser.add_argument("--dpi", type=int, default=FIGURE_DPI)
+    args = parser.parse_args(argv)
+
+    asset_ids = [asset_id.lower() for asset_id in args.asset_ids]
+    if args.ids_file:
+        asset_ids += _read_ids_file(args.ids_file)
+    if not asset_ids:
+        parser.error("indica almeno un asset (argomenti o --ids-file)")
+
+    start = time.perf_counter()
+    results = render_charts(asset_ids, args.vs.lower(), args.days, args.out, args.format, args.workers, args.dpi)
+    errors = 0
+    for result in sorted(results, key=lambda item: item["asset_id"]):
+        if "error" in result:
+            errors += 1
+            print(f"{result['asset_id']}: ERRORE {result['error']}")
+        else:
+            print(f"{result['asset_id']}: {result['path']} ({result['points']} punti, "
+                  f"scaricamento {result['fetch_seconds']:.2f}s, disegno {result['render_seconds']:.2f}s)")
+    print(f"{len(results) - errors}/{len(results)} grafici generati in {time.perf_counter() - start:.2f}s.")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,278 @@
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import os
+import sys
+
+# Solo moduli leggeri qui: api_handler (requests, numpy), exporters e batch_download vengono importati
+# dai comandi che li usano. tkinter, matplotlib e pandas non servono mai.
+import config_manager
+
+OUTPUT_FORMATS = ("csv", "jsonl")
+FILE_FORMATS = ("csv", "json", "jsonl", "npz", "parquet", "arrow") # Come exporters (Parquet e Arrow richiedono pyarrow)
+
+PRICE_FIELDS = ("asset_id", "vs_currency", "price", "change_24h", "volume_24h", "last_updated", "error")
+RANK_FIELDS = ("rank", "id", "symbol", "name", "current_price", "market_cap", "total_volume_24h",
+               "price_change_1h", "price_change_24h", "price_change_7d", "vs_currency")
+CONVERT_FIELDS = ("amount", "from_asset", "to_currency", "rate", "result", "error")
+
+
+class RowWriter:
+    """Scrive dizionari come righe CSV (con intestazione) o JSON Lines, svuotando il buffer a ogni riga."""
+    def __init__(self, fields, output_format, stream):
+        self.fields = fields
+        self.output_format = output_format
+        self.stream = stream
+        if output_format == "csv":
+            self._csv = csv.writer(self.stream)
+            self._csv.writerow(fields)
+
+    def write(self, row):
+        if self.output_format == "csv":
+            self._csv.writerow(["" if row.get(field) is None else row.get(field) for field in self.fields])
+        else:
+            self.stream.write(json.dumps({field: row.get(field) for field in self.fields if field in row},
+                                         separators=(",", ":")) + "\n")
+        self.stream.flush() # Chi legge da una pipe vede le righe appena sono pronte
+
+
+def _print_error(message):
+    print(f"Errore: {message}", file=sys.stderr)
+
+def _split_list(value):
+    return [item.strip().lower() for item in value.split(",") if item.strip()]
+
+class ConfigValueError(ValueError):
+    """Valore non valido in config.json: main() lo riporta come un errore di argparse."""
+
+def _config_number(app_config, key, convert):
+    value = app_config.get(key, config_manager.DEFAULT_CONFIG[key])
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        raise ConfigValueError(f"valore non valido per '{key}' nel file di configurazione: {value!r}")
+
+def _ordered_results(executor, function, items, window):
+    """
+    Come executor.map, ma con al massimo 'window' richieste in sospeso: la successiva parte solo quando
+    chi legge ha preso il risultato più vecchio, quindi in memoria restano al massimo 'window' serie.
+    """
+    pending = collections.deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending: # Uscita anticipata (es. pipe chiusa): quelle non partite non partono
+            future.cancel()
+
+
+# --- Comandi ---
+
+def cmd_price(args, app_config):
+    import api_handler
+    asset_ids = [asset_id.lower() for asset_id in args.asset_ids] or [
+        app_config.get("price_tab_default_asset_id", config_manager.DEFAULT_CONFIG["price_tab_default_asset_id"])]
+    vs_currency = (args.vs or app_config.get("price_tab_default_currency",
+                                             config_manager.DEFAULT_CONFIG["price_tab_default_currency"])).lower()
+    writer = RowWriter(PRICE_FIELDS, args.format, args.output)
+    errors = 0
+    for asset_id in asset_ids:
+        price_data = api_handler.get_asset_price(asset_id, vs_currency)
+        errors += "error" in price_data
+        writer.write({"asset_id": asset_id, "vs_currency": vs_currency, **price_data})
+    return 1 if errors else 0
+
+def cmd_watchlist(args, app_config):
+    import api_handler
+    import batch_download
+    asset_ids = _split_list(args.ids) if args.ids else batch_download.watchlist_ids(app_config)
+    vs_currencies = _split_list(args.vs) if args.vs else [
+        app_config.get("default_vs_currency", config_manager.DEFAULT_CONFIG["default_vs_currency"])]
+    results = api_handler.get_watchlist_prices(asset_ids, vs_currencies)
+    if isinstance(results.get("error"), str): # Errore globale (nessun dato per nessun asset)
+        _print_error(results["error"])
+        return 1
+
+    writer = RowWriter(PRICE_FIELDS, args.format, args.output)
+    errors = 0
+    for asset_id in asset_ids:
+        asset_data = results.get(asset_id, {})
+        for vs_currency in vs_currencies:
+            row = {"asset_id": asset_id, "vs_currency": vs_currency, "last_updated": asset_data.get("last_updated")}
+            if "error" in asset_data:
+                row["error"] = asset_data["error"]
+            elif vs_currency in asset_data:
+                row.update(asset_data[vs_currency])
+            else:
+                row["error"] = f"Dati non trovati per {asset_id} in {vs_currency}."
+            errors += "error" in row
+            writer.write(row)
+    return 1 if errors else 0
+
+def cmd_rank(args, app_config):
+    import api_handler
+    top_n = args.top or _config_number(app_config, "default_rank_top_n", int)
+    vs_currency = (args.vs or app_config.get("default_vs_currency",
+                                             config_manager.DEFAULT_CONFIG["default_vs_currency"])).lower()
+    writer = RowWriter(RANK_FIELDS, args.format, args.output)
+    # Le pagine arrivano in parallelo e in ordine sparso: ognuna viene scritta appena tocca a lei
+    waiting = {}
+    next_page = 1
+    for page_result in api_handler.iter_market_cap_ranking(vs_currency, top_n):
+        if "error" in page_result:
+            _print_error(page_result["error"])
+            return 1
+        waiting[page_result["page"]] = page_result["coins"]
+        while next_page in waiting:
+            for coin in waiting.pop(next_page):
+                writer.write(coin)
+            next_page += 1
+    return 0
+
+def cmd_history(args, app_config):
+    vs_currency = (args.vs or app_config.get("default_vs_currency",
+                                             config_manager.DEFAULT_CONFIG["default_vs_currency"])).lower()
+    days = args.days or str(app_config.get("default_download_days", config_manager.DEFAULT_CONFIG["default_download_days"]))
+    import batch_download
+    asset_ids = [asset_id.lower() for asset_id in args.asset_ids]
+    if args.ids_file:
+        asset_ids += batch_download.read_ids_file(args.ids_file)
+    if args.watchlist:
+        asset_ids += batch_download.watchlist_ids(app_config)
+    if not asset_ids:
+        _print_error("indica almeno un asset (argomenti, --ids-file o --watchlist)")
+        return 2
+    # L'archivio locale si usa solo se richiesto: un comando di sola lettura non crea file nella cartella corrente
+    use_store = bool(args.store)
+    if use_store:
+        import history_store
+        history_store.configure_history_store(args.store)
+
+    if args.out_dir:
+        # Su file: stesso motore del download multiplo (tutti i formati, checkpoint e ripresa)
+        summary = batch_download.batch_download(asset_ids, vs_currency, days, args.out_dir, args.file_format,
+                                                combined=args.combined, workers=args.workers,
+                                                resume=not args.restart, use_store=use_store)
+        if "error" in summary:
+            _print_error(summary["error"])
+            return 1
+        for asset_id, error in sorted(summary["errors"].items()):
+            _print_error(f"{asset_id}: {error}")
+        print(f"{len(summary['done'])} scaricati, {len(summary['skipped'])} già presenti, "
+              f"{len(summary['errors'])} errori.", file=sys.stderr)
+        return 1 if summary["errors"] else 0
+
+    # Su stdout: le serie vengono scaricate in parallelo ma scritte nell'ordine indicato, una alla volta
+    import api_handler
+    import exporters
+    from concurrent.futures import ThreadPoolExecutor
+    workers = max(1, args.workers)
+    errors = []
+    def parts(results):
+        for asset_id, data in zip(asset_ids, results):
+            if "error" in data:
+                errors.append(asset_id)
+                _print_error(f"{asset_id}: {data['error']}")
+                continue
+            yield asset_id, data["series"]
+            args.output.flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = _ordered_results(executor, lambda asset_id: api_handler.get_historical_market_data(
+            asset_id, vs_currency, days, columnar=True, use_store=use_store), asset_ids, workers)
+        exporters.write_combined_text(parts(results), args.output, args.format)
+    return 1 if errors else 0
+
+def cmd_convert(args, app_config):
+    import api_handler
+    amount = args.amount if args.amount is not None else _config_number(app_config, "converter_tab_default_amount", float)
+    from_asset = (args.from_asset or app_config.get("converter_tab_default_from_asset",
+                                                    config_manager.DEFAULT_CONFIG["converter_tab_default_from_asset"])).lower()
+    to_currency = (args.to_currency or app_config.get("converter_tab_default_to_currency",
+                                                      config_manager.DEFAULT_CONFIG["converter_tab_default_to_currency"])).lower()
+    rate_info = api_handler.get_asset_price(from_asset, to_currency)
+    row = {"amount": amount, "from_asset": from_asset, "to_currency": to_currency}
+    rate = rate_info.get("price")
+    if "error" in rate_info:
+        row["error"] = rate_info["error"]
+    elif isinstance(rate, (int, float)):
+        row.update({"rate": rate, "result": amount * rate})
+    else:
+        row["error"] = "Tasso di cambio non disponibile."
+    RowWriter(CONVERT_FIELDS, args.format, args.output).write(row)
+    return 1 if "error" in row else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="PyCryptoDesk da terminale: stessi dati e stessa config.json dell'interfaccia, senza Tk.")
+    parser.add_argument("--config", default=config_manager.CONFIG_FILE_PATH,
+                        help=f"File di configurazione (default: {config_manager.CONFIG_FILE_PATH})")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="Formato dell'output su stdout (default: csv)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    price = subparsers.add_parser("price", help="Prezzo attuale di uno o più asset")
+    price.add_argument("asset_ids", nargs="*", help="ID CoinGecko (default: quello della scheda Prezzo)")
+    price.add_argument("--vs", help="Valuta di riferimento")
+    price.set_defaults(handler=cmd_price)
+
+    watchlist = subparsers.add_parser("watchlist", help="Istantanea dei prezzi della watchlist")
+    watchlist.add_argument("--ids", help="ID separati da virgole (default: watchlist di config.json)")
+    watchlist.add_argument("--vs", help="Valute separate da virgole (es. usd,eur)")
+    watchlist.set_defaults(handler=cmd_watchlist)
+
+    rank = subparsers.add_parser("rank", help="Classifica per capitalizzazione di mercato")
+    rank.add_argument("--top", type=int, help="Numero di monete")
+    rank.add_argument("--vs", help="Valuta di riferimento")
+    rank.set_defaults(handler=cmd_rank)
+
+    history = subparsers.add_parser("history", help="Dati storici (su stdout, o su file con --out-dir)")
+    history.add_argument("asset_ids", nargs="*", help="ID CoinGecko degli asset")
+    history.add_argument("--ids-file", help="File con un ID per riga")
+    history.add_argument("--watchlist", action="store_true", help="Aggiunge gli asset della watchlist")
+    history.add_argument("--vs", help="Valuta di riferimento")
+    history.add_argument("--days", help="Giorni di storico o 'max'")
+    history.add_argument("--workers", type=int, default=4, help="Scaricamenti contemporanei")
+    history.add_argument("--out-dir", help="Scrive i file in questa cartella invece che su stdout (con ripresa)")
+    history.add_argument("--file-format", default="csv", choices=FILE_FORMATS, help="Formato dei file con --out-dir")
+    history.add_argument("--combined", action="store_true", help="Con --out-dir: un unico file per tutti gli asset")
+    history.add_argument("--restart", action="store_true",
+                         help="Con --out-dir: ignora il checkpoint di un download interrotto e riscarica tutto")
+    history.add_argument("--store", metavar="PATH",
+                         help="Legge e aggiorna l'archivio storico locale in questo file SQLite (default: nessun archivio)")
+    history.set_defaults(handler=cmd_history)
+
+    convert = subparsers.add_parser("convert", help="Converte un importo da un asset a una valuta")
+    convert.add_argument("amount", type=float, nargs="?")
+    convert.add_argument("from_asset", nargs="?")
+    convert.add_argument("to_currency", nargs="?")
+    convert.set_defaults(handler=cmd_convert)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Solo le righe di dati vanno su stdout: i messaggi che config_manager e api_handler stampano con print
+    # (config creata o aggiornata, nuovi tentativi dopo un 429, archivio storico...), anche dai thread,
+    # finiscono su stderr, così l'output si può passare a un'altra pipe senza righe estranee
+    args.output = sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            app_config = config_manager.ConfigStore(args.config).get()
+            return args.handler(args, app_config)
+    except ConfigValueError as e:
+        parser.error(str(e)) # Come gli errori sugli argomenti: uso su stderr e codice di uscita 2
+    except BrokenPipeError:
+        # L'output è stato chiuso (es. "| head"): si esce in silenzio, senza un secondo errore in chiusura
+        os.dup2(os.open(os.devnull, os.O_WRONLY), args.output.fileno())
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
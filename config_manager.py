@@ -1,91 +1,295 @@
-import json
-import os
-
-CONFIG_FILE_PATH = "config.json"
-
-DEFAULT_CONFIG = {
-    "watchlist_ids": ["bitcoin", "ethereum", "cardano", "solana", "dogecoin", "tron"],
-    "default_vs_currency": "usd",
-    "default_rank_top_n": 20,
-    "default_download_days": 30,
-    "price_tab_default_asset_id": "bitcoin",
-    "price_tab_default_currency": "usd", # Potrebbe essere uguale a default_vs_currency
-    "converter_tab_default_amount": "1",
-    "converter_tab_default_from_asset": "bitcoin",
-    "converter_tab_default_to_currency": "eur", # Magari diversa per mostrare la differenza
-    "download_tab_default_asset_id": "bitcoin",
-    "download_tab_default_file_format": "CSV"
-    # Potremmo aggiungere altre impostazioni qui in futuro
-    # come le valute preferite per le ComboBox, tema dell'app, ecc.
-}
-
-def load_config():
-    if not os.path.exists(CONFIG_FILE_PATH):
-        print(f"File di configurazione '{CONFIG_FILE_PATH}' non trovato. Creazione con valori di default...")
-        save_config(DEFAULT_CONFIG) 
-        return DEFAULT_CONFIG
-    
-    try:
-        with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
-            # Aggiungiamo un semplice meccanismo di "migrazione" o aggiornamento:
-            # se mancano chiavi nel file caricato, le aggiungiamo dai default.
-            updated = False
-            for key, value in DEFAULT_CONFIG.items():
-                if key not in config_data:
-                    config_data[key] = value
-                    updated = True
-            if updated:
-                print("Configurazione aggiornata con nuove chiavi di default. Salvataggio...")
-                save_config(config_data)
-            return config_data
-    except json.JSONDecodeError:
-        print(f"Errore nella decodifica di '{CONFIG_FILE_PATH}'. Il file potrebbe essere corrotto.")
-        print("Utilizzo e salvataggio della configurazione di default.")
-        save_config(DEFAULT_CONFIG) 
-        return DEFAULT_CONFIG
-    except Exception as e:
-        print(f"Errore imprevisto durante il caricamento della configurazione: {e}")
-        print("Utilizzo e salvataggio della configurazione di default.")
-        save_config(DEFAULT_CONFIG) 
-        return DEFAULT_CONFIG
-
-def save_config(config_data):
-    try:
-        with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, indent=4, ensure_ascii=False)
-        print(f"Configurazione salvata in '{CONFIG_FILE_PATH}'")
-        return True
-    except Exception as e:
-        print(f"Errore durante il salvataggio della configurazione: {e}")
-        return False
-
-# Esempio di come usare le funzioni (puoi testarlo eseguendo questo file direttamente)
-if __name__ == "__main__":
-    print("Test del config_manager...")
-    
-    # Simula la prima esecuzione (cancella il file se esiste per testare la creazione)
-    if os.path.exists(CONFIG_FILE_PATH):
-        print(f"Rimuovo il file '{CONFIG_FILE_PATH}' esistente per il test...")
-        os.remove(CONFIG_FILE_PATH)
-        
-    print("\nCaricamento configurazione (dovrebbe creare il file di default):")
-    current_config = load_config()
-    print("Configurazione caricata/creata:", current_config)
-    
-    print(f"\nVerifica se '{CONFIG_FILE_PATH}' è stato creato:")
-    print(f"Esiste? {os.path.exists(CONFIG_FILE_PATH)}")
-
-    print("\nModifica di un valore e salvataggio:")
-    current_config["watchlist_ids"].append("polkadot")
-    current_config["default_vs_currency"] = "eur"
-    if save_config(current_config):
-        print("Ricaricamento della configurazione per verificare le modifiche:")
-        reloaded_config = load_config()
-        print("Configurazione ricaricata:", reloaded_config)
-        if reloaded_config["default_vs_currency"] == "eur" and "polkadot" in reloaded_config["watchlist_ids"]:
-            print("Test di modifica e ricaricamento riuscito!")
-        else:
-            print("ERRORE nel test di modifica e ricaricamento.")
-    else:
+import json
+import os
+import copy
+import threading
+import time
+import atexit
+import tempfile
+
+CONFIG_FILE_PATH = "config.json"
+CONFIG_BACKUP_SUFFIX = ".bak"   # Ultima copia valida, usata se config.json risulta corrotto
+CONFIG_SAVE_DELAY = 1.0         # Secondi di "quiete" prima di scrivere le modifiche raggruppate
+
+DEFAULT_CONFIG = {
+    "watchlist_ids": ["bitcoin", "ethereum", "cardano", "solana", "dogecoin", "tron"],
+    "default_vs_currency": "usd",
+    "default_rank_top_n": 20,
+    "default_download_days": 30,
+    "price_tab_default_asset_id": "bitcoin",
+    "price_tab_default_currency": "usd", # Potrebbe essere uguale a default_vs_currency
+    "converter_tab_default_amount": "1",
+    "converter_tab_default_from_asset": "bitcoin",
+    "converter_tab_default_to_currency": "eur", # Magari diversa per mostrare la differenza
+    "download_tab_default_asset_id": "bitcoin",
+    "download_tab_default_file_format": "CSV",
+    "download_tab_batch_dir": "downloads",     # Cartella del download multiplo
+    "download_tab_batch_top_n": 100,           # Monete scaricate con la sorgente "Prime N"
+    # Aggiornamento automatico della watchlist (solo mentre la scheda è visibile)
+    "watchlist_auto_refresh": True,
+    "watchlist_auto_refresh_seconds": 60,      # Intervallo normale
+    "watchlist_auto_refresh_max_seconds": 600, # Intervallo massimo quando si rallenta (limite API, dati fermi, inattività)
+    "watchlist_idle_after_seconds": 300        # Senza input dell'utente per questo tempo la finestra è "inattiva"
+    # Potremmo aggiungere altre impostazioni qui in futuro
+    # come le valute preferite per le ComboBox, tema dell'app, ecc.
+}
+
+def _load_json_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_config_file(config_data, path=CONFIG_FILE_PATH):
+    """
+    Scrittura atomica: il JSON va in un file temporaneo nella stessa cartella, che viene
+    sincronizzato su disco (fsync) e poi rinominato sopra config.json. Un crash a metà
+    scrittura lascia quindi il file vecchio intatto. Dopo la sostituzione la stessa
+    configurazione viene copiata (sempre in modo atomico) in config.json.bak.
+    """
+    temp_path = None
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(config_data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, path) # Rinomina atomica
+        temp_path = None
+        # Copia dell'ultima versione scritta correttamente, per il recupero in caso di file corrotto
+        _write_backup(config_data, path + CONFIG_BACKUP_SUFFIX, directory)
+        print(f"Configurazione salvata in '{path}'")
+        return True
+    except Exception as e:
+        print(f"Errore durante il salvataggio della configurazione: {e}")
+        return False
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _write_backup(config_data, backup_path, directory):
+    fd, temp_path = tempfile.mkstemp(prefix=".config-bak-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(config_data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, backup_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _recover_from_backup(path):
+    """Prova a recuperare la configurazione dall'ultima copia valida; None se non c'è."""
+    backup_path = path + CONFIG_BACKUP_SUFFIX
+    if not os.path.exists(backup_path):
+        return None
+    try:
+        config_data = _load_json_file(backup_path)
+    except (OSError, ValueError):
+        return None
+    print(f"Configurazione recuperata dalla copia di backup '{backup_path}'.")
+    return config_data
+
+def _read_config_file(path=CONFIG_FILE_PATH):
+    """Legge il file di configurazione (creandolo o completandolo con i default se serve)."""
+    if not os.path.exists(path):
+        print(f"File di configurazione '{path}' non trovato. Creazione con valori di default...")
+        default_config = copy.deepcopy(DEFAULT_CONFIG) # Copia: la config verrà modificata dalle schede
+        _write_config_file(default_config, path)
+        return default_config
+    
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config_data = json.load(f)
+            # Aggiungiamo un semplice meccanismo di "migrazione" o aggiornamento:
+            # se mancano chiavi nel file caricato, le aggiungiamo dai default.
+            updated = False
+            for key, value in DEFAULT_CONFIG.items():
+                if key not in config_data:
+                    config_data[key] = copy.deepcopy(value)
+                    updated = True
+            if updated:
+                print("Configurazione aggiornata con nuove chiavi di default. Salvataggio...")
+                _write_config_file(config_data, path)
+            return config_data
+    except json.JSONDecodeError:
+        print(f"Errore nella decodifica di '{path}'. Il file potrebbe essere corrotto.")
+        recovered_config = _recover_from_backup(path)
+        if isinstance(recovered_config, dict):
+            for key, value in DEFAULT_CONFIG.items():
+                recovered_config.setdefault(key, copy.deepcopy(value))
+            _write_config_file(recovered_config, path)
+            return recovered_config
+        print("Utilizzo e salvataggio della configurazione di default.")
+        default_config = copy.deepcopy(DEFAULT_CONFIG)
+        _write_config_file(default_config, path)
+        return default_config
+    except Exception as e:
+        print(f"Errore imprevisto durante il caricamento della configurazione: {e}")
+        print("Utilizzo e salvataggio della configurazione di default.")
+        default_config = copy.deepcopy(DEFAULT_CONFIG)
+        _write_config_file(default_config, path)
+        return default_config
+
+
+class ConfigStore:
+    """
+    Configurazione condivisa da tutto il processo.
+    Il file viene letto una sola volta; tutte le schede ricevono lo stesso dizionario,
+    quindi una modifica fatta da una scheda (es. la watchlist) è subito visibile alle altre.
+    Il file viene riletto solo se la sua data di modifica cambia (es. modificato a mano).
+    schedule_save() raggruppa le modifiche ravvicinate e le scrive con un thread di sfondo
+    dopo CONFIG_SAVE_DELAY secondi di quiete, senza bloccare l'interfaccia.
+    """
+    def __init__(self, path=CONFIG_FILE_PATH, save_delay=CONFIG_SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self._config = {}   # Dizionario condiviso: viene aggiornato sul posto, mai sostituito
+        self._mtime = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()     # Una scrittura su disco alla volta, nell'ordine giusto
+        self._pending_cond = threading.Condition(self._lock)
+        self._pending_snapshot = None           # Copia della config ancora da scrivere
+        self._pending_due_at = 0.0
+        self._writer_thread = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self):
+        """Restituisce il dizionario di configurazione condiviso, rileggendo il file solo se è cambiato."""
+        with self._lock:
+            # Se ci sono modifiche non ancora scritte, la copia in memoria è quella giusta
+            has_unsaved_changes = self._pending_snapshot is not None or self._write_lock.locked()
+            if not self._loaded or (not has_unsaved_changes and self._file_mtime() != self._mtime):
+                config_data = _read_config_file(self.path)
+                if config_data is not self._config:
+                    self._config.clear()
+                    self._config.update(config_data)
+                self._mtime = self._file_mtime()
+                self._loaded = True
+            return self._config
+
+    def _update_shared(self, config_data):
+        if config_data is not None and config_data is not self._config:
+            self._config.clear()
+            self._config.update(config_data)
+
+    def _write_snapshot(self, snapshot):
+        """Scrive una copia della config; va chiamato tenendo _write_lock."""
+        saved = _write_config_file(snapshot, self.path)
+        if saved:
+            with self._lock:
+                # Il file ora corrisponde alla config in memoria: non serve rileggerlo
+                self._mtime = self._file_mtime()
+                self._loaded = True
+        return saved
+
+    def save(self, config_data=None):
+        """Salva subito (in modo sincrono) la configurazione, di default quella condivisa."""
+        with self._write_lock:
+            with self._lock:
+                self._update_shared(config_data)
+                self._pending_snapshot = None # Questa scrittura include anche le modifiche in attesa
+                snapshot = copy.deepcopy(self._config)
+            return self._write_snapshot(snapshot)
+
+    def schedule_save(self, config_data=None):
+        """
+        Programma il salvataggio: la modifica è subito visibile in memoria, mentre la scrittura
+        su disco avviene in un thread di sfondo dopo save_delay secondi senza altre modifiche.
+        N modifiche ravvicinate producono una sola scrittura.
+        """
+        with self._lock:
+            self._update_shared(config_data)
+            # Copia fatta qui, nel thread chiamante: le schede possono continuare a modificare la config
+            self._pending_snapshot = copy.deepcopy(self._config)
+            self._pending_due_at = time.monotonic() + self.save_delay
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(target=self._writer_loop, name="config-writer", daemon=True)
+                self._writer_thread.start()
+            self._pending_cond.notify()
+        return True
+
+    def _take_pending(self):
+        with self._lock:
+            snapshot = self._pending_snapshot
+            self._pending_snapshot = None
+            return snapshot
+
+    def _writer_loop(self):
+        while True:
+            with self._lock:
+                while self._pending_snapshot is None:
+                    self._pending_cond.wait()
+                # Aspettiamo il periodo di quiete: ogni nuova modifica lo fa ripartire
+                while self._pending_snapshot is not None:
+                    remaining = self._pending_due_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._pending_cond.wait(remaining)
+            with self._write_lock:
+                snapshot = self._take_pending()
+                if snapshot is not None:
+                    self._write_snapshot(snapshot)
+
+    def flush(self):
+        """Scrive subito le modifiche in attesa (usato all'uscita dal programma)."""
+        with self._write_lock:
+            snapshot = self._take_pending()
+            if snapshot is not None:
+                return self._write_snapshot(snapshot)
+        return True
+
+
+# Configurazione condivisa da tutte le schede
+config_store = ConfigStore()
+
+def load_config():
+    """Restituisce la configurazione condivisa (letta da disco solo la prima volta o se il file cambia)."""
+    return config_store.get()
+
+def save_config(config_data):
+    return config_store.save(config_data)
+
+def schedule_save(config_data=None):
+    """Salvataggio raggruppato e in background (vedi ConfigStore.schedule_save)."""
+    return config_store.schedule_save(config_data)
+
+# Le modifiche ancora in attesa vengono scritte prima che il processo termini
+atexit.register(config_store.flush)
+
+# Esempio di come usare le funzioni (puoi testarlo eseguendo questo file direttamente)
+if __name__ == "__main__":
+    print("Test del config_manager...")
+    
+    # Simula la prima esecuzione (cancella il file se esiste per testare la creazione)
+    if os.path.exists(CONFIG_FILE_PATH):
+        print(f"Rimuovo il file '{CONFIG_FILE_PATH}' esistente per il test...")
+        os.remove(CONFIG_FILE_PATH)
+        
+    print("\nCaricamento configurazione (dovrebbe creare il file di default):")
+    current_config = load_config()
+    print("Configurazione caricata/creata:", current_config)
+    
+    print(f"\nVerifica se '{CONFIG_FILE_PATH}' è stato creato:")
+    print(f"Esiste? {os.path.exists(CONFIG_FILE_PATH)}")
+
+    print("\nModifica di un valore e salvataggio:")
+    current_config["watchlist_ids"].append("polkadot")
+    current_config["default_vs_currency"] = "eur"
+    if save_config(current_config):
+        print("Ricaricamento della configurazione per verificare le modifiche:")
+        reloaded_config = load_config()
+        print("Configurazione ricaricata:", reloaded_config)
+        if reloaded_config["default_vs_currency"] == "eur" and "polkadot" in reloaded_config["watchlist_ids"]:
+            print("Test di modifica e ricaricamento riuscito!")
+        else:
+            print("ERRORE nel test di modifica e ricaricamento.")
+    else:
         print("ERRORE nel salvataggio della configurazione modificata.")
\ No newline at end of file
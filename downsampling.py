@@ -0,0 +1,120 @@
+import numpy as np
+
+# Sotto questo numero di punti non conviene ridurre: si disegna tutto
+DOWNSAMPLE_MIN_POINTS = 3
+
+
+def _finite(x, y):
+    """Toglie i punti con valore mancante (NaN), che né LTTB né min/max sanno gestire."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    mask = np.isfinite(y)
+    if mask.all():
+        return x, y
+    return x[mask], y[mask]
+
+def _bucket_edges(length, n_buckets):
+    # Indici di inizio dei bucket (l'ultimo valore è la fine dell'array), come suddivisione uniforme per posizione
+    return np.linspace(0, length, n_buckets + 1).astype(np.int64)
+
+
+def _first_match_per_bucket(y, bucket_values, starts, counts):
+    """Per ogni bucket, indice del primo punto uguale al valore del bucket (minimo o massimo)."""
+    positions = np.flatnonzero(y == np.repeat(bucket_values, counts))
+    buckets = np.searchsorted(starts, positions, side="right") - 1
+    _, first = np.unique(buckets, return_index=True)
+    return positions[first]
+
+def minmax_downsample(x, y, n_buckets):
+    """
+    Divide la serie in n_buckets gruppi consecutivi e per ognuno tiene il punto minimo e il massimo
+    (nell'ordine in cui compaiono); come in LTTB il primo e l'ultimo punto restano sempre, così la
+    linea copre tutto l'intervallo e l'ultimo prezzo è visibile. Completamente vettoriale: con un
+    bucket per pixel il disegno è indistinguibile dall'originale, picchi compresi.
+    Restituisce al massimo 2 * n_buckets + 2 punti.
+    """
+    x, y = _finite(x, y)
+    length = len(y)
+    if n_buckets <= 0 or length <= 2 * n_buckets:
+        return x, y
+    starts = _bucket_edges(length, n_buckets)[:-1]
+    starts = np.unique(starts) # Per sicurezza, nessun bucket vuoto
+
+    counts = np.diff(np.append(starts, length))
+    min_index = _first_match_per_bucket(y, np.minimum.reduceat(y, starts), starts, counts)
+    max_index = _first_match_per_bucket(y, np.maximum.reduceat(y, starts), starts, counts)
+
+    # unique restituisce già gli indici ordinati (e toglie il primo e l'ultimo se erano già un minimo o un massimo)
+    keep = np.unique(np.concatenate([[0], min_index, max_index, [length - 1]]))
+    return x[keep], y[keep]
+
+def lttb_downsample(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: sceglie n_out punti che conservano la forma della serie.
+    Il primo e l'ultimo punto restano; per ogni bucket intermedio si prende il punto che forma
+    il triangolo più grande con il punto scelto nel bucket precedente e la media del bucket successivo.
+    Il ciclo è sui bucket (n_out iterazioni), il lavoro dentro ogni bucket è vettoriale: il costo
+    totale è lineare nella lunghezza della serie.
+    """
+    x, y = _finite(x, y)
+    length = len(y)
+    if n_out >= length or n_out < DOWNSAMPLE_MIN_POINTS:
+        return x, y
+
+    # Bucket sui punti interni (il primo e l'ultimo sono fissi)
+    edges = 1 + _bucket_edges(length - 2, n_out - 2)
+    # Medie di ogni bucket in un colpo solo (servono come terzo vertice del triangolo)
+    sums_x = np.add.reduceat(x[1:-1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:-1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1]) # Dopo l'ultimo bucket c'è l'ultimo punto
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        # Doppia area del triangolo (punto precedente, candidato, media del bucket successivo)
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return x[selected], y[selected]
+
+
+def downsample(x, y, max_points, method="lttb"):
+    """
+    Riduce la serie a circa max_points punti per il disegno ('lttb' oppure 'minmax').
+    Se la serie è già abbastanza corta viene restituita così com'è (senza i NaN).
+    """
+    if method == "minmax":
+        return minmax_downsample(x, y, max(1, max_points // 2))
+    if method == "lttb":
+        return lttb_downsample(x, y, max_points)
+    raise ValueError(f"Metodo di riduzione sconosciuto: {method}")
+
+def value_limits(y, margin=0.05):
+    """
+    Limiti dell'asse Y calcolati sui valori originali (non su quelli ridotti, che con LTTB possono
+    perdere il minimo o il massimo): minimo e massimo dei valori validi più 'margin' dell'ampiezza
+    per parte, come i margini predefiniti di matplotlib. None se non c'è nessun valore valido.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    finite = y[np.isfinite(y)]
+    if finite.size == 0:
+        return None
+    low, high = float(finite.min()), float(finite.max())
+    padding = (high - low) * margin or abs(high) * margin or 1.0 # Serie piatta: un margine comunque visibile
+    return low - padding, high + padding
+
+def visible_slice(x, x_min, x_max, margin=1):
+    """
+    Indici (start, stop) dei punti di x (ordinato) che cadono fra x_min e x_max, più 'margin'
+    punti per parte, così la linea arriva fino ai bordi del grafico anche dopo uno zoom.
+    """
+    start = max(0, int(np.searchsorted(x, x_min, side="left")) - margin)
+    stop = min(len(x), int(np.searchsorted(x, x_max, side="right")) + margin)
+    return start, stop
@@ -0,0 +1,363 @@
+import csv
+import json
+import zipfile
+
+import numpy as np
+
+from historical_series import HistoricalSeries, COLUMNS
+
+try: # Parquet e Arrow sono opzionali: servono solo se pyarrow è installato
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+EXPORT_CHUNK_SIZE = 10000 # Righe formattate e scritte per volta (e frequenza dei messaggi di avanzamento)
+EXPORT_FIELDS = ("timestamp", "date", "price", "market_cap", "total_volume")
+TEXT_FORMATS = ("csv", "json", "jsonl")
+BINARY_FORMATS = ("npz", "parquet", "arrow")
+PYARROW_FORMATS = ("parquet", "arrow")
+# Compressioni disponibili per formato binario (None = nessuna, la prima è quella predefinita).
+# L'NPZ "zip" usa deflate, lo stesso algoritmo di gzip; solo l'NPZ e l'Arrow non compressi
+# si possono rileggere in memory-map senza copiare i dati.
+BINARY_COMPRESSIONS = {
+    "npz": (None, "zip"),
+    "parquet": ("zstd", "gzip", "snappy", None),
+    "arrow": (None, "zstd", "lz4"),
+}
+DEFAULT_COMPRESSION = "default" # In export_history: la prima compressione di BINARY_COMPRESSIONS per il formato
+
+_COMPACT = (",", ":") # JSON senza spazi superflui
+
+
+def _row_chunks(source, chunk_size):
+    """
+    Restituisce la sorgente a blocchi di tuple (timestamp, date, price, market_cap, total_volume).
+    'source' può essere un HistoricalSeries (le date vengono formattate un blocco alla volta)
+    oppure un iterabile di dizionari nel vecchio formato data_points.
+    """
+    if isinstance(source, HistoricalSeries):
+        rows = source.iter_rows(chunk_size=chunk_size)
+    else:
+        rows = (tuple(point.get(field) for field in EXPORT_FIELDS) for point in source)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _total_rows(source):
+    try:
+        return len(source)
+    except TypeError:
+        return None # Iteratore: lunghezza sconosciuta
+
+def _report(progress, written, total):
+    if progress is not None:
+        progress(written, total)
+
+
+def write_csv(source, file_obj, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Scrive i punti in CSV (intestazione + una riga per punto) sul file di testo già aperto
+    (aprirlo con newline=''). La memoria usata non dipende dalla lunghezza della serie.
+    progress(righe_scritte, totale) viene chiamata dopo ogni blocco. Restituisce le righe scritte.
+    """
+    writer = csv.writer(file_obj)
+    writer.writerow(EXPORT_FIELDS)
+    total = _total_rows(source)
+    written = 0
+    for chunk in _row_chunks(source, chunk_size):
+        writer.writerows(chunk) # None diventa una cella vuota, come faceva DictWriter
+        written += len(chunk)
+        _report(progress, written, total)
+    return written
+
+def write_json(source, file_obj, metadata=None, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Scrive un unico documento JSON compatto: i campi di 'metadata' (es. asset_id, vs_currency)
+    più "data_points", la lista dei punti. Il documento viene prodotto a pezzi, senza costruirlo in memoria.
+    """
+    file_obj.write("{")
+    for key, value in (metadata or {}).items():
+        file_obj.write(f"{json.dumps(key)}:{json.dumps(value, separators=_COMPACT)},")
+    file_obj.write('"data_points":[')
+    total = _total_rows(source)
+    written = 0
+    for chunk in _row_chunks(source, chunk_size):
+        parts = [json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=_COMPACT) for row in chunk]
+        if written:
+            file_obj.write(",")
+        file_obj.write(",".join(parts))
+        written += len(chunk)
+        _report(progress, written, total)
+    file_obj.write("]}")
+    return written
+
+def write_jsonl(source, file_obj, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """Scrive un oggetto JSON compatto per riga (JSON Lines): facile da leggere in streaming o da concatenare."""
+    total = _total_rows(source)
+    written = 0
+    for chunk in _row_chunks(source, chunk_size):
+        file_obj.write("".join(json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=_COMPACT) + "\n" for row in chunk))
+        written += len(chunk)
+        _report(progress, written, total)
+    return written
+
+
+def available_formats():
+    """Formati utilizzabili in questo ambiente: Parquet e Arrow solo se pyarrow è installato."""
+    return [file_format for file_format in TEXT_FORMATS + BINARY_FORMATS
+            if pa is not None or file_format not in PYARROW_FORMATS]
+
+def _series_of(historical_data):
+    series = historical_data.get("series")
+    if series is None:
+        # Vecchio formato a lista di dizionari: lo riportiamo in colonne
+        points = historical_data.get("data_points", [])
+        series = HistoricalSeries(
+            [point.get("timestamp") for point in points],
+            *[[np.nan if point.get(name) is None else point.get(name) for point in points] for name in COLUMNS[1:]])
+    return series
+
+def _check_compression(file_format, compression):
+    if compression not in BINARY_COMPRESSIONS[file_format]:
+        raise ValueError(f"Compressione '{compression}' non supportata per {file_format.upper()}.")
+
+
+# --- Formati binari colonnari (tipi conservati: timestamp int64 in ms, valori float64 con NaN se mancanti) ---
+
+def write_npz(series, path, metadata=None, compression=None):
+    """
+    Salva le colonne in un archivio NumPy .npz (un array per colonna, più i metadati come stringhe 0-d).
+    Con compression="zip" l'archivio è compresso (deflate); senza compressione load_npz lo rilegge in memory-map.
+    """
+    _check_compression("npz", compression)
+    arrays = dict(series.columns())
+    for key, value in (metadata or {}).items():
+        arrays[f"meta_{key}"] = np.array(str(value))
+    save = np.savez_compressed if compression == "zip" else np.savez
+    with open(path, 'wb') as f: # Con un file aperto np.savez non aggiunge l'estensione .npz al nome
+        save(f, **arrays)
+    return len(series)
+
+def _arrow_table(series, metadata=None):
+    # pa.array su array numpy float64/int64 non copia i dati
+    arrays = [pa.array(series.timestamp).view(pa.timestamp("ms", tz="UTC"))]
+    arrays += [pa.array(getattr(series, name)) for name in COLUMNS[1:]]
+    schema_metadata = {key: str(value) for key, value in (metadata or {}).items()}
+    return pa.Table.from_arrays(arrays, names=list(COLUMNS), metadata=schema_metadata)
+
+def _require_pyarrow(file_format):
+    if pa is None:
+        raise RuntimeError(f"Il formato {file_format.upper()} richiede il pacchetto opzionale pyarrow (pip install pyarrow).")
+
+def write_parquet(series, path, metadata=None, compression="zstd"):
+    """Salva le colonne in Parquet (timestamp come timestamp[ms, UTC]); compressione zstd, gzip, snappy o nessuna."""
+    _require_pyarrow("parquet")
+    _check_compression("parquet", compression)
+    pyarrow.parquet.write_table(_arrow_table(series, metadata), path, compression=compression or "none")
+    return len(series)
+
+def write_arrow(series, path, metadata=None, compression=None):
+    """
+    Salva le colonne in un file Arrow IPC (Feather v2) con un unico record batch.
+    Senza compressione load_arrow lo rilegge in memory-map senza copie; con zstd o lz4 il file è più piccolo
+    ma la lettura deve decomprimere.
+    """
+    _require_pyarrow("arrow")
+    _check_compression("arrow", compression)
+    table = _arrow_table(series, metadata)
+    options = pyarrow.ipc.IpcWriteOptions(compression=compression)
+    with pyarrow.ipc.new_file(path, table.schema, options=options) as writer:
+        writer.write_table(table, max_chunksize=max(1, len(series)))
+    return len(series)
+
+
+def _npz_member_memmap(path, info):
+    """Memory-map di un array non compresso dentro un .npz: l'offset dei dati si ricava dall'intestazione zip e .npy."""
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_length = int.from_bytes(local_header[26:28], "little")
+        extra_length = int.from_bytes(local_header[28:30], "little")
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version not in ((1, 0), (2, 0)):
+            return None # Versione dell'intestazione sconosciuta: si legge normalmente
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        offset = f.tell()
+    if dtype.hasobject:
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape, order='F' if fortran_order else 'C', offset=offset)
+
+def load_npz(path, mmap=True):
+    """
+    Rilegge un file scritto da write_npz: dizionario con "series" (HistoricalSeries) e i metadati.
+    Se l'archivio non è compresso e mmap=True le colonne sono memory-map del file (nessuna copia).
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive:
+        members = {info.filename[:-4]: info for info in archive.infolist() if info.filename.endswith(".npy")}
+    with np.load(path, allow_pickle=False) as npz:
+        for name, info in members.items():
+            array = None
+            if mmap and info.compress_type == zipfile.ZIP_STORED and name in COLUMNS:
+                array = _npz_member_memmap(path, info)
+            arrays[name] = npz[name] if array is None else array
+    result = {key[len("meta_"):]: str(value) for key, value in arrays.items() if key.startswith("meta_")}
+    result["series"] = HistoricalSeries(*[arrays[name] for name in COLUMNS])
+    if "asset_id" in arrays: # File unico di export_combined: asset di ogni riga
+        result["asset_ids"] = arrays["asset_id"]
+    return result
+
+def _table_to_result(table):
+    def column(name):
+        chunked = table.column(name)
+        if name == "timestamp":
+            chunked = chunked.cast(pa.int64()) # Stessi byte, cambia solo il tipo
+        if chunked.num_chunks == 1:
+            return chunked.chunk(0).to_numpy(zero_copy_only=False) # Senza null è una vista del buffer Arrow
+        return chunked.to_numpy()
+    result = {key.decode(): value.decode() for key, value in (table.schema.metadata or {}).items()
+              if not key.startswith(b"ARROW:") and not key.startswith(b"pandas")}
+    result["series"] = HistoricalSeries(*[column(name) for name in COLUMNS])
+    if "asset_id" in table.column_names: # File unico di export_combined: asset di ogni riga
+        result["asset_ids"] = table.column("asset_id").cast(pa.string()).to_numpy()
+    return result
+
+def load_arrow(path, mmap=True):
+    """Rilegge un file scritto da write_arrow; con mmap=True (e file non compresso) i dati restano nel file mappato."""
+    _require_pyarrow("arrow")
+    source = pa.memory_map(path, 'r') if mmap else pa.OSFile(path, 'rb')
+    with source:
+        table = pyarrow.ipc.open_file(source).read_all()
+    return _table_to_result(table)
+
+def load_parquet(path, mmap=True):
+    """Rilegge un file scritto da write_parquet (le pagine compresse vengono comunque decompresse in memoria)."""
+    _require_pyarrow("parquet")
+    return _table_to_result(pyarrow.parquet.read_table(path, memory_map=mmap))
+
+def load_history(path, file_format=None, mmap=True):
+    """
+    Rilegge un'esportazione binaria (NPZ, Parquet o Arrow); il formato si ricava dall'estensione se non indicato.
+    Per i file di export_combined il risultato contiene anche "asset_ids", l'asset di ogni riga della serie.
+    """
+    file_format = (file_format or path.rsplit(".", 1)[-1]).lower()
+    if file_format == "npz":
+        return load_npz(path, mmap)
+    if file_format == "parquet":
+        return load_parquet(path, mmap)
+    if file_format in ("arrow", "feather"):
+        return load_arrow(path, mmap)
+    raise ValueError(f"Formato file '{file_format}' non supportato.")
+
+
+def export_history(historical_data, path, file_format, chunk_size=EXPORT_CHUNK_SIZE, progress=None,
+                   compression=DEFAULT_COMPRESSION):
+    """
+    Esporta il risultato di get_historical_market_data (con "series" o "data_points") in un file
+    CSV, JSON, JSONL oppure, in forma colonnare tipizzata, NPZ, Parquet o Arrow ('compression' vale solo
+    per questi ultimi, vedi BINARY_COMPRESSIONS). Restituisce il numero di punti scritti; gli errori di I/O vengono propagati.
+    """
+    file_format = file_format.lower()
+    source = historical_data.get("series")
+    if source is None:
+        source = historical_data.get("data_points", [])
+    metadata = {key: historical_data[key] for key in ("asset_id", "vs_currency") if key in historical_data}
+
+    if file_format == "csv":
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            return write_csv(source, f, chunk_size, progress)
+    if file_format == "json":
+        with open(path, 'w', encoding='utf-8') as f:
+            return write_json(source, f, metadata, chunk_size, progress)
+    if file_format == "jsonl":
+        with open(path, 'w', encoding='utf-8') as f:
+            return write_jsonl(source, f, chunk_size, progress)
+    if file_format in BINARY_FORMATS:
+        # Le colonne si scrivono in un colpo solo, senza conversioni riga per riga
+        writer = {"npz": write_npz, "parquet": write_parquet, "arrow": write_arrow}[file_format]
+        if compression == DEFAULT_COMPRESSION:
+            compression = BINARY_COMPRESSIONS[file_format][0]
+        written = writer(_series_of(historical_data), path, metadata, compression)
+        _report(progress, written, written)
+        return written
+    raise ValueError(f"Formato file '{file_format}' non supportato.")
+
+
+# --- File unico con più asset (download multiplo) ---
+
+COMBINED_FORMATS = ("csv", "jsonl") + BINARY_FORMATS # Il JSON a documento unico non si presta a essere unito
+
+def write_combined_text(parts, file_obj, file_format="csv", chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Scrive in CSV o JSONL, sul file di testo già aperto, le serie di 'parts' (coppie (asset_id, serie))
+    con la colonna iniziale "asset_id", una serie alla volta. Restituisce le righe scritte.
+    """
+    if file_format == "csv":
+        writer = csv.writer(file_obj)
+        writer.writerow(("asset_id",) + EXPORT_FIELDS)
+    written = 0
+    for asset_id, series in parts:
+        for chunk in _row_chunks(series, chunk_size):
+            if file_format == "csv":
+                writer.writerows((asset_id,) + row for row in chunk)
+            else:
+                file_obj.write("".join(
+                    json.dumps(dict(zip(("asset_id",) + EXPORT_FIELDS, (asset_id,) + row)), separators=_COMPACT) + "\n"
+                    for row in chunk))
+            written += len(chunk)
+            _report(progress, written, None)
+    return written
+
+def export_combined(parts, path, file_format, metadata=None, chunk_size=EXPORT_CHUNK_SIZE, progress=None,
+                    compression=DEFAULT_COMPRESSION):
+    """
+    Scrive più serie in un unico file con la colonna aggiuntiva "asset_id".
+    'parts' è un iterabile di coppie (asset_id, HistoricalSeries): per CSV e JSONL le serie vengono
+    scritte una alla volta man mano che l'iterabile le produce; per i formati binari le colonne
+    vengono concatenate e scritte in un colpo solo. Restituisce il numero di righe scritte.
+    """
+    file_format = file_format.lower()
+    if file_format not in COMBINED_FORMATS:
+        raise ValueError(f"Formato '{file_format}' non supportato per il file unico.")
+    if file_format in TEXT_FORMATS:
+        with open(path, 'w', newline='' if file_format == "csv" else None, encoding='utf-8') as f:
+            return write_combined_text(parts, f, file_format, chunk_size, progress)
+
+    if compression == DEFAULT_COMPRESSION:
+        compression = BINARY_COMPRESSIONS[file_format][0]
+    _check_compression(file_format, compression)
+    parts = list(parts)
+    series = HistoricalSeries(*[np.concatenate([getattr(part, name) for _, part in parts]) if parts else []
+                                for name in COLUMNS])
+    asset_ids = [asset_id for asset_id, _ in parts]
+    lengths = [len(part) for _, part in parts] # Ogni id viene ripetuto per le righe della sua serie
+    if file_format == "npz":
+        arrays = dict(series.columns())
+        arrays["asset_id"] = np.repeat(np.array(asset_ids, dtype=str), lengths)
+        for key, value in (metadata or {}).items():
+            arrays[f"meta_{key}"] = np.array(str(value))
+        with open(path, 'wb') as f:
+            (np.savez_compressed if compression == "zip" else np.savez)(f, **arrays)
+    else:
+        _require_pyarrow(file_format)
+        table = _arrow_table(series, metadata)
+        # Colonna a dizionario: ogni id è memorizzato una volta sola, le righe tengono solo un indice
+        indices = pa.array(np.repeat(np.arange(len(asset_ids), dtype=np.int32), lengths))
+        table = table.add_column(0, "asset_id", pa.DictionaryArray.from_arrays(indices, pa.array(asset_ids, pa.string())))
+        if file_format == "parquet":
+            pyarrow.parquet.write_table(table, path, compression=compression or "none")
+        else:
+            with pyarrow.ipc.new_file(path, table.schema,
+                                      options=pyarrow.ipc.IpcWriteOptions(compression=compression)) as writer:
+                writer.write_table(table, max_chunksize=max(1, len(series)))
+    _report(progress, len(series), len(series))
+    return len(series)
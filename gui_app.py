@@ -1,50 +1,120 @@
-import tkinter as tk
-from tkinter import ttk
-
-from gui_tabs.price_tab import PriceTab
-from gui_tabs.watchlist_tab import WatchlistTab
-from gui_tabs.converter_tab import ConverterTab
-from gui_tabs.rank_tab import RankTab
-from gui_tabs.download_tab import DownloadTab
-from gui_tabs.chart_tab import ChartTab # NUOVO IMPORT
-
-def setup_gui():
-    root = tk.Tk()
-    root.title("PyCryptoDesk")
-    # Potremmo aver bisogno di più spazio per il grafico, aumentiamo un po' le dimensioni
-    root.geometry("1150x750") 
-    root.minsize(800, 600) # Minimo per non stringere troppo i grafici    
-
-    style = ttk.Style()
-    try:
-        style.theme_use('clam')
-    except tk.TclError:
-        print("Tema 'clam' non trovato, uso il default.")
-
-    notebook = ttk.Notebook(root, padding="10 10 10 10")
-
-    price_fetch_tab = PriceTab(notebook, padding="10")
-    notebook.add(price_fetch_tab, text='Prezzo Singolo')
-
-    watchlist_view_tab = WatchlistTab(notebook, padding="10")
-    notebook.add(watchlist_view_tab, text='Watchlist')
-
-    converter_tool_tab = ConverterTab(notebook, padding="10")
-    notebook.add(converter_tool_tab, text='Convertitore Valute')
-
-    rank_view_tab = RankTab(notebook, padding="10")
-    notebook.add(rank_view_tab, text='Classifica Market Cap')
-
-    download_data_tab = DownloadTab(notebook, padding="10")
-    notebook.add(download_data_tab, text='Download Storico')
-
-    # NUOVA SCHEDA GRAFICO
-    chart_display_tab = ChartTab(notebook, padding="10")
-    notebook.add(chart_display_tab, text='Grafico')
-
-
-    notebook.pack(expand=True, fill='both')
-    root.mainloop()
-
-if __name__ == "__main__":
+import time
+STARTUP_START = time.perf_counter() # Prima di tutti gli altri import, per misurare anche quelli
+
+import os
+import importlib
+import tkinter as tk
+from tkinter import ttk
+
+import api_handler
+from gui_tabs.dispatcher import get_dispatcher
+
+# Le schede vengono importate e costruite solo quando vengono aperte la prima volta:
+# così il grafico (matplotlib, pandas) e le chiamate di rete di Watchlist e Classifica
+# non rallentano la comparsa della finestra.
+# (modulo, classe, titolo della scheda)
+TAB_SPECS = [
+    ("gui_tabs.price_tab", "PriceTab", "Prezzo Singolo"),
+    ("gui_tabs.watchlist_tab", "WatchlistTab", "Watchlist"),
+    ("gui_tabs.converter_tab", "ConverterTab", "Convertitore Valute"),
+    ("gui_tabs.rank_tab", "RankTab", "Classifica Market Cap"),
+    ("gui_tabs.download_tab", "DownloadTab", "Download Storico"),
+    ("gui_tabs.chart_tab", "ChartTab", "Grafico"),
+]
+
+# Con PYCRYPTODESK_TIMING=1 stampiamo i tempi di avvio (import, finestra, schede, primo disegno)
+STARTUP_TIMING = os.environ.get("PYCRYPTODESK_TIMING", "") not in ("", "0")
+
+def log_startup_timing(label):
+    if STARTUP_TIMING:
+        print(f"[avvio] {label}: {(time.perf_counter() - STARTUP_START) * 1000:.0f} ms")
+
+RATE_LIMIT_COUNTDOWN_MS = 1000 # Durante una pausa dopo un 429 aggiorniamo il conto alla rovescia ogni secondo
+
+def show_rate_limit_status(status_bar, status=None):
+    """
+    Mostra nella barra di stato se ci sono richieste in attesa di quota API.
+    Viene chiamata dal dispatcher solo quando lo stato del limitatore cambia; l'unico
+    timer è il conto alla rovescia, attivo solo finché dura una pausa.
+    """
+    if status is None:
+        status = api_handler.get_rate_limit_status()
+    queue_depth = status["queue_depth"]
+    if status["paused_for"] > 0:
+        status_bar.config(text=f"Limite API raggiunto: ripresa fra {status['paused_for']:.0f}s "
+                               f"({queue_depth} richieste in attesa di quota)...")
+    elif queue_depth > 0:
+        status_bar.config(text=f"In attesa di quota API: {queue_depth} richieste in coda...")
+    else:
+        status_bar.config(text="")
+
+    countdown_id = getattr(status_bar, "countdown_id", None)
+    if countdown_id is not None:
+        status_bar.after_cancel(countdown_id)
+        status_bar.countdown_id = None
+    if status["paused_for"] > 0:
+        status_bar.countdown_id = status_bar.after(RATE_LIMIT_COUNTDOWN_MS, show_rate_limit_status, status_bar)
+
+def build_selected_tab(notebook, lazy_tabs):
+    """Importa e costruisce la scheda selezionata, se non è ancora stata costruita."""
+    entry = lazy_tabs.pop(notebook.select(), None)
+    if entry is None:
+        return # Già costruita
+    placeholder, module_name, class_name = entry
+    tab_class = getattr(importlib.import_module(module_name), class_name)
+    tab = tab_class(placeholder, padding="10")
+    tab.pack(expand=True, fill='both')
+    log_startup_timing(f"scheda {class_name} costruita")
+
+def show_selected_tab(notebook, lazy_tabs):
+    """Costruisce (se serve) la scheda selezionata e le invia <<TabShown>>, ad esempio per riprendere gli aggiornamenti automatici."""
+    build_selected_tab(notebook, lazy_tabs)
+    placeholder = notebook.nametowidget(notebook.select())
+    for tab in placeholder.winfo_children():
+        tab.event_generate("<<TabShown>>")
+
+def report_first_paint(root):
+    if not STARTUP_TIMING:
+        return
+    root.update_idletasks() # Completa il disegno in sospeso prima di misurare
+    log_startup_timing("primo disegno")
+
+def setup_gui():
+    log_startup_timing("import completati")
+    root = tk.Tk()
+    root.title("PyCryptoDesk")
+    # Potremmo aver bisogno di più spazio per il grafico, aumentiamo un po' le dimensioni
+    root.geometry("1150x750") 
+    root.minsize(800, 600) # Minimo per non stringere troppo i grafici    
+
+    style = ttk.Style()
+    try:
+        style.theme_use('clam')
+    except tk.TclError:
+        print("Tema 'clam' non trovato, uso il default.")
+
+    # Barra di stato in basso (va creata prima del notebook per restare visibile)
+    status_bar = ttk.Label(root, text="", anchor=tk.W, font=("Helvetica", 9, "italic"), padding="10 0 10 5")
+    status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+    # I cambi di stato del limitatore arrivano dai thread delle richieste: passano dal dispatcher
+    status_channel = get_dispatcher(root).channel(lambda status: show_rate_limit_status(status_bar, status))
+    api_handler.add_rate_limit_listener(status_channel.put)
+
+    notebook = ttk.Notebook(root, padding="10 10 10 10")
+
+    # Ogni scheda parte come un Frame vuoto; la scheda vera la costruiamo al primo <<NotebookTabChanged>>
+    lazy_tabs = {}
+    for module_name, class_name, title in TAB_SPECS:
+        placeholder = ttk.Frame(notebook)
+        notebook.add(placeholder, text=title)
+        lazy_tabs[str(placeholder)] = (placeholder, module_name, class_name)
+    notebook.bind("<<NotebookTabChanged>>", lambda event: show_selected_tab(notebook, lazy_tabs))
+    build_selected_tab(notebook, lazy_tabs) # La prima scheda, visibile subito
+
+    notebook.pack(expand=True, fill='both')
+    log_startup_timing("finestra pronta")
+    root.after_idle(report_first_paint, root)
+    root.mainloop()
+
+if __name__ == "__main__":
     setup_gui()
\ No newline at end of file
@@ -1,224 +1,257 @@
-# In gui_tabs/chart_tab.py
-import tkinter as tk
-from tkinter import ttk, messagebox
-import threading
-import queue
-from datetime import datetime # Per convertire i timestamp
-
-# Import dell'api_handler e config_manager
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import api_handler
-import config_manager
-
-# --- SCOMMENTA E AGGIUNGI QUESTI IMPORT ---
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import pandas as pd # Useremo pandas per gestire i dati per il grafico
-# --- FINE IMPORT MATPLOTLIB/PANDAS ---
-
-
-class ChartTab(ttk.Frame):
-    def __init__(self, parent_notebook, *args, **kwargs):
-        super().__init__(parent_notebook, *args, **kwargs)
-        self.padding = kwargs.get('padding', (10, 10, 10, 10))
-        
-        self.app_config = config_manager.load_config()
-        self.default_asset_id = self.app_config.get(
-            "download_tab_default_asset_id", 
-            config_manager.DEFAULT_CONFIG["download_tab_default_asset_id"]
-        )
-        self.default_vs_currency = self.app_config.get(
-            "default_vs_currency",
-            config_manager.DEFAULT_CONFIG["default_vs_currency"]
-        )
-        self.default_days = self.app_config.get(
-            "default_download_days", 
-            config_manager.DEFAULT_CONFIG["default_download_days"]
-        )
-        
-        self.api_queue = queue.Queue()
-        # Carichiamo le valute comuni dal config o usiamo un default
-        common_currencies_from_config = self.app_config.get("common_currencies")
-        if common_currencies_from_config and isinstance(common_currencies_from_config, list):
-            self.common_currencies = common_currencies_from_config
-        else: # Fallback se non presente o non è una lista
-            self.common_currencies = ["usd", "eur", "gbp", "jpy", "btc", "eth"]
-
-
-        self.chart_canvas_widget = None # Cambiato nome per chiarezza rispetto a self.chart_canvas in matplotlib
-
-        self.create_widgets()
-        self.process_api_queue()
-
-    # ... (create_widgets rimane come prima) ...
-    def create_widgets(self):
-        controls_frame = ttk.Frame(self, padding=(0, 0, 0, 10))
-        controls_frame.pack(fill=tk.X)
-
-        ttk.Label(controls_frame, text="ID Criptovaluta:").pack(side=tk.LEFT, padx=(0, 5))
-        self.asset_id_entry = ttk.Entry(controls_frame, width=15)
-        self.asset_id_entry.insert(0, self.default_asset_id)
-        self.asset_id_entry.pack(side=tk.LEFT, padx=(0, 10))
-
-        ttk.Label(controls_frame, text="Valuta:").pack(side=tk.LEFT, padx=(5, 5))
-        self.vs_currency_combobox = ttk.Combobox(controls_frame, values=self.common_currencies, width=8, state="readonly")
-        if self.default_vs_currency in self.common_currencies:
-            self.vs_currency_combobox.set(self.default_vs_currency)
-        elif self.common_currencies:
-            self.vs_currency_combobox.set(self.common_currencies[0])
-        self.vs_currency_combobox.pack(side=tk.LEFT, padx=(0, 10))
-
-        ttk.Label(controls_frame, text="Periodo (giorni):").pack(side=tk.LEFT, padx=(5, 5))
-        self.days_options = ["7", "30", "90", "180", "365", "max"]
-        self.days_combobox = ttk.Combobox(controls_frame, values=self.days_options, width=5, state="readonly")
-        default_days_str = str(self.default_days)
-        if default_days_str in self.days_options:
-            self.days_combobox.set(default_days_str)
-        else:
-            self.days_combobox.set("30") 
-        self.days_combobox.pack(side=tk.LEFT, padx=(0, 10))
-        
-        self.show_chart_button = ttk.Button(controls_frame, text="Mostra Grafico", command=self.start_fetch_chart_data_thread)
-        self.show_chart_button.pack(side=tk.LEFT, padx=(10,0))
-
-        self.status_label = ttk.Label(self, text="Inserisci i dati e clicca 'Mostra Grafico'.", font=("Helvetica", 10, "italic"))
-        self.status_label.pack(pady=5)
-
-        self.chart_display_frame = ttk.Frame(self, relief=tk.SUNKEN, borderwidth=1)
-        self.chart_display_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        self.chart_placeholder_label = ttk.Label(self.chart_display_frame, text="L'area del grafico apparirà qui.", font=("Helvetica", 12, "italic"))
-        self.chart_placeholder_label.pack(padx=20, pady=20, expand=True)
-
-    # --- NUOVA FUNZIONE PER DISEGNARE IL GRAFICO ---
-    def _draw_chart(self, api_response_data):
-        asset_id = api_response_data.get("asset_id", "N/A")
-        vs_currency = api_response_data.get("vs_currency", "N/A").upper()
-        data_points = api_response_data.get("data_points", [])
-
-        if not data_points:
-            self.status_label.config(text="Nessun dato da plottare.")
-            messagebox.showwarning("Dati Grafico Mancanti", "Non ci sono dati sufficienti per generare il grafico.")
-            return
-
-        try:
-            # Prepara i dati con Pandas
-            df = pd.DataFrame(data_points)
-            # Converti timestamp (millisecondi) in oggetti datetime
-            df['date'] = pd.to_datetime(df['timestamp'], unit='ms') 
-            df.set_index('date', inplace=True) # Imposta la data come indice
-
-            # Pulisci il grafico precedente, se esiste
-            if self.chart_canvas_widget:
-                self.chart_canvas_widget.get_tk_widget().destroy()
-            
-            # Rimuovi il placeholder label se esiste ancora
-            if hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists():
-                self.chart_placeholder_label.destroy()
-
-            # Crea la figura e l'asse di Matplotlib
-            # figsize è in pollici, dpi è dots per inch
-            fig = Figure(figsize=(7, 5), dpi=100) # Puoi aggiustare questi valori
-            ax = fig.add_subplot(1, 1, 1) # 1 riga, 1 colonna, 1° subplot
-
-            # Plotta i prezzi
-            ax.plot(df.index, df['price'], color='dodgerblue', linewidth=1.5)
-
-            # Formattazione del grafico
-            ax.set_title(f"Andamento Prezzo di {asset_id.capitalize()} ({vs_currency})", fontsize=14)
-            ax.set_xlabel("Data", fontsize=10)
-            ax.set_ylabel(f"Prezzo in {vs_currency}", fontsize=10)
-            ax.grid(True, linestyle='--', alpha=0.7)
-            
-            # Migliora la formattazione delle date sull'asse X
-            fig.autofmt_xdate() 
-
-            # Incorpora il grafico in Tkinter
-            self.chart_canvas_widget = FigureCanvasTkAgg(fig, master=self.chart_display_frame)
-            self.chart_canvas_widget.draw()
-            self.chart_canvas_widget.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
-
-            self.status_label.config(text=f"Grafico per {asset_id.capitalize()} visualizzato.")
-
-        except Exception as e:
-            self.status_label.config(text=f"Errore durante la creazione del grafico: {e}")
-            messagebox.showerror("Errore Grafico", f"Si è verificato un errore durante la generazione del grafico:\n{e}")
-            print(f"Errore _draw_chart: {e}")
-
-
-    # ... (start_fetch_chart_data_thread e fetch_chart_data_in_thread rimangono invariati) ...
-    def start_fetch_chart_data_thread(self):
-        asset_id = self.asset_id_entry.get().strip().lower()
-        vs_currency = self.vs_currency_combobox.get().strip().lower()
-        days = self.days_combobox.get().strip() 
-
-        if not asset_id or not vs_currency or not days:
-            messagebox.showerror("Errore Input", "Tutti i campi (Asset, Valuta, Periodo) sono obbligatori.")
-            return
-
-        self.show_chart_button.config(state=tk.DISABLED)
-        self.status_label.config(text=f"Caricamento dati grafico per {asset_id} ({days} giorni)...")
-        
-        if self.chart_canvas_widget: # Riferimento corretto
-            self.chart_canvas_widget.get_tk_widget().destroy()
-            self.chart_canvas_widget = None # Resetta il riferimento
-        if hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists():
-            self.chart_placeholder_label.destroy()
-
-        api_thread = threading.Thread(target=self.fetch_chart_data_in_thread,
-                                      args=(self.api_queue, asset_id, vs_currency, days),
-                                      daemon=True)
-        api_thread.start()
-
-    def fetch_chart_data_in_thread(self, q, asset_id, vs_currency, days):
-        print(f"THREAD CHART: Richiedo dati storici per {asset_id}, {days} giorni, in {vs_currency}...")
-        historical_data = api_handler.get_historical_market_data(asset_id, vs_currency, days)
-        q.put(historical_data) # Mettiamo l'intero dizionario, include asset_id e vs_currency
-        print(f"THREAD CHART: Dati storici messi in coda.")
-
-
-    # --- MODIFICHE A process_api_queue ---
-    def process_api_queue(self):
-        try:
-            message = self.api_queue.get_nowait() # 'message' qui è la risposta da get_historical_market_data
-
-            if isinstance(message, dict) and "error" in message:
-                error_msg = message['error']
-                self.status_label.config(text=f"Errore API Grafico: {error_msg[:100]}")
-                messagebox.showerror("Errore API Grafico", f"Impossibile caricare i dati per il grafico:\n{error_msg}")
-                # Se c'è un errore, rimetti il placeholder se non c'è già un canvas
-                if not self.chart_canvas_widget and not (hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists()):
-                    self.chart_placeholder_label = ttk.Label(self.chart_display_frame, text="L'area del grafico apparirà qui.", font=("Helvetica", 12, "italic"))
-                    self.chart_placeholder_label.pack(padx=20, pady=20, expand=True)
-
-            elif isinstance(message, dict) and "data_points" in message:
-                # --- CHIAMATA ALLA NUOVA FUNZIONE DI PLOTTING ---
-                self._draw_chart(message) 
-                # Lo status_label viene aggiornato dentro _draw_chart o se ci sono errori lì
-            else:
-                self.status_label.config(text="Risposta API per grafico non riconosciuta.")
-                messagebox.showwarning("Risposta Sconosciuta", "L'API ha restituito una risposta non prevista per il grafico.")
-                # Rimetti il placeholder
-                if not self.chart_canvas_widget and not (hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists()):
-                    self.chart_placeholder_label = ttk.Label(self.chart_display_frame, text="L'area del grafico apparirà qui.", font=("Helvetica", 12, "italic"))
-                    self.chart_placeholder_label.pack(padx=20, pady=20, expand=True)
-
-
-            self.show_chart_button.config(state=tk.NORMAL)
-
-        except queue.Empty:
-            pass
-        except Exception as e:
-            self.status_label.config(text=f"Errore UI Grafico: {e}")
-            messagebox.showerror("Errore Interfaccia Grafico", f"Si è verificato un errore nell'interfaccia Grafico:\n{e}")
-            print(f"Errore in process_api_queue (ChartTab): {e}")
-            if hasattr(self, 'show_chart_button'): 
-                 self.show_chart_button.config(state=tk.NORMAL)
-            # Rimetti il placeholder in caso di eccezione UI grave
-            if not self.chart_canvas_widget and not (hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists()):
-                self.chart_placeholder_label = ttk.Label(self.chart_display_frame, text="L'area del grafico apparirà qui.", font=("Helvetica", 12, "italic"))
-                self.chart_placeholder_label.pack(padx=20, pady=20, expand=True)
-        finally:
-            self.after(100, self.process_api_queue)
\ No newline at end of file
+# In gui_tabs/chart_tab.py
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+# Import dell'api_handler e config_manager
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import api_handler
+from gui_tabs.dispatcher import get_dispatcher
+from gui_tabs.worker_pool import get_worker_pool, current_token
+import config_manager
+import downsampling
+import chart_render # Stile del grafico condiviso con i grafici generati senza interfaccia
+
+# --- SCOMMENTA E AGGIUNGI QUESTI IMPORT ---
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+# --- FINE IMPORT MATPLOTLIB ---
+
+# Livello di dettaglio: al massimo un punto per pixel di larghezza del grafico (mai meno di CHART_MIN_POINTS)
+CHART_POINTS_PER_PIXEL = 1
+CHART_MIN_POINTS = 200
+CHART_DOWNSAMPLE_METHOD = "lttb" # Oppure "minmax" (conserva esattamente picchi e minimi di ogni pixel)
+
+
+class ChartTab(ttk.Frame):
+    def __init__(self, parent_notebook, *args, **kwargs):
+        super().__init__(parent_notebook, *args, **kwargs)
+        self.padding = kwargs.get('padding', (10, 10, 10, 10))
+        
+        self.app_config = config_manager.load_config()
+        self.default_asset_id = self.app_config.get(
+            "download_tab_default_asset_id", 
+            config_manager.DEFAULT_CONFIG["download_tab_default_asset_id"]
+        )
+        self.default_vs_currency = self.app_config.get(
+            "default_vs_currency",
+            config_manager.DEFAULT_CONFIG["default_vs_currency"]
+        )
+        self.default_days = self.app_config.get(
+            "default_download_days", 
+            config_manager.DEFAULT_CONFIG["default_download_days"]
+        )
+        
+        self.api_queue = get_dispatcher(self).channel(self.process_api_message) # Risultati consegnati dal dispatcher centrale
+        # Carichiamo le valute comuni dal config o usiamo un default
+        common_currencies_from_config = self.app_config.get("common_currencies")
+        if common_currencies_from_config and isinstance(common_currencies_from_config, list):
+            self.common_currencies = common_currencies_from_config
+        else: # Fallback se non presente o non è una lista
+            self.common_currencies = ["usd", "eur", "gbp", "jpy", "btc", "eth"]
+
+
+        self.chart_canvas_widget = None # Cambiato nome per chiarezza rispetto a self.chart_canvas in matplotlib
+        # Figura, asse e linea creati una volta sola (vedi _ensure_chart) e riusati a ogni grafico
+        self.figure = None
+        self.ax = None
+        self.price_line = None
+        # Serie completa (date matplotlib, prezzi): la linea ne mostra una versione ridotta alla risoluzione del grafico
+        self.full_x = None
+        self.full_y = None
+        self.lod_pending = False # Un solo ricalcolo del dettaglio per più eventi di zoom/ridimensionamento ravvicinati
+
+        self.create_widgets()
+
+    # ... (create_widgets rimane come prima) ...
+    def create_widgets(self):
+        controls_frame = ttk.Frame(self, padding=(0, 0, 0, 10))
+        controls_frame.pack(fill=tk.X)
+
+        ttk.Label(controls_frame, text="ID Criptovaluta:").pack(side=tk.LEFT, padx=(0, 5))
+        self.asset_id_entry = ttk.Entry(controls_frame, width=15)
+        self.asset_id_entry.insert(0, self.default_asset_id)
+        self.asset_id_entry.pack(side=tk.LEFT, padx=(0, 10))
+
+        ttk.Label(controls_frame, text="Valuta:").pack(side=tk.LEFT, padx=(5, 5))
+        self.vs_currency_combobox = ttk.Combobox(controls_frame, values=self.common_currencies, width=8, state="readonly")
+        if self.default_vs_currency in self.common_currencies:
+            self.vs_currency_combobox.set(self.default_vs_currency)
+        elif self.common_currencies:
+            self.vs_currency_combobox.set(self.common_currencies[0])
+        self.vs_currency_combobox.pack(side=tk.LEFT, padx=(0, 10))
+
+        ttk.Label(controls_frame, text="Periodo (giorni):").pack(side=tk.LEFT, padx=(5, 5))
+        self.days_options = ["7", "30", "90", "180", "365", "max"]
+        self.days_combobox = ttk.Combobox(controls_frame, values=self.days_options, width=5, state="readonly")
+        default_days_str = str(self.default_days)
+        if default_days_str in self.days_options:
+            self.days_combobox.set(default_days_str)
+        else:
+            self.days_combobox.set("30") 
+        self.days_combobox.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.show_chart_button = ttk.Button(controls_frame, text="Mostra Grafico", command=self.start_fetch_chart_data_thread)
+        self.show_chart_button.pack(side=tk.LEFT, padx=(10,0))
+
+        self.status_label = ttk.Label(self, text="Inserisci i dati e clicca 'Mostra Grafico'.", font=("Helvetica", 10, "italic"))
+        self.status_label.pack(pady=5)
+
+        self.chart_display_frame = ttk.Frame(self, relief=tk.SUNKEN, borderwidth=1)
+        self.chart_display_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        self.chart_placeholder_label = ttk.Label(self.chart_display_frame, text="L'area del grafico apparirà qui.", font=("Helvetica", 12, "italic"))
+        self.chart_placeholder_label.pack(padx=20, pady=20, expand=True)
+
+    def _ensure_chart(self):
+        """Crea figura, asse, linea e canvas alla prima visualizzazione; le volte successive non fa nulla."""
+        if self.chart_canvas_widget is not None:
+            return
+        # Rimuovi il placeholder label se esiste ancora
+        if hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists():
+            self.chart_placeholder_label.destroy()
+
+        # Crea la figura e l'asse di Matplotlib
+        # figsize è in pollici, dpi è dots per inch
+        self.figure = Figure(figsize=chart_render.FIGURE_SIZE, dpi=chart_render.FIGURE_DPI)
+        self.ax = self.figure.add_subplot(1, 1, 1) # 1 riga, 1 colonna, 1° subplot
+        # Formattazione del grafico (fissa: titolo ed etichetta Y vengono aggiornati a ogni disegno)
+        self.price_line = chart_render.setup_price_axes(self.figure, self.ax)
+
+        # Incorpora il grafico in Tkinter, con la barra di matplotlib per zoom e spostamento
+        self.chart_canvas_widget = FigureCanvasTkAgg(self.figure, master=self.chart_display_frame)
+        self.chart_toolbar = NavigationToolbar2Tk(self.chart_canvas_widget, self.chart_display_frame, pack_toolbar=False)
+        self.chart_toolbar.update()
+        self.chart_toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.chart_canvas_widget.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        # Zoom, spostamento e ridimensionamento cambiano quanti punti servono: ricalcoliamo il dettaglio
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self._schedule_level_of_detail())
+        self.chart_canvas_widget.mpl_connect('resize_event', lambda event: self._schedule_level_of_detail())
+
+    def _target_points(self):
+        width = self.chart_canvas_widget.get_tk_widget().winfo_width() if self.chart_canvas_widget else 0
+        return max(CHART_MIN_POINTS, int(width * CHART_POINTS_PER_PIXEL))
+
+    def _visible_points(self):
+        """Punti della serie completa che cadono nell'intervallo visibile, ridotti alla risoluzione del grafico."""
+        x_min, x_max = self.ax.get_xlim()
+        start, stop = downsampling.visible_slice(self.full_x, x_min, x_max)
+        return downsampling.downsample(self.full_x[start:stop], self.full_y[start:stop],
+                                       self._target_points(), method=CHART_DOWNSAMPLE_METHOD)
+
+    def _schedule_level_of_detail(self):
+        if self.full_x is None or self.lod_pending:
+            return
+        self.lod_pending = True
+        self.after_idle(self._update_level_of_detail)
+
+    def _update_level_of_detail(self):
+        self.lod_pending = False
+        if self.full_x is None:
+            return
+        # Cambiano solo i dati della linea, non i limiti: nessun nuovo xlim_changed
+        self.price_line.set_data(*self._visible_points())
+        self.chart_canvas_widget.draw_idle()
+
+    # --- NUOVA FUNZIONE PER DISEGNARE IL GRAFICO ---
+    def _draw_chart(self, api_response_data):
+        asset_id = api_response_data.get("asset_id", "N/A")
+        vs_currency = api_response_data.get("vs_currency", "N/A").upper()
+        series = api_response_data.get("series") # Dati colonnari (array numpy), vedi HistoricalSeries
+
+        if series is None or len(series) == 0:
+            self.status_label.config(text="Nessun dato da plottare.")
+            messagebox.showwarning("Dati Grafico Mancanti", "Non ci sono dati sufficienti per generare il grafico.")
+            return
+
+        try:
+            # Timestamp (millisecondi) -> date di matplotlib (giorni dall'epoca) direttamente sugli array,
+            # senza DataFrame né oggetti datetime
+            x_values = chart_render.timestamps_to_mpl(series.timestamp)
+
+            self._ensure_chart()
+            # Stessa figura e stessa linea: cambiano solo i dati e i limiti degli assi.
+            # La linea riceve al massimo un punto per pixel (vedi downsampling): il costo del disegno
+            # non dipende dalla lunghezza della serie
+            self.full_x, self.full_y = x_values, series.price
+            self.price_line.set_data(*downsampling.downsample(x_values, series.price, self._target_points(),
+                                                              method=CHART_DOWNSAMPLE_METHOD))
+            # Zoom e spostamenti della barra disattivano l'autoscala (set_xlim con auto=False):
+            # fit_price_axes la riattiva, altrimenti la nuova serie resterebbe nei limiti della vista
+            # precedente, e calcola l'asse Y sui prezzi originali invece che su quelli ridotti
+            chart_render.fit_price_axes(self.ax, series.price)
+            self.chart_toolbar.update() # Svuota la cronologia delle viste: "Home" diventa la vista della nuova serie
+            chart_render.set_price_labels(self.ax, asset_id, vs_currency)
+            self.chart_canvas_widget.draw_idle() # Ridisegna al prossimo momento libero del mainloop
+
+            self.status_label.config(text=f"Grafico per {asset_id.capitalize()} visualizzato.")
+
+        except Exception as e:
+            self.status_label.config(text=f"Errore durante la creazione del grafico: {e}")
+            messagebox.showerror("Errore Grafico", f"Si è verificato un errore durante la generazione del grafico:\n{e}")
+            print(f"Errore _draw_chart: {e}")
+
+
+    # ... (start_fetch_chart_data_thread e fetch_chart_data_in_thread rimangono invariati) ...
+    def start_fetch_chart_data_thread(self):
+        asset_id = self.asset_id_entry.get().strip().lower()
+        vs_currency = self.vs_currency_combobox.get().strip().lower()
+        days = self.days_combobox.get().strip() 
+
+        if not asset_id or not vs_currency or not days:
+            messagebox.showerror("Errore Input", "Tutti i campi (Asset, Valuta, Periodo) sono obbligatori.")
+            return
+
+        # Il pulsante resta attivo: chiedere un altro asset (o un altro periodo) mentre un download
+        # lungo è in corso annulla quello vecchio, il cui risultato viene scartato
+        self.status_label.config(text=f"Caricamento dati grafico per {asset_id} ({days} giorni)...")
+        # Il grafico precedente resta visibile finché non arrivano i nuovi dati (stessa figura, vedi _draw_chart)
+
+        # Pool condiviso: una nuova richiesta di questa scheda annulla quella precedente
+        token = get_worker_pool().submit(self, self.fetch_chart_data_in_thread, self.api_queue, asset_id, vs_currency, days)
+        if token is None:
+            self.status_label.config(text="Troppe richieste in corso, riprova fra poco.")
+
+    def fetch_chart_data_in_thread(self, q, asset_id, vs_currency, days):
+        print(f"THREAD CHART: Richiedo dati storici per {asset_id}, {days} giorni, in {vs_currency}...")
+        historical_data = api_handler.get_historical_market_data(asset_id, vs_currency, days, columnar=True, sync_to_now=True,
+                                                                 cancel_token=current_token())
+        q.put(historical_data) # Mettiamo l'intero dizionario, include asset_id e vs_currency
+        print(f"THREAD CHART: Dati storici messi in coda.")
+
+
+    # --- MODIFICHE A process_api_message ---
+    def process_api_message(self, message):
+        try:
+
+            if isinstance(message, dict) and "error" in message:
+                error_msg = message['error']
+                self.status_label.config(text=f"Errore API Grafico: {error_msg[:100]}")
+                messagebox.showerror("Errore API Grafico", f"Impossibile caricare i dati per il grafico:\n{error_msg}")
+                # Se c'è un errore, rimetti il placeholder se non c'è già un canvas
+                if not self.chart_canvas_widget and not (hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists()):
+                    self.chart_placeholder_label = ttk.Label(self.chart_display_frame, text="L'area del grafico apparirà qui.", font=("Helvetica", 12, "italic"))
+                    self.chart_placeholder_label.pack(padx=20, pady=20, expand=True)
+
+            elif isinstance(message, dict) and "series" in message:
+                # --- CHIAMATA ALLA NUOVA FUNZIONE DI PLOTTING ---
+                self._draw_chart(message) 
+                # Lo status_label viene aggiornato dentro _draw_chart o se ci sono errori lì
+            else:
+                self.status_label.config(text="Risposta API per grafico non riconosciuta.")
+                messagebox.showwarning("Risposta Sconosciuta", "L'API ha restituito una risposta non prevista per il grafico.")
+                # Rimetti il placeholder
+                if not self.chart_canvas_widget and not (hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists()):
+                    self.chart_placeholder_label = ttk.Label(self.chart_display_frame, text="L'area del grafico apparirà qui.", font=("Helvetica", 12, "italic"))
+                    self.chart_placeholder_label.pack(padx=20, pady=20, expand=True)
+
+        except Exception as e:
+            self.status_label.config(text=f"Errore UI Grafico: {e}")
+            messagebox.showerror("Errore Interfaccia Grafico", f"Si è verificato un errore nell'interfaccia Grafico:\n{e}")
+            print(f"Errore in process_api_message (ChartTab): {e}")
+            # Rimetti il placeholder in caso di eccezione UI grave
+            if not self.chart_canvas_widget and not (hasattr(self, 'chart_placeholder_label') and self.chart_placeholder_label.winfo_exists()):
+                self.chart_placeholder_label = ttk.Label(self.chart_display_frame, text="L'area del grafico apparirà qui.", font=("Helvetica", 12, "italic"))
+                self.chart_placeholder_label.pack(padx=20, pady=20, expand=True)
@@ -1,13 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, messagebox # Aggiungiamo messagebox per gli errori di input
-import threading
-import queue
 
 # Import dell'api_handler
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import api_handler
+from gui_tabs.dispatcher import get_dispatcher
+from gui_tabs.worker_pool import get_worker_pool
 import config_manager
 
 class ConverterTab(ttk.Frame):
@@ -29,11 +29,10 @@ class ConverterTab(ttk.Frame):
             config_manager.DEFAULT_CONFIG["converter_tab_default_to_currency"]
         )
 
-        self.api_queue = queue.Queue()
+        self.api_queue = get_dispatcher(self).channel(self.process_api_message) # Risultati consegnati dal dispatcher centrale
         self.common_currencies = ["usd", "eur", "gbp", "jpy", "btc", "eth", "cad", "aud", "chf"]
         
         self.create_widgets()
-        self.process_api_queue()
 
     def create_widgets(self):
         input_section = ttk.Frame(self, padding=self.padding)
@@ -98,15 +97,15 @@ class ConverterTab(ttk.Frame):
             messagebox.showerror("Errore Input", "L'importo inserito non è un numero valido.")
             return
         
-        self.convert_button.config(state=tk.DISABLED)
+        # Il pulsante resta attivo: una nuova conversione annulla quella in corso
         self.status_label.config(text=f"Conversione in corso per {amount} {from_asset}...")
         self.result_label.config(text="Risultato: -")
         self.rate_label.config(text="Tasso di cambio: -")
 
-        api_thread = threading.Thread(target=self.fetch_conversion_in_thread,
-                                      args=(self.api_queue, amount, from_asset, to_currency),
-                                      daemon=True)
-        api_thread.start()
+        # Pool condiviso: una nuova richiesta di questa scheda annulla quella precedente
+        token = get_worker_pool().submit(self, self.fetch_conversion_in_thread, self.api_queue, amount, from_asset, to_currency)
+        if token is None:
+            self.status_label.config(text="Troppe richieste in corso, riprova fra poco.")
 
     def fetch_conversion_in_thread(self, q, amount, from_asset, to_currency):
         print(f"THREAD CONVERTER: Richiedo tasso per {from_asset} in {to_currency}...")
@@ -123,9 +122,8 @@ class ConverterTab(ttk.Frame):
         q.put(result_package)
         print(f"THREAD CONVERTER: Dati messi in coda.")
 
-    def process_api_queue(self):
+    def process_api_message(self, message):
         try:
-            message = self.api_queue.get_nowait()
             # Rimuoviamo il testo dallo status_label all'inizio dell'elaborazione del messaggio
             self.status_label.config(text="") 
 
@@ -163,15 +161,7 @@ class ConverterTab(ttk.Frame):
                     self.status_label.config(text="Errore: dati di tasso mancanti.")
                     messagebox.showwarning("Dati Mancanti", "L'API non ha fornito un tasso di cambio valido.") # AGGIUNTO
 
-            self.convert_button.config(state=tk.NORMAL)
-
-        except queue.Empty:
-            pass
         except Exception as e:
             self.status_label.config(text=f"Errore UI: {e}")
             messagebox.showerror("Errore Interfaccia", f"Si è verificato un errore nell'interfaccia Convertitore:\n{e}")
-            print(f"Errore in process_api_queue (ConverterTab): {e}")
-            if hasattr(self, 'convert_button'):
-                 self.convert_button.config(state=tk.NORMAL)
-        finally:
-            self.after(100, self.process_api_queue)
\ No newline at end of file
+            print(f"Errore in process_api_message (ConverterTab): {e}")
@@ -0,0 +1,128 @@
+import tkinter as tk
+import queue
+import threading
+import itertools
+
+from gui_tabs.worker_pool import current_token
+
+RESULT_EVENT = "<<ApiResult>>"
+FALLBACK_POLL_MS = 100 # Usato solo se Tcl non supporta i thread (event_generate da altri thread non è sicuro)
+SAFETY_POLL_MS = 1000  # Con i thread: recupera i risultati il cui evento non è arrivato (mainloop non ancora partito, evento perso)
+
+
+class ResultChannel:
+    """
+    Canale di una scheda verso il dispatcher. Ha lo stesso metodo put() di una queue.Queue,
+    quindi i thread di lavoro possono continuare a usare q.put(risultato) come prima:
+    il messaggio arriva al gestore della scheda, nel thread di Tk.
+    """
+    def __init__(self, dispatcher, channel_id):
+        self._dispatcher = dispatcher
+        self.channel_id = channel_id
+
+    def put(self, message):
+        token = current_token()
+        if token is not None and token.cancelled:
+            return # Risultato di una richiesta annullata dal pool (superata da una più recente): lo scartiamo
+        # Il token viaggia con il messaggio: se la richiesta viene superata mentre il messaggio
+        # aspetta in coda, il dispatcher lo scarta invece di consegnarlo alla scheda
+        self._dispatcher.post(self.channel_id, message, token)
+
+    def put_always(self, message):
+        """
+        Come put(), ma il messaggio viene consegnato anche se la richiesta è stata annullata:
+        serve per l'ultimo messaggio di un lavoro che la scheda deve veder finire davvero
+        (es. un download multiplo interrotto, prima di poterne avviare un altro).
+        """
+        self._dispatcher.post(self.channel_id, message)
+
+    def close(self):
+        self._dispatcher.remove_channel(self.channel_id)
+
+
+class ResultDispatcher:
+    """
+    Unico punto in cui i risultati dei thread di lavoro tornano al thread di Tk.
+    Invece di un ciclo after(100) per ogni scheda, i thread mettono il risultato in una coda
+    comune e svegliano il mainloop con un evento virtuale; il gestore svuota la coda in una
+    volta sola e consegna ogni messaggio alla scheda proprietaria del canale.
+    Un controllo ogni SAFETY_POLL_MS consegna comunque i messaggi rimasti in coda senza evento;
+    da fermo costa solo un controllo della coda.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._queue = queue.SimpleQueue() # (channel_id, messaggio, CancelToken o None)
+        self._handlers = {}               # channel_id -> funzione della scheda
+        self._ids = itertools.count(1)
+        self._wake_lock = threading.Lock()
+        self._wake_pending = False        # Un solo evento in volo per più risultati ravvicinati
+        self.root.bind(RESULT_EVENT, self._drain, add="+")
+
+        # Con un Tcl senza thread event_generate da altri thread non è sicuro: ripieghiamo sul polling
+        self._threaded_tcl = bool(int(self.root.tk.eval("set tcl_platform(threaded)") or 0))
+        self._poll_ms = SAFETY_POLL_MS
+        if not self._threaded_tcl:
+            print("Tcl senza supporto ai thread: il dispatcher controlla la coda ogni "
+                  f"{FALLBACK_POLL_MS} ms.")
+            self._poll_ms = FALLBACK_POLL_MS
+        # Risultati arrivati prima dell'avvio del mainloop: il loro evento può non essere mai consegnato
+        self.root.after_idle(self._drain)
+        self.root.after(self._poll_ms, self._poll)
+
+    def channel(self, handler):
+        """Registra il gestore di una scheda e restituisce il suo canale (da usare come api_queue)."""
+        channel_id = next(self._ids)
+        self._handlers[channel_id] = handler
+        return ResultChannel(self, channel_id)
+
+    def remove_channel(self, channel_id):
+        self._handlers.pop(channel_id, None)
+
+    def post(self, channel_id, message, token=None):
+        """Mette un risultato in coda e sveglia il thread di Tk. Si può chiamare da qualsiasi thread."""
+        self._queue.put((channel_id, message, token))
+        if not self._threaded_tcl:
+            return
+        with self._wake_lock:
+            if self._wake_pending:
+                return # Il drain già programmato prenderà anche questo messaggio
+            self._wake_pending = True
+        try:
+            self.root.event_generate(RESULT_EVENT, when="tail")
+        except (tk.TclError, RuntimeError):
+            # Finestra chiusa o mainloop non (più) attivo: il messaggio resta in coda
+            with self._wake_lock:
+                self._wake_pending = False
+
+    def _drain(self, event=None):
+        with self._wake_lock:
+            self._wake_pending = False # I risultati che arrivano da qui in poi genereranno un nuovo evento
+        while True:
+            try:
+                channel_id, message, token = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if token is not None and token.cancelled:
+                continue # Richiesta superata mentre il risultato era in coda (es. nuovo clic sullo stesso pulsante)
+            handler = self._handlers.get(channel_id)
+            if handler is None:
+                continue # Scheda chiusa o canale rimosso: il risultato viene scartato
+            try:
+                handler(message)
+            except Exception as e:
+                print(f"Errore nel gestore dei risultati (canale {channel_id}): {e}")
+
+    def _poll(self):
+        if not self._queue.empty():
+            self._drain() # Azzera anche _wake_pending, se l'evento in volo è andato perso
+        self.root.after(self._poll_ms, self._poll)
+
+
+def get_dispatcher(widget):
+    """Restituisce il dispatcher della finestra principale del widget, creandolo al primo utilizzo."""
+    root = widget.winfo_toplevel()
+    dispatcher = getattr(root, "_result_dispatcher", None)
+    if dispatcher is None:
+        dispatcher = ResultDispatcher(root)
+        root._result_dispatcher = dispatcher
+    return dispatcher
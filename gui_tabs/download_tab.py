@@ -1,216 +1,446 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog # filedialog per salvare file
-import threading
-import queue
-import csv # Per salvare in CSV
-import json # Per salvare in JSON
-
-# Import dell'api_handler
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import api_handler
-import config_manager
-
-class DownloadTab(ttk.Frame):
-    def __init__(self, parent_notebook, *args, **kwargs):
-        super().__init__(parent_notebook, *args, **kwargs)
-        self.padding = kwargs.get('padding', (10, 10, 10, 10))
-        
-        self.app_config = config_manager.load_config()
-        self.default_asset_id = self.app_config.get(
-            "download_tab_default_asset_id",
-            config_manager.DEFAULT_CONFIG["download_tab_default_asset_id"]
-        )
-        self.default_vs_currency = self.app_config.get(
-            "default_vs_currency",
-            config_manager.DEFAULT_CONFIG["default_vs_currency"]
-        )
-        self.default_days = self.app_config.get(
-            "default_download_days",
-            config_manager.DEFAULT_CONFIG["default_download_days"]
-        )
-        self.default_file_format = self.app_config.get(
-            "download_tab_default_file_format",
-            config_manager.DEFAULT_CONFIG["download_tab_default_file_format"]
-        )
-        
-        self.api_queue = queue.Queue()
-        self.common_currencies = ["usd", "eur", "gbp", "jpy", "btc", "eth", "cad", "aud", "chf"]
-        self.file_formats = ["CSV", "JSON"] # Lista per la ComboBox del formato
-        
-        self.create_widgets()
-        self.process_api_queue()
-
-    def create_widgets(self):
-        input_section = ttk.Frame(self, padding=self.padding)
-        input_section.pack(fill=tk.X, pady=5)
-
-        ttk.Label(input_section, text="ID Criptovaluta:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
-        self.asset_id_entry = ttk.Entry(input_section, width=20)
-        self.asset_id_entry.grid(row=0, column=1, padx=5, pady=5)
-        # --- USA VALORE DA CONFIG ---
-        self.asset_id_entry.insert(0, self.default_asset_id)
-        # --- FINE USA VALORE DA CONFIG ---
-
-        ttk.Label(input_section, text="Valuta di riferimento:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
-        self.vs_currency_combobox = ttk.Combobox(input_section, values=self.common_currencies, width=8, state="readonly")
-        self.vs_currency_combobox.grid(row=1, column=1, padx=5, pady=5)
-        # --- USA VALORE DA CONFIG ---
-        if self.default_vs_currency in self.common_currencies:
-            self.vs_currency_combobox.set(self.default_vs_currency)
-        elif self.common_currencies:
-            self.vs_currency_combobox.set(self.common_currencies[0])
-        # --- FINE USA VALORE DA CONFIG ---
-
-        ttk.Label(input_section, text="Giorni di storico:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
-        self.days_spinbox = ttk.Spinbox(input_section, from_=1, to=3650, increment=1, width=8)
-        self.days_spinbox.grid(row=2, column=1, padx=5, pady=5)
-        # --- USA VALORE DA CONFIG ---
-        self.days_spinbox.set(self.default_days)
-        # --- FINE USA VALORE DA CONFIG ---
-
-        ttk.Label(input_section, text="Formato File:").grid(row=3, column=0, padx=5, pady=5, sticky=tk.W)
-        self.format_combobox = ttk.Combobox(input_section, values=self.file_formats, width=8, state="readonly")
-        self.format_combobox.grid(row=3, column=1, padx=5, pady=5)
-        # --- USA VALORE DA CONFIG ---
-        if self.default_file_format.upper() in self.file_formats:
-            self.format_combobox.set(self.default_file_format.upper())
-        elif self.file_formats:
-            self.format_combobox.set(self.file_formats[0])
-        # --- FINE USA VALORE DA CONFIG ---
-
-        self.download_button = ttk.Button(input_section, text="Scarica Dati Storici", command=self.start_download_thread)
-        self.download_button.grid(row=4, column=0, columnspan=2, pady=10)
-
-        # --- Frame per lo stato ---
-        status_section = ttk.LabelFrame(self, text="Stato Download", padding=self.padding)
-        status_section.pack(fill=tk.X, expand=True, pady=5)
-        self.status_label = ttk.Label(status_section, text="Pronto per scaricare.", justify=tk.LEFT)
-        self.status_label.pack(pady=5, anchor=tk.W)
-
-    def start_download_thread(self):
-        asset_id = self.asset_id_entry.get().strip().lower()
-        vs_currency = self.vs_currency_combobox.get().strip().lower()
-        file_format = self.format_combobox.get().lower()
-        try:
-            days = int(self.days_spinbox.get())
-            if days <= 0:
-                messagebox.showerror("Errore Input", "Il numero di giorni deve essere positivo.")
-                return
-        except ValueError:
-            messagebox.showerror("Errore Input", "Numero di giorni non valido.")
-            return
-
-        if not asset_id or not vs_currency:
-            messagebox.showerror("Errore Input", "ID Asset e Valuta di riferimento sono obbligatori.")
-            return
-
-        self.download_button.config(state=tk.DISABLED)
-        self.status_label.config(text=f"Scaricamento dati per {asset_id} ({days} giorni)...")
-
-        api_thread = threading.Thread(target=self.fetch_and_save_in_thread,
-                                      args=(self.api_queue, asset_id, vs_currency, days, file_format),
-                                      daemon=True)
-        api_thread.start()
-
-    def fetch_and_save_in_thread(self, q, asset_id, vs_currency, days, file_format):
-        print(f"THREAD DOWNLOAD: Richiedo dati storici per {asset_id}...")
-        historical_data = api_handler.get_historical_market_data(asset_id, vs_currency, str(days))
-        
-        if isinstance(historical_data, dict) and "error" in historical_data:
-            q.put(historical_data) # Manda l'errore alla coda
-            return
-        
-        if not (isinstance(historical_data, dict) and "data_points" in historical_data and historical_data["data_points"]):
-            q.put({"error": "Nessun punto dati ricevuto o formato non valido."})
-            return
-
-        # Chiedi all'utente dove salvare il file (questo deve avvenire nel thread principale)
-        # Quindi passiamo i dati alla coda e lasciamo che process_api_queue gestisca il salvataggio
-        q.put({"data_to_save": historical_data, "format": file_format, "asset_id": asset_id, "days": days})
-
-
-    def save_data_to_file(self, data_package):
-        historical_data = data_package.get("data_to_save")
-        file_format = data_package.get("format")
-        asset_id = data_package.get("asset_id", "data")
-        days = data_package.get("days", "N")
-
-        default_filename = f"{asset_id}_{days}d_storico.{file_format}"
-        
-        if file_format == "csv":
-            filetypes = [('File CSV', '*.csv')]
-        elif file_format == "json":
-            filetypes = [('File JSON', '*.json')]
-        else:
-            error_msg = f"Formato file '{file_format}' non supportato."
-            self.status_label.config(text=f"Errore: {error_msg}")
-            messagebox.showerror("Errore Formato File", error_msg)
-            return False # Indica fallimento
-
-        filepath = filedialog.asksaveasfilename(
-            defaultextension=f".{file_format}",
-            filetypes=filetypes,
-            initialfile=default_filename,
-            title=f"Salva dati storici come {file_format.upper()}"
-        )
-
-        if not filepath: # L'utente ha annullato
-            self.status_label.config(text="Salvataggio annullato dall'utente.")
-            return False # Indica fallimento o annullamento
-
-        try:
-            data_points = historical_data.get("data_points", [])
-            if not data_points:
-                self.status_label.config(text="Nessun dato da salvare.")
-                return False
-
-            if file_format == "csv":
-                with open(filepath, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=data_points[0].keys())
-                    writer.writeheader()
-                    writer.writerows(data_points)
-            elif file_format == "json":
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(historical_data, f, indent=4) # Salviamo tutto il pacchetto formattato
-            
-            self.status_label.config(text=f"Dati salvati con successo in:\n{filepath}")
-            return True # Indica successo
-        except Exception as e:
-            self.status_label.config(text=f"Errore durante il salvataggio:\n{e}")
-            messagebox.showerror("Errore Salvataggio", f"Impossibile salvare il file:\n{e}")
-            return False
-
-
-    def process_api_queue(self):
-        try:
-            message = self.api_queue.get_nowait()
-            
-            if "data_to_save" in message: # È un messaggio con dati da salvare
-                # La chiamata a filedialog DEVE avvenire nel thread principale
-                if self.save_data_to_file(message):
-                    pass # Il messaggio di successo/errore è gestito da save_data_to_file
-                else:
-                    # Se save_data_to_file ritorna False (es. annullato o errore)
-                    if "Salvataggio annullato" not in self.status_label.cget("text"): # Evita doppio messaggio
-                         self.status_label.config(text="Operazione di salvataggio fallita o annullata.")
-
-            elif "error" in message: # È un messaggio di errore dall'API
-                error_msg = message['error']
-                self.status_label.config(text=f"Errore API Download: {error_msg[:100]}")
-                messagebox.showerror("Errore API Download", f"Impossibile scaricare i dati:\n{error_msg}")
-            else:
-                self.status_label.config(text="Risposta API non riconosciuta.")
-
-            self.download_button.config(state=tk.NORMAL)
-
-        except queue.Empty:
-            pass
-        except Exception as e:
-            self.status_label.config(text=f"Errore UI Download: {e}")
-            print(f"Errore in process_api_queue (DownloadTab): {e}")
-            if hasattr(self, 'download_button'):
-                self.download_button.config(state=tk.NORMAL)
-        finally:
-            self.after(100, self.process_api_queue)
\ No newline at end of file
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog # filedialog per salvare file
+
+# Import dell'api_handler
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import api_handler
+import exporters # Scrittura a blocchi di CSV/JSON/JSONL e formati binari colonnari
+import batch_download
+from gui_tabs.dispatcher import get_dispatcher
+from gui_tabs.worker_pool import get_worker_pool, current_token
+import config_manager
+
+BATCH_STOPPED_TEXT = "Download multiplo interrotto. Premi \"Avvia Download Multiplo\" per riprendere."
+
+class DownloadTab(ttk.Frame):
+    def __init__(self, parent_notebook, *args, **kwargs):
+        super().__init__(parent_notebook, *args, **kwargs)
+        self.padding = kwargs.get('padding', (10, 10, 10, 10))
+        
+        self.app_config = config_manager.load_config()
+        self.default_asset_id = self.app_config.get(
+            "download_tab_default_asset_id",
+            config_manager.DEFAULT_CONFIG["download_tab_default_asset_id"]
+        )
+        self.default_vs_currency = self.app_config.get(
+            "default_vs_currency",
+            config_manager.DEFAULT_CONFIG["default_vs_currency"]
+        )
+        self.default_days = self.app_config.get(
+            "default_download_days",
+            config_manager.DEFAULT_CONFIG["default_download_days"]
+        )
+        self.default_file_format = self.app_config.get(
+            "download_tab_default_file_format",
+            config_manager.DEFAULT_CONFIG["download_tab_default_file_format"]
+        )
+        self.default_batch_dir = self.app_config.get(
+            "download_tab_batch_dir",
+            config_manager.DEFAULT_CONFIG["download_tab_batch_dir"]
+        )
+        self.default_batch_top_n = self.app_config.get(
+            "download_tab_batch_top_n",
+            config_manager.DEFAULT_CONFIG["download_tab_batch_top_n"]
+        )
+        
+        self.api_queue = get_dispatcher(self).channel(self.process_api_message) # Risultati consegnati dal dispatcher centrale
+        self.common_currencies = ["usd", "eur", "gbp", "jpy", "btc", "eth", "cad", "aud", "chf"]
+        # Lista per la ComboBox del formato (PARQUET e ARROW compaiono solo se pyarrow è installato)
+        self.file_formats = [file_format.upper() for file_format in exporters.available_formats()]
+        
+        self.create_widgets()
+
+    def create_widgets(self):
+        input_section = ttk.Frame(self, padding=self.padding)
+        input_section.pack(fill=tk.X, pady=5)
+
+        ttk.Label(input_section, text="ID Criptovaluta:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        self.asset_id_entry = ttk.Entry(input_section, width=20)
+        self.asset_id_entry.grid(row=0, column=1, padx=5, pady=5)
+        # --- USA VALORE DA CONFIG ---
+        self.asset_id_entry.insert(0, self.default_asset_id)
+        # --- FINE USA VALORE DA CONFIG ---
+
+        ttk.Label(input_section, text="Valuta di riferimento:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+        self.vs_currency_combobox = ttk.Combobox(input_section, values=self.common_currencies, width=8, state="readonly")
+        self.vs_currency_combobox.grid(row=1, column=1, padx=5, pady=5)
+        # --- USA VALORE DA CONFIG ---
+        if self.default_vs_currency in self.common_currencies:
+            self.vs_currency_combobox.set(self.default_vs_currency)
+        elif self.common_currencies:
+            self.vs_currency_combobox.set(self.common_currencies[0])
+        # --- FINE USA VALORE DA CONFIG ---
+
+        ttk.Label(input_section, text="Giorni di storico:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
+        self.days_spinbox = ttk.Spinbox(input_section, from_=1, to=3650, increment=1, width=8)
+        self.days_spinbox.grid(row=2, column=1, padx=5, pady=5)
+        # --- USA VALORE DA CONFIG ---
+        self.days_spinbox.set(self.default_days)
+        # --- FINE USA VALORE DA CONFIG ---
+
+        ttk.Label(input_section, text="Formato File:").grid(row=3, column=0, padx=5, pady=5, sticky=tk.W)
+        self.format_combobox = ttk.Combobox(input_section, values=self.file_formats, width=8, state="readonly")
+        self.format_combobox.grid(row=3, column=1, padx=5, pady=5)
+        # --- USA VALORE DA CONFIG ---
+        if self.default_file_format.upper() in self.file_formats:
+            self.format_combobox.set(self.default_file_format.upper())
+        elif self.file_formats:
+            self.format_combobox.set(self.file_formats[0])
+        # --- FINE USA VALORE DA CONFIG ---
+        self.format_combobox.bind("<<ComboboxSelected>>", self.update_compression_choices)
+
+        # Compressione, solo per i formati binari (NPZ, Parquet, Arrow)
+        ttk.Label(input_section, text="Compressione:").grid(row=4, column=0, padx=5, pady=5, sticky=tk.W)
+        self.compression_combobox = ttk.Combobox(input_section, width=8, state="readonly")
+        self.compression_combobox.grid(row=4, column=1, padx=5, pady=5)
+        self.update_compression_choices()
+
+        self.download_button = ttk.Button(input_section, text="Scarica Dati Storici", command=self.start_download_thread)
+        self.download_button.grid(row=5, column=0, columnspan=2, pady=10)
+
+        self.create_batch_widgets()
+
+        # --- Frame per lo stato ---
+        status_section = ttk.LabelFrame(self, text="Stato Download", padding=self.padding)
+        status_section.pack(fill=tk.X, expand=True, pady=5)
+        self.status_label = ttk.Label(status_section, text="Pronto per scaricare.", justify=tk.LEFT)
+        self.status_label.pack(pady=5, anchor=tk.W)
+
+    def create_batch_widgets(self):
+        # --- Download multiplo: stessi valuta, giorni, formato e compressione della sezione sopra ---
+        self.batch_section = ttk.LabelFrame(self, text="Download Multiplo", padding=self.padding)
+        self.batch_section.pack(fill=tk.X, pady=5)
+
+        ttk.Label(self.batch_section, text="Asset:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        self.batch_source = tk.StringVar(value="watchlist")
+        ttk.Radiobutton(self.batch_section, text="Watchlist", variable=self.batch_source,
+                        value="watchlist").grid(row=0, column=1, padx=5, sticky=tk.W)
+        ttk.Radiobutton(self.batch_section, text="Prime N per market cap:", variable=self.batch_source,
+                        value="top").grid(row=1, column=1, padx=5, sticky=tk.W)
+        self.batch_top_spinbox = ttk.Spinbox(self.batch_section, from_=1, to=5000, increment=10, width=8)
+        self.batch_top_spinbox.grid(row=1, column=2, padx=5, sticky=tk.W)
+        self.batch_top_spinbox.set(self.default_batch_top_n)
+        ttk.Radiobutton(self.batch_section, text="File di ID:", variable=self.batch_source,
+                        value="file").grid(row=2, column=1, padx=5, sticky=tk.W)
+        self.batch_file_entry = ttk.Entry(self.batch_section, width=30)
+        self.batch_file_entry.grid(row=2, column=2, padx=5, pady=2)
+        ttk.Button(self.batch_section, text="Sfoglia...", command=self.choose_batch_ids_file).grid(row=2, column=3, padx=5)
+
+        ttk.Label(self.batch_section, text="Cartella:").grid(row=3, column=0, padx=5, pady=5, sticky=tk.W)
+        self.batch_dir_entry = ttk.Entry(self.batch_section, width=30)
+        self.batch_dir_entry.grid(row=3, column=1, columnspan=2, padx=5, pady=5, sticky=tk.EW)
+        self.batch_dir_entry.insert(0, self.default_batch_dir)
+        ttk.Button(self.batch_section, text="Sfoglia...", command=self.choose_batch_dir).grid(row=3, column=3, padx=5)
+
+        self.batch_combined = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.batch_section, text="Un unico file con tutti gli asset",
+                        variable=self.batch_combined).grid(row=4, column=1, columnspan=2, padx=5, sticky=tk.W)
+
+        self.batch_start_button = ttk.Button(self.batch_section, text="Avvia Download Multiplo", command=self.start_batch_download)
+        self.batch_start_button.grid(row=5, column=1, pady=10, sticky=tk.W)
+        self.batch_stop_button = ttk.Button(self.batch_section, text="Interrompi", command=self.stop_batch_download,
+                                            state=tk.DISABLED)
+        self.batch_stop_button.grid(row=5, column=2, pady=10, sticky=tk.W)
+        self.batch_progressbar = ttk.Progressbar(self.batch_section, mode="determinate")
+        self.batch_progressbar.grid(row=6, column=0, columnspan=4, padx=5, pady=5, sticky=tk.EW)
+
+    def choose_batch_ids_file(self):
+        path = filedialog.askopenfilename(title="File con un ID per riga",
+                                          filetypes=[('File di testo', '*.txt'), ('Tutti i file', '*.*')])
+        if path:
+            self.batch_file_entry.delete(0, tk.END)
+            self.batch_file_entry.insert(0, path)
+            self.batch_source.set("file")
+
+    def choose_batch_dir(self):
+        path = filedialog.askdirectory(title="Cartella per il download multiplo", initialdir=self.batch_dir_entry.get() or None)
+        if path:
+            self.batch_dir_entry.delete(0, tk.END)
+            self.batch_dir_entry.insert(0, path)
+
+    def update_compression_choices(self, event=None):
+        """Aggiorna le compressioni disponibili per il formato scelto (nessuna scelta per i formati testuali)."""
+        choices = exporters.BINARY_COMPRESSIONS.get(self.format_combobox.get().lower())
+        if not choices:
+            self.compression_combobox.config(values=[], state=tk.DISABLED)
+            self.compression_combobox.set("")
+            return
+        self.compression_combobox.config(values=[choice or "nessuna" for choice in choices], state="readonly")
+        self.compression_combobox.set(choices[0] or "nessuna")
+
+    def start_download_thread(self):
+        asset_id = self.asset_id_entry.get().strip().lower()
+        vs_currency = self.vs_currency_combobox.get().strip().lower()
+        file_format = self.format_combobox.get().lower()
+        compression = self.compression_combobox.get()
+        compression = None if compression in ("", "nessuna") else compression
+        try:
+            days = int(self.days_spinbox.get())
+            if days <= 0:
+                messagebox.showerror("Errore Input", "Il numero di giorni deve essere positivo.")
+                return
+        except ValueError:
+            messagebox.showerror("Errore Input", "Numero di giorni non valido.")
+            return
+
+        if not asset_id or not vs_currency:
+            messagebox.showerror("Errore Input", "ID Asset e Valuta di riferimento sono obbligatori.")
+            return
+
+        self.download_button.config(state=tk.DISABLED)
+        self.status_label.config(text=f"Scaricamento dati per {asset_id} ({days} giorni)...")
+
+        # Pool condiviso: una nuova richiesta di questa scheda annulla quella precedente
+        token = get_worker_pool().submit(self, self.fetch_and_save_in_thread, self.api_queue, asset_id, vs_currency, days,
+                                         file_format, compression)
+        if token is None:
+            self.download_button.config(state=tk.NORMAL)
+            self.status_label.config(text="Troppe richieste in corso, riprova fra poco.")
+
+    def start_batch_download(self):
+        vs_currency = self.vs_currency_combobox.get().strip().lower()
+        file_format = self.format_combobox.get().lower()
+        compression = self.compression_combobox.get()
+        compression = None if compression in ("", "nessuna") else compression
+        output_dir = self.batch_dir_entry.get().strip()
+        source = self.batch_source.get()
+        combined = self.batch_combined.get()
+        try:
+            days = int(self.days_spinbox.get())
+            top_n = int(self.batch_top_spinbox.get())
+            if days <= 0 or top_n <= 0:
+                messagebox.showerror("Errore Input", "Giorni e numero di monete devono essere positivi.")
+                return
+        except ValueError:
+            messagebox.showerror("Errore Input", "Numero di giorni o di monete non valido.")
+            return
+        if not vs_currency or not output_dir:
+            messagebox.showerror("Errore Input", "Valuta di riferimento e cartella sono obbligatorie.")
+            return
+        ids_path = self.batch_file_entry.get().strip()
+        if source == "file" and not ids_path:
+            messagebox.showerror("Errore Input", "Scegli il file con gli ID degli asset.")
+            return
+        if combined and file_format not in exporters.COMBINED_FORMATS:
+            messagebox.showerror("Errore Input", f"Il formato {file_format.upper()} non è disponibile per il file unico.")
+            return
+
+        self.batch_start_button.config(state=tk.DISABLED)
+        self.batch_stop_button.config(state=tk.NORMAL)
+        self.batch_progressbar.config(value=0, maximum=1)
+        self.status_label.config(text="Download multiplo: preparazione dell'elenco degli asset...")
+        # La sezione ha una propria coda nel pool: non annulla (e non viene annullata da) il download singolo
+        token = get_worker_pool().submit(self.batch_section, self.batch_download_in_thread, self.api_queue, source,
+                                         top_n, ids_path, output_dir, vs_currency, days, file_format, compression, combined)
+        if token is None:
+            self.finish_batch_ui("Troppe richieste in corso, riprova fra poco.")
+
+    def stop_batch_download(self):
+        # Gli asset completati restano nel checkpoint: con "Avvia" si riprende da dove ci si è fermati
+        pool = get_worker_pool()
+        pool.cancel(self.batch_section)
+        self.batch_stop_button.config(state=tk.DISABLED)
+        if pool.pending_count(self.batch_section) == 0:
+            # Era ancora in coda: non è mai partito, quindi non manderà il messaggio finale
+            self.finish_batch_ui(BATCH_STOPPED_TEXT)
+        else:
+            # "Avvia" torna attivo solo con il messaggio finale del download interrotto: fino ad allora
+            # gli asset già partiti scrivono ancora nella cartella e nel checkpoint
+            self.status_label.config(text="Download multiplo: interruzione in corso, attendo gli asset già avviati...")
+
+    def finish_batch_ui(self, text):
+        self.batch_start_button.config(state=tk.NORMAL)
+        self.batch_stop_button.config(state=tk.DISABLED)
+        self.status_label.config(text=text)
+
+    def batch_download_in_thread(self, q, source, top_n, ids_path, output_dir, vs_currency, days, file_format,
+                                 compression, combined):
+        try:
+            if source == "watchlist":
+                asset_ids = batch_download.watchlist_ids()
+            elif source == "top":
+                asset_ids = batch_download.top_ids(vs_currency, top_n)
+            else:
+                asset_ids = batch_download.read_ids_file(ids_path)
+        except OSError as e:
+            q.put_always({"batch_error": f"Impossibile leggere il file di ID: {e}"})
+            return
+        if isinstance(asset_ids, dict):
+            q.put_always({"batch_error": asset_ids["error"]})
+            return
+        if not asset_ids:
+            q.put_always({"batch_error": "Nessun asset da scaricare."})
+            return
+
+        try:
+            summary = batch_download.batch_download(asset_ids, vs_currency, days, output_dir, file_format, compression,
+                                                    combined, progress=lambda event: q.put({"batch_progress": event}),
+                                                    cancel_token=current_token())
+        except Exception as e:
+            summary = {"error": f"Errore imprevisto: {e}"}
+        # Il messaggio finale arriva anche se il download è stato interrotto: è il segnale che si può riavviare
+        if "error" in summary:
+            q.put_always({"batch_error": summary["error"]})
+        else:
+            q.put_always({"batch_done": summary, "output_dir": output_dir})
+
+    def fetch_and_save_in_thread(self, q, asset_id, vs_currency, days, file_format, compression=None):
+        print(f"THREAD DOWNLOAD: Richiedo dati storici per {asset_id}...")
+        historical_data = api_handler.get_historical_market_data(asset_id, vs_currency, str(days), columnar=True,
+                                                                 sync_to_now=True, cancel_token=current_token())
+        
+        if isinstance(historical_data, dict) and "error" in historical_data:
+            q.put(historical_data) # Manda l'errore alla coda
+            return
+        
+        if not (isinstance(historical_data, dict) and "series" in historical_data and len(historical_data["series"]) > 0):
+            q.put({"error": "Nessun punto dati ricevuto o formato non valido."})
+            return
+
+        # Chiedi all'utente dove salvare il file (questo deve avvenire nel thread principale)
+        # Quindi passiamo i dati alla coda e lasciamo che process_api_message gestisca il salvataggio
+        q.put({"data_to_save": historical_data, "format": file_format, "compression": compression,
+               "asset_id": asset_id, "days": days})
+
+
+    def save_data_to_file(self, data_package):
+        """
+        Chiede dove salvare il file (nel thread principale) e avvia la scrittura nel pool di thread.
+        Restituisce True se la scrittura è partita: l'esito arriva poi in api_queue.
+        """
+        historical_data = data_package.get("data_to_save")
+        file_format = data_package.get("format")
+        compression = data_package.get("compression")
+        asset_id = data_package.get("asset_id", "data")
+        days = data_package.get("days", "N")
+
+        default_filename = f"{asset_id}_{days}d_storico.{file_format}"
+        
+        if file_format == "csv":
+            filetypes = [('File CSV', '*.csv')]
+        elif file_format == "json":
+            filetypes = [('File JSON', '*.json')]
+        elif file_format == "jsonl":
+            filetypes = [('File JSON Lines', '*.jsonl')]
+        elif file_format == "npz":
+            filetypes = [('Archivio NumPy', '*.npz')]
+        elif file_format == "parquet":
+            filetypes = [('File Parquet', '*.parquet')]
+        elif file_format == "arrow":
+            filetypes = [('File Arrow IPC', '*.arrow')]
+        else:
+            error_msg = f"Formato file '{file_format}' non supportato."
+            self.status_label.config(text=f"Errore: {error_msg}")
+            messagebox.showerror("Errore Formato File", error_msg)
+            return False # Indica fallimento
+
+        filepath = filedialog.asksaveasfilename(
+            defaultextension=f".{file_format}",
+            filetypes=filetypes,
+            initialfile=default_filename,
+            title=f"Salva dati storici come {file_format.upper()}"
+        )
+
+        if not filepath: # L'utente ha annullato
+            self.status_label.config(text="Salvataggio annullato dall'utente.")
+            return False # Indica fallimento o annullamento
+
+        # La scrittura (formattazione delle date compresa) avviene a blocchi in un thread del pool,
+        # così l'interfaccia non si blocca anche con storici molto lunghi
+        self.status_label.config(text=f"Salvataggio in corso:\n{filepath}")
+        token = get_worker_pool().submit(self, self.export_in_thread, self.api_queue, historical_data, filepath,
+                                         file_format, compression, supersede=False)
+        if token is None:
+            self.status_label.config(text="Troppe richieste in corso, riprova fra poco.")
+            return False
+        return True
+
+    def export_in_thread(self, q, historical_data, filepath, file_format, compression=None):
+        total = len(historical_data["series"])
+        def report_progress(written, total_rows):
+            q.put({"export_progress": written, "total": total_rows or total, "path": filepath})
+        try:
+            written = exporters.export_history(historical_data, filepath, file_format, progress=report_progress,
+                                               compression=compression)
+            q.put({"export_done": filepath, "rows": written})
+        except Exception as e:
+            q.put({"export_error": str(e), "path": filepath})
+
+
+    def process_api_message(self, message):
+        try:
+            
+            if "batch_progress" in message or "batch_done" in message or "batch_error" in message:
+                self.process_batch_message(message)
+                return # Il download multiplo non usa il pulsante del download singolo
+
+            if "export_progress" in message: # Avanzamento della scrittura nel thread del pool
+                percent = 100 * message["export_progress"] / message["total"] if message["total"] else 100
+                self.status_label.config(text=f"Salvataggio in corso ({percent:.0f}%, {message['export_progress']} punti):\n{message['path']}")
+                return # Il pulsante resta disattivato fino alla fine della scrittura
+
+            elif "export_done" in message:
+                self.status_label.config(text=f"Dati salvati con successo ({message['rows']} punti) in:\n{message['export_done']}")
+
+            elif "export_error" in message:
+                self.status_label.config(text=f"Errore durante il salvataggio:\n{message['export_error']}")
+                messagebox.showerror("Errore Salvataggio", f"Impossibile salvare il file:\n{message['export_error']}")
+
+            elif "data_to_save" in message: # È un messaggio con dati da salvare
+                # La chiamata a filedialog DEVE avvenire nel thread principale
+                if self.save_data_to_file(message):
+                    return # La scrittura è partita: il pulsante torna attivo con "export_done" o "export_error"
+                else:
+                    # Se save_data_to_file ritorna False (es. annullato o errore)
+                    if "Salvataggio annullato" not in self.status_label.cget("text"): # Evita doppio messaggio
+                         self.status_label.config(text="Operazione di salvataggio fallita o annullata.")
+
+            elif "error" in message: # È un messaggio di errore dall'API
+                error_msg = message['error']
+                self.status_label.config(text=f"Errore API Download: {error_msg[:100]}")
+                messagebox.showerror("Errore API Download", f"Impossibile scaricare i dati:\n{error_msg}")
+            else:
+                self.status_label.config(text="Risposta API non riconosciuta.")
+
+            self.download_button.config(state=tk.NORMAL)
+
+        except Exception as e:
+            self.status_label.config(text=f"Errore UI Download: {e}")
+            print(f"Errore in process_api_message (DownloadTab): {e}")
+            if hasattr(self, 'download_button'):
+                self.download_button.config(state=tk.NORMAL)
+
+    def process_batch_message(self, message):
+        try:
+            if "batch_progress" in message:
+                event = message["batch_progress"]
+                self.batch_progressbar.config(maximum=max(1, event["total"]), value=event["completed"])
+                status = {"done": "scaricato", "skipped": "già presente", "error": "errore"}.get(event["status"], event["status"])
+                self.status_label.config(
+                    text=f"Download multiplo: {event['completed']}/{event['total']} ({event['asset_id']}: {status})")
+                return
+
+            if "batch_error" in message:
+                self.finish_batch_ui(f"Errore download multiplo: {message['batch_error']}")
+                messagebox.showerror("Errore Download Multiplo", message["batch_error"])
+                return
+
+            summary = message["batch_done"]
+            if summary["cancelled"]:
+                self.finish_batch_ui(BATCH_STOPPED_TEXT)
+                return
+            text = (f"Download multiplo completato: {len(summary['done'])} scaricati, "
+                    f"{len(summary['skipped'])} già presenti, {len(summary['errors'])} errori.\n"
+                    f"Cartella: {os.path.abspath(message['output_dir'])}")
+            if summary.get("combined_file"):
+                text += f"\nFile unico: {os.path.basename(summary['combined_file'])}"
+            self.finish_batch_ui(text)
+            if summary["errors"]:
+                details = "\n".join(f"{asset_id}: {error}" for asset_id, error in list(summary["errors"].items())[:10])
+                messagebox.showwarning("Download Multiplo", f"Alcuni asset non sono stati scaricati "
+                                       f"(verranno ritentati al prossimo avvio):\n{details}")
+        except Exception as e:
+            print(f"Errore in process_batch_message (DownloadTab): {e}")
+            self.finish_batch_ui(f"Errore UI Download multiplo: {e}")
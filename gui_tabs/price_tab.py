@@ -1,13 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import threading # Importiamo il modulo per il threading
-import queue     # Importiamo il modulo per le code (comunicazione tra thread)
 
 # Manteniamo l'import dell'api_handler come prima
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import api_handler
+from gui_tabs.dispatcher import get_dispatcher
+from gui_tabs.worker_pool import get_worker_pool
 import config_manager
 
 class PriceTab(ttk.Frame):
@@ -27,11 +27,10 @@ class PriceTab(ttk.Frame):
         )
         # --- FINE CARICAMENTO CONFIGURAZIONE ---
         
-        self.api_queue = queue.Queue()
+        self.api_queue = get_dispatcher(self).channel(self.process_api_message) # Risultati consegnati dal dispatcher centrale
         self.common_currencies = ["usd", "eur", "gbp", "jpy", "btc", "eth", "cad", "aud", "chf"] # Manteniamo questa lista per ora
         
         self.create_widgets()
-        self.process_api_queue()
 
     def create_widgets(self):
         input_frame = ttk.Frame(self, padding=(0, 0, 0, 10))
@@ -83,20 +82,18 @@ class PriceTab(ttk.Frame):
             # Potremmo usare anche una tkinter.messagebox qui
             return
 
-        # Disabilita il pulsante e mostra un messaggio di caricamento
-        self.fetch_button.config(state=tk.DISABLED)
+        # Il pulsante resta attivo: una nuova richiesta annulla quella in corso. Mostra un messaggio di caricamento
         self.status_label.config(text=f"Caricamento dati per {asset_id}...")
         self.price_label.config(text="Prezzo: -") # Pulisce i risultati precedenti
         self.change_24h_label.config(text="Variazione 24h: -")
         self.volume_label.config(text="Volume 24h: -")
         self.last_updated_label.config(text="Ultimo Aggiornamento: -")
         
-        # Crea e avvia il thread che eseguirà la chiamata API
-        # Passiamo la coda, asset_id e currency come argomenti alla funzione target del thread
-        api_thread = threading.Thread(target=self.fetch_price_in_thread, 
-                                      args=(self.api_queue, asset_id, currency),
-                                      daemon=True) # daemon=True fa sì che il thread si chiuda quando l'app principale si chiude
-        api_thread.start()
+        # Mette la chiamata API nel pool di thread condiviso (una nuova richiesta di questa scheda annulla quella precedente)
+        # Passiamo la coda, asset_id e currency come argomenti alla funzione eseguita dal pool
+        token = get_worker_pool().submit(self, self.fetch_price_in_thread, self.api_queue, asset_id, currency)
+        if token is None:
+            self.status_label.config(text="Troppe richieste in corso, riprova fra poco.")
 
     def fetch_price_in_thread(self, q, asset_id, currency):
         """
@@ -108,40 +105,27 @@ class PriceTab(ttk.Frame):
         q.put(price_info) # Mette il risultato nella coda
         print(f"THREAD: Risultato messo in coda: {price_info}")
 
-    def process_api_queue(self):
+    def process_api_message(self, message):
         """
-        Controlla la coda per i risultati dall'API e aggiorna la GUI.
-        Viene chiamata periodicamente usando self.after().
+        Aggiorna la GUI con il risultato dell'API.
+        Viene chiamata dal dispatcher centrale, nel thread di Tk, quando il thread di lavoro mette il risultato in api_queue.
         """
-        try:
-            # Prova a prendere un messaggio dalla coda senza bloccare (nowait)
-            message = self.api_queue.get_nowait()
-
-            if "error" in message:
-                error_message = message['error']
-                self.price_label.config(text="Prezzo: Errore")
-                self.change_24h_label.config(text=f"Dettaglio: {error_message[:70]}")
-                self.volume_label.config(text="Volume 24h: -")
-                self.last_updated_label.config(text="Ultimo Aggiornamento: -")
-                self.status_label.config(text=f"Errore API: {error_message[:70]}")
-                print(f"Errore API dalla coda: {error_message}")
-                messagebox.showerror("Errore API", f"Impossibile recuperare i dati:\n{error_message}")
-            else:
-                price_str = f"{message.get('price', 'N/D'):,.2f}" if isinstance(message.get('price'), (int, float)) else "N/D"
-                change_str = f"{message.get('change_24h', 0):.2f}%" if isinstance(message.get('change_24h'), (int, float)) else "N/D"
-                volume_str = f"{message.get('volume_24h', 'N/D'):,.2f}" if isinstance(message.get('volume_24h'), (int, float)) else "N/D"
-            
-                self.price_label.config(text=f"Prezzo: {price_str} {message.get('currency', '')}")
-                self.change_24h_label.config(text=f"Variazione 24h: {change_str}")
-                self.volume_label.config(text=f"Volume 24h: {volume_str} {message.get('currency', '')}")
-                self.last_updated_label.config(text=f"Ultimo Aggiornamento: {message.get('last_updated', 'N/D')}")
-                self.status_label.config(text=f"Dati per {self.asset_id_entry.get()} aggiornati!")
-
-            # Riabilita il pulsante indipendentemente dal risultato
-            self.fetch_button.config(state=tk.NORMAL)
-
-        except queue.Empty: # Se la coda è vuota, non fare nulla
-            pass
-        finally:
-            # Richiama questa funzione dopo 100 millisecondi per continuare a controllare la coda
-            self.after(100, self.process_api_queue)
\ No newline at end of file
+        if "error" in message:
+            error_message = message['error']
+            self.price_label.config(text="Prezzo: Errore")
+            self.change_24h_label.config(text=f"Dettaglio: {error_message[:70]}")
+            self.volume_label.config(text="Volume 24h: -")
+            self.last_updated_label.config(text="Ultimo Aggiornamento: -")
+            self.status_label.config(text=f"Errore API: {error_message[:70]}")
+            print(f"Errore API dalla coda: {error_message}")
+            messagebox.showerror("Errore API", f"Impossibile recuperare i dati:\n{error_message}")
+        else:
+            price_str = f"{message.get('price', 'N/D'):,.2f}" if isinstance(message.get('price'), (int, float)) else "N/D"
+            change_str = f"{message.get('change_24h', 0):.2f}%" if isinstance(message.get('change_24h'), (int, float)) else "N/D"
+            volume_str = f"{message.get('volume_24h', 'N/D'):,.2f}" if isinstance(message.get('volume_24h'), (int, float)) else "N/D"
+        
+            self.price_label.config(text=f"Prezzo: {price_str} {message.get('currency', '')}")
+            self.change_24h_label.config(text=f"Variazione 24h: {change_str}")
+            self.volume_label.config(text=f"Volume 24h: {volume_str} {message.get('currency', '')}")
+            self.last_updated_label.config(text=f"Ultimo Aggiornamento: {message.get('last_updated', 'N/D')}")
+            self.status_label.config(text=f"Dati per {self.asset_id_entry.get()} aggiornati!")
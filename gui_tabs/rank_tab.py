@@ -1,176 +1,291 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import threading
-import queue
-
-# Import dell'api_handler
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import api_handler
-import config_manager
-
-class RankTab(ttk.Frame):
-    def __init__(self, parent_notebook, *args, **kwargs):
-        super().__init__(parent_notebook, *args, **kwargs)
-        self.padding = kwargs.get('padding', (10, 10, 10, 10))
-        
-        self.app_config = config_manager.load_config()
-        self.default_top_n = self.app_config.get(
-            "default_rank_top_n",
-            config_manager.DEFAULT_CONFIG["default_rank_top_n"]
-        )
-        self.default_currency = self.app_config.get(
-            "default_vs_currency", # Usiamo la chiave generica per la valuta
-            config_manager.DEFAULT_CONFIG["default_vs_currency"]
-        )
-        
-        self.api_queue = queue.Queue()
-        self.common_currencies = ["usd", "eur", "gbp", "jpy", "btc", "eth", "cad", "aud", "chf"]
-        
-        self.create_widgets()
-        self.process_api_queue()
-        self.start_fetch_rank_thread()
-
-    def create_widgets(self):
-        controls_frame = ttk.Frame(self, padding=(0,0,0,10))
-        controls_frame.pack(fill=tk.X)
-
-        ttk.Label(controls_frame, text="Numero risultati (Top N):").pack(side=tk.LEFT, padx=(0,5))
-        self.top_n_spinbox = ttk.Spinbox(controls_frame, from_=5, to=100, increment=5, width=5)
-        # --- USA VALORE DA CONFIG ---
-        self.top_n_spinbox.set(self.default_top_n) 
-        # --- FINE USA VALORE DA CONFIG ---
-        self.top_n_spinbox.pack(side=tk.LEFT, padx=(0,10))
-
-        ttk.Label(controls_frame, text="Valuta:").pack(side=tk.LEFT, padx=(5,5)) 
-        self.currency_combobox = ttk.Combobox(controls_frame, values=self.common_currencies, width=8, state="readonly")
-        # --- USA VALORE DA CONFIG ---
-        if self.default_currency in self.common_currencies:
-            self.currency_combobox.set(self.default_currency)
-        elif self.common_currencies:
-            self.currency_combobox.set(self.common_currencies[0])
-        # --- FINE USA VALORE DA CONFIG ---
-        self.currency_combobox.pack(side=tk.LEFT, padx=(0,10))
-
-        self.fetch_button = ttk.Button(controls_frame, text="Mostra Classifica", command=self.start_fetch_rank_thread)
-        self.fetch_button.pack(side=tk.LEFT)
-        
-        self.status_label = ttk.Label(controls_frame, text="", font=("Helvetica", 10, "italic"))
-        self.status_label.pack(side=tk.LEFT, padx=10)
-
-        # --- Treeview per la classifica ---
-        columns = ('rank', 'name', 'price', 'change_1h', 'change_24h', 'change_7d', 'market_cap', 'volume_24h')
-        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=20)
-
-        # Intestazioni
-        self.tree.heading('rank', text='Rank')
-        self.tree.heading('name', text='Nome (Simbolo)')
-        self.tree.heading('price', text='Prezzo')
-        self.tree.heading('change_1h', text='1h %')
-        self.tree.heading('change_24h', text='24h %')
-        self.tree.heading('change_7d', text='7gg %')
-        self.tree.heading('market_cap', text='Market Cap')
-        self.tree.heading('volume_24h', text='Volume 24h')
-
-        # Larghezza colonne e allineamento
-        col_widths = {'rank': 50, 'name': 200, 'price': 120, 'change_1h': 80, 
-                      'change_24h': 80, 'change_7d': 80, 'market_cap': 150, 'volume_24h': 150}
-        col_anchors = {'rank': tk.CENTER, 'name': tk.W, 'price': tk.E, 'change_1h': tk.E,
-                       'change_24h': tk.E, 'change_7d': tk.E, 'market_cap': tk.E, 'volume_24h': tk.E}
-
-        for col, width in col_widths.items():
-            self.tree.column(col, width=width, anchor=col_anchors[col], stretch=tk.NO)
-        
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    def start_fetch_rank_thread(self):
-        try:
-            top_n = int(self.top_n_spinbox.get())
-            vs_currency = self.currency_combobox.get().strip().lower()
-            if top_n <= 0 or not vs_currency:
-                messagebox.showerror("Errore Input", "Numero risultati deve essere > 0 e valuta non vuota.")
-                return
-        except ValueError:
-            messagebox.showerror("Errore Input", "Numero risultati non valido.")
-            return
-            
-        self.fetch_button.config(state=tk.DISABLED)
-        self.status_label.config(text=f"Caricamento Top {top_n} in {vs_currency.upper()}...")
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-            
-        api_thread = threading.Thread(target=self.fetch_rank_in_thread,
-                                      args=(self.api_queue, vs_currency, top_n),
-                                      daemon=True)
-        api_thread.start()
-
-    def fetch_rank_in_thread(self, q, vs_currency, top_n):
-        print(f"THREAD RANK: Richiedo Top {top_n} in {vs_currency}...")
-        data = api_handler.get_market_cap_ranking(vs_currency, top_n)
-        q.put({"data": data, "currency": vs_currency.upper()}) # Passiamo anche la valuta per le intestazioni
-        print(f"THREAD RANK: Dati messi in coda.")
-
-    def process_api_queue(self):
-        try:
-            message_package = self.api_queue.get_nowait()
-            message_data = message_package.get("data") # 'data' contiene la lista di coin o il dizionario di errore
-            currency_display = message_package.get("currency", "")
-            
-            self.status_label.config(text="") # Pulisce lo status label
-
-            if isinstance(message_data, dict) and "error" in message_data:
-                error_msg = message_data['error']
-                self.status_label.config(text=f"Errore API Rank: {error_msg[:70]}")
-                # --- AGGIUNTA MESSAGEBOX PER ERRORE API ---
-                messagebox.showerror("Errore API Classifica", f"Impossibile caricare la classifica:\n{error_msg}")
-                # --- FINE AGGIUNTA ---
-            elif isinstance(message_data, list):
-                # ... (la logica per popolare il Treeview rimane invariata) ...
-                self.tree.heading('price', text=f'Prezzo ({currency_display})')
-                self.tree.heading('market_cap', text=f'Market Cap ({currency_display})')
-                self.tree.heading('volume_24h', text=f'Volume 24h ({currency_display})')
-
-                for coin in message_data:
-                    price_str = f"{coin.get('current_price', 'N/D'):,.2f}" if isinstance(coin.get('current_price'), (int, float)) else "N/D"
-                    mc_str = f"{coin.get('market_cap', 'N/D'):,.0f}" if isinstance(coin.get('market_cap'), (int, float)) else "N/D" 
-                    vol_str = f"{coin.get('total_volume_24h', 'N/D'):,.0f}" if isinstance(coin.get('total_volume_24h'), (int, float)) else "N/D"
-                    
-                    chg_1h_str = f"{coin.get('price_change_1h', 0):.2f}%" if isinstance(coin.get('price_change_1h'), (int, float)) else "N/D"
-                    chg_24h_str = f"{coin.get('price_change_24h', 0):.2f}%" if isinstance(coin.get('price_change_24h'), (int, float)) else "N/D"
-                    chg_7d_str = f"{coin.get('price_change_7d', 0):.2f}%" if isinstance(coin.get('price_change_7d'), (int, float)) else "N/D"
-
-                    self.tree.insert('', tk.END, values=(
-                        coin.get('rank', 'N/D'),
-                        f"{coin.get('name', 'N/D')} ({coin.get('symbol', 'N/D')})",
-                        price_str,
-                        chg_1h_str,
-                        chg_24h_str,
-                        chg_7d_str,
-                        mc_str,
-                        vol_str
-                    ))
-                self.status_label.config(text="Classifica aggiornata!")
-                # Non aggiungiamo messagebox.showinfo qui perché l'aggiornamento della tabella è già un feedback visivo forte.
-            else:
-                self.status_label.config(text="Errore: Risposta API non valida per Rank.")
-                messagebox.showwarning("Risposta Sconosciuta", "L'API ha restituito una risposta non prevista per la Classifica.")
-
-
-            self.fetch_button.config(state=tk.NORMAL)
-
-        except queue.Empty:
-            pass
-        except Exception as e:
-            self.status_label.config(text=f"Errore UI Rank: {e}")
-            messagebox.showerror("Errore Interfaccia", f"Si è verificato un errore nell'interfaccia Classifica:\n{e}")
-            print(f"Errore in process_api_queue (RankTab): {e}")
-            if hasattr(self, 'fetch_button'):
-                self.fetch_button.config(state=tk.NORMAL)
-        finally:
-            self.after(100, self.process_api_queue)
\ No newline at end of file
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+# Import dell'api_handler
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import api_handler
+from gui_tabs.dispatcher import get_dispatcher
+from gui_tabs.tree_utils import reconcile_tree
+from gui_tabs.virtual_table import VirtualTable
+from gui_tabs.worker_pool import get_worker_pool, is_cancelled, PRIORITY_USER, PRIORITY_BACKGROUND
+import config_manager
+
+# Da questo numero di monete in su la classifica usa la tabella virtuale (solo le righe visibili sono in Tk)
+RANK_VIRTUAL_TABLE_MIN_ROWS = 500
+
+def _format_number(decimals, suffix=""):
+    return lambda value: f"{value:,.{decimals}f}{suffix}" if value is not None else "N/D"
+
+def _format_percent(value):
+    return f"{value:.2f}%" if value is not None else "N/D"
+
+# Colonne della tabella virtuale: stessi contenuti e formati del Treeview normale
+VIRTUAL_RANK_COLUMNS = [
+    {"key": "rank", "heading": "Rank", "width": 50, "anchor": tk.CENTER, "numeric": True, "format": _format_number(0)},
+    {"key": "name", "heading": "Nome (Simbolo)", "width": 200, "anchor": tk.W,
+     "value": lambda coin: f"{coin.get('name', 'N/D')} ({coin.get('symbol', 'N/D')})"},
+    {"key": "current_price", "heading": "Prezzo", "width": 120, "anchor": tk.E, "numeric": True, "format": _format_number(2)},
+    {"key": "price_change_1h", "heading": "1h %", "width": 80, "anchor": tk.E, "numeric": True, "format": _format_percent},
+    {"key": "price_change_24h", "heading": "24h %", "width": 80, "anchor": tk.E, "numeric": True, "format": _format_percent},
+    {"key": "price_change_7d", "heading": "7gg %", "width": 80, "anchor": tk.E, "numeric": True, "format": _format_percent},
+    {"key": "market_cap", "heading": "Market Cap", "width": 150, "anchor": tk.E, "numeric": True, "format": _format_number(0)},
+    {"key": "total_volume_24h", "heading": "Volume 24h", "width": 150, "anchor": tk.E, "numeric": True, "format": _format_number(0)},
+]
+
+class RankTab(ttk.Frame):
+    def __init__(self, parent_notebook, *args, **kwargs):
+        super().__init__(parent_notebook, *args, **kwargs)
+        self.padding = kwargs.get('padding', (10, 10, 10, 10))
+        
+        self.app_config = config_manager.load_config()
+        self.default_top_n = self.app_config.get(
+            "default_rank_top_n",
+            config_manager.DEFAULT_CONFIG["default_rank_top_n"]
+        )
+        self.default_currency = self.app_config.get(
+            "default_vs_currency", # Usiamo la chiave generica per la valuta
+            config_manager.DEFAULT_CONFIG["default_vs_currency"]
+        )
+        
+        self.api_queue = get_dispatcher(self).channel(self.process_api_message) # Risultati consegnati dal dispatcher centrale
+        self.common_currencies = ["usd", "eur", "gbp", "jpy", "btc", "eth", "cad", "aud", "chf"]
+        self.loaded_pages = {} # pagina -> righe (iid, valori) già arrivate, per le classifiche a pagine
+        self.loaded_coin_pages = {} # pagina -> monete già arrivate, per la tabella virtuale
+        self.failed_pages = {} # pagina -> messaggio di errore, riportato nello stato finale
+        self.virtual_mode = False
+        
+        self.create_widgets()
+        self.start_fetch_rank_thread(priority=PRIORITY_BACKGROUND) # Caricamento iniziale: dopo i clic dell'utente
+
+    def create_widgets(self):
+        controls_frame = ttk.Frame(self, padding=(0,0,0,10))
+        controls_frame.pack(fill=tk.X)
+
+        ttk.Label(controls_frame, text="Numero risultati (Top N):").pack(side=tk.LEFT, padx=(0,5))
+        # Oltre MARKETS_MAX_PER_PAGE l'api_handler scarica più pagine in parallelo
+        self.top_n_spinbox = ttk.Spinbox(controls_frame, from_=5, to=5000, increment=5, width=5)
+        # --- USA VALORE DA CONFIG ---
+        self.top_n_spinbox.set(self.default_top_n) 
+        # --- FINE USA VALORE DA CONFIG ---
+        self.top_n_spinbox.pack(side=tk.LEFT, padx=(0,10))
+
+        ttk.Label(controls_frame, text="Valuta:").pack(side=tk.LEFT, padx=(5,5)) 
+        self.currency_combobox = ttk.Combobox(controls_frame, values=self.common_currencies, width=8, state="readonly")
+        # --- USA VALORE DA CONFIG ---
+        if self.default_currency in self.common_currencies:
+            self.currency_combobox.set(self.default_currency)
+        elif self.common_currencies:
+            self.currency_combobox.set(self.common_currencies[0])
+        # --- FINE USA VALORE DA CONFIG ---
+        self.currency_combobox.pack(side=tk.LEFT, padx=(0,10))
+
+        self.fetch_button = ttk.Button(controls_frame, text="Mostra Classifica", command=self.start_fetch_rank_thread)
+        self.fetch_button.pack(side=tk.LEFT)
+        
+        # Filtro per nome/simbolo: disponibile con la tabella virtuale (classifiche lunghe)
+        ttk.Label(controls_frame, text="Filtro:").pack(side=tk.LEFT, padx=(15,5))
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.virtual_table.set_filter(self.filter_var.get()))
+        self.filter_entry = ttk.Entry(controls_frame, textvariable=self.filter_var, width=15, state=tk.DISABLED)
+        self.filter_entry.pack(side=tk.LEFT)
+
+        self.status_label = ttk.Label(controls_frame, text="", font=("Helvetica", 10, "italic"))
+        self.status_label.pack(side=tk.LEFT, padx=10)
+
+        # --- Treeview per la classifica ---
+        self.tree_frame = ttk.Frame(self)
+        columns = ('rank', 'name', 'price', 'change_1h', 'change_24h', 'change_7d', 'market_cap', 'volume_24h')
+        self.tree = ttk.Treeview(self.tree_frame, columns=columns, show='headings', height=20)
+
+        # Intestazioni
+        self.tree.heading('rank', text='Rank')
+        self.tree.heading('name', text='Nome (Simbolo)')
+        self.tree.heading('price', text='Prezzo')
+        self.tree.heading('change_1h', text='1h %')
+        self.tree.heading('change_24h', text='24h %')
+        self.tree.heading('change_7d', text='7gg %')
+        self.tree.heading('market_cap', text='Market Cap')
+        self.tree.heading('volume_24h', text='Volume 24h')
+
+        # Larghezza colonne e allineamento
+        col_widths = {'rank': 50, 'name': 200, 'price': 120, 'change_1h': 80, 
+                      'change_24h': 80, 'change_7d': 80, 'market_cap': 150, 'volume_24h': 150}
+        col_anchors = {'rank': tk.CENTER, 'name': tk.W, 'price': tk.E, 'change_1h': tk.E,
+                       'change_24h': tk.E, 'change_7d': tk.E, 'market_cap': tk.E, 'volume_24h': tk.E}
+
+        for col, width in col_widths.items():
+            self.tree.column(col, width=width, anchor=col_anchors[col], stretch=tk.NO)
+        
+        # Scrollbar
+        scrollbar = ttk.Scrollbar(self.tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscroll=scrollbar.set)
+        
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Tabella virtuale per le classifiche lunghe (mostrata al posto del Treeview, vedi _set_virtual_mode)
+        self.virtual_table = VirtualTable(self, VIRTUAL_RANK_COLUMNS, filter_key="name", height=20)
+
+    def _set_virtual_mode(self, enabled):
+        """Mostra la tabella virtuale (classifiche lunghe) oppure il Treeview normale."""
+        if enabled == self.virtual_mode:
+            return
+        self.virtual_mode = enabled
+        if enabled:
+            self.tree_frame.pack_forget()
+            self.virtual_table.pack(fill=tk.BOTH, expand=True)
+            self.filter_entry.config(state=tk.NORMAL)
+        else:
+            self.virtual_table.pack_forget()
+            self.tree_frame.pack(fill=tk.BOTH, expand=True)
+            self.filter_var.set("")
+            self.filter_entry.config(state=tk.DISABLED)
+
+    def start_fetch_rank_thread(self, priority=PRIORITY_USER):
+        try:
+            top_n = int(self.top_n_spinbox.get())
+            vs_currency = self.currency_combobox.get().strip().lower()
+            if top_n <= 0 or not vs_currency:
+                messagebox.showerror("Errore Input", "Numero risultati deve essere > 0 e valuta non vuota.")
+                return
+        except ValueError:
+            messagebox.showerror("Errore Input", "Numero risultati non valido.")
+            return
+            
+        # Il pulsante resta attivo: una nuova richiesta (altra valuta o altro Top N) annulla quella in corso
+        self.status_label.config(text=f"Caricamento Top {top_n} in {vs_currency.upper()}...")
+        # Non svuotiamo la tabella: le righe vengono aggiornate all'arrivo dei nuovi dati (vedi reconcile_tree)
+        self.loaded_pages = {}
+        self.loaded_coin_pages = {}
+        self.failed_pages = {}
+        self._set_virtual_mode(top_n >= RANK_VIRTUAL_TABLE_MIN_ROWS)
+            
+        # Pool condiviso: una nuova richiesta di questa scheda annulla quella precedente
+        token = get_worker_pool().submit(self, self.fetch_rank_in_thread, self.api_queue, vs_currency, top_n, priority=priority)
+        if token is None:
+            self.status_label.config(text="Troppe richieste in corso, riprova fra poco.")
+
+    def fetch_rank_in_thread(self, q, vs_currency, top_n):
+        print(f"THREAD RANK: Richiedo Top {top_n} in {vs_currency}...")
+        if top_n <= api_handler.MARKETS_MAX_PER_PAGE:
+            data = api_handler.get_market_cap_ranking(vs_currency, top_n)
+            q.put({"data": data, "currency": vs_currency.upper()}) # Passiamo anche la valuta per le intestazioni
+        else:
+            # Classifica lunga: mettiamo in coda ogni pagina appena arriva, così la tabella si riempie man mano
+            pages = api_handler.iter_market_cap_ranking(vs_currency, top_n)
+            for page_result in pages:
+                if is_cancelled(): # Richiesta superata da una più recente
+                    pages.close() # Annulla le pagine ancora in coda nel pool di api_handler
+                    return
+                page_data = page_result["coins"] if "coins" in page_result else {"error": page_result["error"]}
+                q.put({"data": page_data, "currency": vs_currency.upper(), "page": page_result["page"]})
+            q.put({"done": True, "currency": vs_currency.upper()})
+        print(f"THREAD RANK: Dati messi in coda.")
+
+    def _loaded_rows(self):
+        return [row for page in sorted(self.loaded_pages) for row in self.loaded_pages[page]]
+
+    def _failed_pages_note(self):
+        return f", {len(self.failed_pages)} pagine non caricate" if self.failed_pages else ""
+
+    def process_api_message(self, message_package):
+        try:
+            message_data = message_package.get("data") # 'data' contiene la lista di coin o il dizionario di errore
+            currency_display = message_package.get("currency", "")
+            page = message_package.get("page") # Presente solo per le classifiche scaricate a pagine
+
+            if message_package.get("done"): # Tutte le pagine sono arrivate (o fallite)
+                if self.virtual_mode:
+                    coin_count = self.virtual_table.record_count()
+                else:
+                    # Solo ora togliamo le monete uscite dalla classifica; se mancano delle pagine
+                    # teniamo le righe precedenti al posto dei rank non caricati
+                    reconcile_tree(self.tree, self._loaded_rows(), delete_missing=not self.failed_pages)
+                    coin_count = len(self.tree.get_children())
+                if self.failed_pages:
+                    # Lo stato finale deve dire che mancano dei rank, anche se l'ultima pagina arrivata era valida
+                    failed = sorted(self.failed_pages)
+                    self.status_label.config(
+                        text=f"Classifica incompleta: {len(failed)} pagine non caricate ({coin_count} monete)")
+                    messagebox.showwarning("Classifica Incompleta",
+                                           f"Pagine non caricate: {', '.join(str(failed_page) for failed_page in failed)}\n"
+                                           f"{self.failed_pages[failed[0]]}")
+                else:
+                    self.status_label.config(text=f"Classifica aggiornata! ({coin_count} monete)")
+                return
+            
+            self.status_label.config(text="") # Pulisce lo status label
+
+            if isinstance(message_data, dict) and "error" in message_data and page is not None:
+                # Pagina fallita: le altre continuano ad arrivare, l'errore viene riportato con il messaggio "done"
+                self.failed_pages[page] = message_data['error']
+                self.status_label.config(text=f"Caricamento classifica... {len(self.failed_pages)} pagine non caricate")
+            elif isinstance(message_data, dict) and "error" in message_data:
+                error_msg = message_data['error']
+                self.status_label.config(text=f"Errore API Rank: {error_msg[:70]}")
+                # --- AGGIUNTA MESSAGEBOX PER ERRORE API ---
+                messagebox.showerror("Errore API Classifica", f"Impossibile caricare la classifica:\n{error_msg}")
+                # --- FINE AGGIUNTA ---
+            elif isinstance(message_data, list) and self.virtual_mode:
+                # Tabella virtuale: le monete vanno nel modello così come sono, la formattazione avviene
+                # solo per le righe visibili
+                for key, text in (("current_price", "Prezzo"), ("market_cap", "Market Cap"), ("total_volume_24h", "Volume 24h")):
+                    self.virtual_table.set_heading(key, f"{text} ({currency_display})")
+                if page is None:
+                    self.virtual_table.set_records(message_data)
+                    self.status_label.config(text="Classifica aggiornata!")
+                else:
+                    self.loaded_coin_pages[page] = message_data
+                    self.virtual_table.set_records(
+                        [coin for loaded_page in sorted(self.loaded_coin_pages) for coin in self.loaded_coin_pages[loaded_page]])
+                    self.status_label.config(text=f"Caricamento classifica... {self.virtual_table.record_count()} monete"
+                                                  + self._failed_pages_note())
+            elif isinstance(message_data, list):
+                # ... (la logica per popolare il Treeview rimane invariata) ...
+                self.tree.heading('price', text=f'Prezzo ({currency_display})')
+                self.tree.heading('market_cap', text=f'Market Cap ({currency_display})')
+                self.tree.heading('volume_24h', text=f'Volume 24h ({currency_display})')
+
+                rows = [] # (iid, valori): l'iid è l'id della moneta, così le righe si aggiornano invece di essere ricreate
+                for coin in message_data:
+                    price_str = f"{coin.get('current_price', 'N/D'):,.2f}" if isinstance(coin.get('current_price'), (int, float)) else "N/D"
+                    mc_str = f"{coin.get('market_cap', 'N/D'):,.0f}" if isinstance(coin.get('market_cap'), (int, float)) else "N/D" 
+                    vol_str = f"{coin.get('total_volume_24h', 'N/D'):,.0f}" if isinstance(coin.get('total_volume_24h'), (int, float)) else "N/D"
+                    
+                    chg_1h_str = f"{coin.get('price_change_1h', 0):.2f}%" if isinstance(coin.get('price_change_1h'), (int, float)) else "N/D"
+                    chg_24h_str = f"{coin.get('price_change_24h', 0):.2f}%" if isinstance(coin.get('price_change_24h'), (int, float)) else "N/D"
+                    chg_7d_str = f"{coin.get('price_change_7d', 0):.2f}%" if isinstance(coin.get('price_change_7d'), (int, float)) else "N/D"
+
+                    rows.append((coin.get('id') or f"rank_{coin.get('rank')}", (
+                        coin.get('rank', 'N/D'),
+                        f"{coin.get('name', 'N/D')} ({coin.get('symbol', 'N/D')})",
+                        price_str,
+                        chg_1h_str,
+                        chg_24h_str,
+                        chg_7d_str,
+                        mc_str,
+                        vol_str
+                    )))
+                if page is None:
+                    reconcile_tree(self.tree, rows)
+                    self.status_label.config(text="Classifica aggiornata!")
+                else:
+                    # Le pagine possono arrivare in ordine sparso: le righe arrivate finora, in ordine di pagina,
+                    # vanno in cima; le righe del caricamento precedente restano sotto fino al messaggio "done"
+                    self.loaded_pages[page] = rows
+                    loaded_rows = self._loaded_rows()
+                    reconcile_tree(self.tree, loaded_rows, delete_missing=False)
+                    self.status_label.config(text=f"Caricamento classifica... {len(loaded_rows)} monete"
+                                                  + self._failed_pages_note())
+                # Non aggiungiamo messagebox.showinfo qui perché l'aggiornamento della tabella è già un feedback visivo forte.
+            else:
+                self.status_label.config(text="Errore: Risposta API non valida per Rank.")
+                messagebox.showwarning("Risposta Sconosciuta", "L'API ha restituito una risposta non prevista per la Classifica.")
+
+        except Exception as e:
+            self.status_label.config(text=f"Errore UI Rank: {e}")
+            messagebox.showerror("Errore Interfaccia", f"Si è verificato un errore nell'interfaccia Classifica:\n{e}")
+            print(f"Errore in process_api_message (RankTab): {e}")
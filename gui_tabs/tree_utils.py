@@ -0,0 +1,68 @@
+def _as_strings(values):
+    # Tk restituisce i valori delle celle come stringhe (o numeri): confrontiamo sempre come testo
+    return tuple("" if value is None else str(value) for value in values)
+
+
+def reconcile_tree(tree, rows, parent='', delete_missing=True):
+    """
+    Aggiorna le righe di un Treeview invece di svuotarlo e reinserire tutto.
+    'rows' è la lista, nell'ordine voluto, di coppie (iid, valori) (l'iid è di solito l'id dell'asset):
+    - le righe già presenti vengono aggiornate solo se i valori sono cambiati;
+    - le righe nuove vengono inserite nella posizione giusta, quelle fuori posto spostate;
+    - le righe che non compaiono più vengono eliminate (con delete_missing=False restano,
+      in coda, utile mentre una classifica arriva a pagine).
+    Selezione e posizione di scorrimento vengono mantenute.
+    Restituisce un dizionario con il numero di righe inserite, aggiornate, spostate ed eliminate.
+    """
+    stats = {"inserted": 0, "updated": 0, "moved": 0, "deleted": 0}
+    first_visible = tree.yview()[0]
+    # Ultimi valori scritti da questa funzione, per non rileggere ogni cella da Tk
+    written = tree.__dict__.setdefault("_reconciled_values", {})
+
+    wanted_ids = {iid for iid, _ in rows}
+    current = list(tree.get_children(parent))
+    if delete_missing:
+        stale = [iid for iid in current if iid not in wanted_ids]
+        if stale:
+            tree.delete(*stale)
+            for iid in stale:
+                written.pop(iid, None)
+            stats["deleted"] = len(stale)
+            current = [iid for iid in current if iid in wanted_ids]
+    present = set(current)
+
+    for index, (iid, values) in enumerate(rows):
+        values = _as_strings(values)
+        if iid not in present:
+            tree.insert(parent, index, iid=iid, values=values)
+            current.insert(index, iid)
+            present.add(iid)
+            written[iid] = values
+            stats["inserted"] += 1
+            continue
+
+        if index >= len(current) or current[index] != iid:
+            tree.move(iid, parent, index)
+            current.remove(iid)
+            current.insert(index, iid)
+            stats["moved"] += 1
+
+        old_values = written.get(iid)
+        if old_values is None:
+            old_values = _as_strings(tree.item(iid, "values"))
+        if old_values != values:
+            tree.item(iid, values=values)
+            stats["updated"] += 1
+        written[iid] = values
+
+    if stats["inserted"] or stats["moved"] or stats["deleted"]:
+        tree.yview_moveto(first_visible) # Gli inserimenti sopra la vista non devono far saltare la tabella
+    return stats
+
+
+def clear_tree(tree):
+    """Svuota il Treeview (e i valori ricordati da reconcile_tree)."""
+    children = tree.get_children()
+    if children:
+        tree.delete(*children)
+    tree.__dict__.pop("_reconciled_values", None)
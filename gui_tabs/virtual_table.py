@@ -0,0 +1,252 @@
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+VIRTUAL_TABLE_OVERSCAN = 10     # Righe formattate in anticipo sopra e sotto la parte visibile
+VIRTUAL_TABLE_ROW_HEIGHT = 20   # Altezza di riga usata finché Tk non ci dice quella vera
+WHEEL_SCROLL_ROWS = 3           # Righe per ogni scatto della rotella
+
+
+class TableModel:
+    """
+    Dati di una VirtualTable tenuti in colonne numpy (float64 per i numeri, stringhe per il testo)
+    invece che in righe di Tk. Ordinamento e filtro lavorano sugli array e producono solo
+    'view', l'elenco degli indici dei record da mostrare nell'ordine voluto.
+    Ogni colonna è un dizionario con:
+      "key"     - chiave del record (dizionario) da cui leggere il valore
+      "value"   - (opzionale) funzione record -> valore, al posto di "key"
+      "numeric" - True per le colonne numeriche (i valori non numerici diventano NaN)
+    """
+    def __init__(self, columns, filter_key=None):
+        self.columns = columns
+        self.filter_key = filter_key
+        self.data = {}
+        self._filter_lower = None  # Colonna del filtro in minuscolo, calcolata una volta per set_records
+        self._order = np.empty(0, dtype=np.int64) # Tutti i record, nell'ordine corrente
+        self.view = np.empty(0, dtype=np.int64)   # Record che passano il filtro, nell'ordine corrente
+        self.sort_key = None
+        self.sort_descending = False
+        self.filter_text = ""
+        self.set_records([])
+
+    def __len__(self):
+        return len(self.view)
+
+    def set_records(self, records):
+        """Sostituisce i dati; ordinamento e filtro correnti vengono riapplicati."""
+        for column in self.columns:
+            getter = column.get("value") or (lambda record, key=column["key"]: record.get(key))
+            values = [getter(record) for record in records]
+            if column.get("numeric"):
+                self.data[column["key"]] = np.array(
+                    [value if isinstance(value, (int, float)) else np.nan for value in values], dtype=np.float64)
+            else:
+                self.data[column["key"]] = np.array(["" if value is None else str(value) for value in values], dtype=str)
+        if self.filter_key is not None:
+            self._filter_lower = np.char.lower(self.data[self.filter_key])
+        self._apply_sort()
+
+    def record_count(self):
+        return len(self._order)
+
+    def value(self, index, key):
+        return self.data[key][index]
+
+    def sort(self, key, descending=False):
+        self.sort_key = key
+        self.sort_descending = descending
+        self._apply_sort()
+
+    def _apply_sort(self):
+        count = len(next(iter(self.data.values()))) if self.data else 0
+        if self.sort_key is None:
+            order = np.arange(count, dtype=np.int64)
+        else:
+            column = self.data[self.sort_key]
+            if column.dtype.kind == "f":
+                # argsort mette i NaN in fondo; per il decrescente ordiniamo i valori negati così restano in fondo
+                order = np.argsort(-column if self.sort_descending else column, kind="stable")
+            else:
+                order = np.argsort(np.char.lower(column), kind="stable")
+                if self.sort_descending:
+                    order = order[::-1]
+        self._order = order.astype(np.int64, copy=False)
+        self._apply_filter(self.filter_text, incremental=False)
+
+    def set_filter(self, text):
+        """
+        Mostra solo i record la cui colonna filter_key contiene 'text' (senza distinzione di maiuscole).
+        Se il nuovo testo allunga il precedente si filtra solo la vista corrente (filtro incrementale).
+        """
+        text = text.strip().lower()
+        incremental = bool(self.filter_text) and text.startswith(self.filter_text)
+        self._apply_filter(text, incremental)
+
+    def _apply_filter(self, text, incremental):
+        self.filter_text = text
+        if not text or self._filter_lower is None:
+            self.view = self._order
+            return
+        candidates = self.view if incremental else self._order
+        self.view = candidates[np.char.find(self._filter_lower[candidates], text) >= 0]
+
+
+class VirtualTable(ttk.Frame):
+    """
+    Tabella per molte migliaia di righe. Il Treeview contiene solo le righe visibili (un piccolo
+    gruppo di righe Tk riutilizzate): scorrendo cambiano solo i loro valori, presi dal TableModel.
+    Si formattano solo le righe visibili più VIRTUAL_TABLE_OVERSCAN sopra e sotto, e le stringhe
+    formattate restano in una piccola cache finché i dati non cambiano.
+    Ogni colonna (oltre ai campi di TableModel) ha "heading", "width", "anchor" e "format"
+    (funzione valore -> testo; i NaN delle colonne numeriche arrivano come None).
+    Clic su un'intestazione: ordina per quella colonna (un secondo clic inverte l'ordine).
+    """
+    def __init__(self, parent, columns, filter_key=None, height=20, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.columns = columns
+        self.model = TableModel(columns, filter_key=filter_key)
+        self.offset = 0           # Posizione (nella vista del modello) della prima riga mostrata
+        self.visible_rows = height
+        self._format_cache = {}   # indice del record -> tupla di stringhe
+        self._pool = []           # iid delle righe Tk riutilizzate
+        self._detached = set()    # Righe del gruppo staccate perché ci sono meno record che righe
+        self._row_height = VIRTUAL_TABLE_ROW_HEIGHT
+
+        keys = [column["key"] for column in columns]
+        self.tree = ttk.Treeview(self, columns=keys, show='headings', height=height, selectmode="none")
+        for column in columns:
+            self.tree.heading(column["key"], text=column["heading"],
+                              command=lambda key=column["key"]: self.sort_by(key))
+            self.tree.column(column["key"], width=column.get("width", 100), anchor=column.get("anchor", tk.W),
+                             stretch=tk.NO)
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_rows(-WHEEL_SCROLL_ROWS))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_rows(WHEEL_SCROLL_ROWS))
+        self.tree.bind("<Up>", lambda event: self.scroll_rows(-1))
+        self.tree.bind("<Down>", lambda event: self.scroll_rows(1))
+        self.tree.bind("<Prior>", lambda event: self.scroll_rows(-self.visible_rows))
+        self.tree.bind("<Next>", lambda event: self.scroll_rows(self.visible_rows))
+        self._resize_pool(height)
+
+    # --- Dati ---
+
+    def set_records(self, records):
+        """Sostituisce i dati mostrati (lista di dizionari); la posizione di scorrimento viene mantenuta."""
+        self.model.set_records(records)
+        self._format_cache.clear()
+        self.refresh()
+
+    def record_count(self):
+        return self.model.record_count()
+
+    def set_heading(self, key, text):
+        self.tree.heading(key, text=text)
+
+    def sort_by(self, key):
+        descending = not self.model.sort_descending if self.model.sort_key == key else False
+        self.model.sort(key, descending)
+        self.offset = 0
+        self.refresh()
+
+    def set_filter(self, text):
+        self.model.set_filter(text)
+        self.offset = 0
+        self.refresh()
+
+    # --- Disegno ---
+
+    def _format_record(self, index):
+        formatted = self._format_cache.get(index)
+        if formatted is None:
+            values = []
+            for column in self.columns:
+                value = self.model.value(index, column["key"])
+                if column.get("numeric"):
+                    value = None if value != value else value.item() # NaN -> None, numpy -> float
+                formatter = column.get("format")
+                values.append(formatter(value) if formatter else ("" if value is None else str(value)))
+            formatted = tuple(values)
+            self._format_cache[index] = formatted
+        return formatted
+
+    def refresh(self):
+        """Riempie le righe Tk con i record della finestra visibile e aggiorna la scrollbar."""
+        total = len(self.model)
+        self.offset = max(0, min(self.offset, total - self.visible_rows))
+        view = self.model.view
+
+        for row, iid in enumerate(self._pool):
+            position = self.offset + row
+            if position < total:
+                if iid in self._detached:
+                    self.tree.move(iid, '', row) # Riaggancia una riga staccata in precedenza
+                    self._detached.discard(iid)
+                self.tree.item(iid, values=self._format_record(int(view[position])))
+            elif iid not in self._detached:
+                self.tree.detach(iid) # Meno record che righe: le righe in eccesso non si vedono
+                self._detached.add(iid)
+
+        # Formattazione anticipata delle righe appena fuori vista, e cache limitata alla finestra corrente
+        start = max(0, self.offset - VIRTUAL_TABLE_OVERSCAN)
+        stop = min(total, self.offset + self.visible_rows + VIRTUAL_TABLE_OVERSCAN)
+        for position in range(start, stop):
+            self._format_record(int(view[position]))
+        max_cache = 4 * (self.visible_rows + 2 * VIRTUAL_TABLE_OVERSCAN)
+        if len(self._format_cache) > max_cache:
+            keep = set(view[start:stop].tolist())
+            self._format_cache = {index: values for index, values in self._format_cache.items() if index in keep}
+
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _resize_pool(self, rows):
+        rows = max(1, rows)
+        while len(self._pool) < rows:
+            iid = f"vrow{len(self._pool)}"
+            self.tree.insert('', tk.END, iid=iid, values=())
+            self._pool.append(iid)
+        while len(self._pool) > rows:
+            iid = self._pool.pop()
+            self._detached.discard(iid)
+            self.tree.delete(iid)
+        self.visible_rows = rows
+
+    # --- Scorrimento ---
+
+    def scroll_rows(self, delta):
+        self.offset += delta
+        self.refresh()
+        return "break"
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * len(self.model))
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self.offset += int(amount) * step
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        # Windows/macOS: delta multiplo di 120 (o piccolo su macOS); il segno indica la direzione
+        return self.scroll_rows(-WHEEL_SCROLL_ROWS if event.delta > 0 else WHEEL_SCROLL_ROWS)
+
+    def _on_resize(self, event):
+        # Altezza reale di riga e intestazione dalla prima riga disegnata, se disponibile
+        header_height = self._row_height + 5
+        if self._pool and self._pool[0] not in self._detached:
+            bbox = self.tree.bbox(self._pool[0])
+            if bbox:
+                header_height, self._row_height = bbox[1], bbox[3]
+        rows = max(1, (event.height - header_height) // self._row_height)
+        if rows != self.visible_rows:
+            self._resize_pool(rows)
+            self.refresh()
@@ -1,234 +1,374 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import threading
-import queue
-
-# Import dell'api_handler come nel price_tab
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import api_handler
-import config_manager
-
-class WatchlistTab(ttk.Frame):
-    def __init__(self, parent_notebook, *args, **kwargs):
-        super().__init__(parent_notebook, *args, **kwargs)
-        self.padding = kwargs.get('padding', (10, 10, 10, 10))
-
-        self.app_config = config_manager.load_config() # Carica l'intera configurazione
-        
-        # Usa i valori dalla configurazione, con fallback ai default del config_manager
-        # se per qualche motivo non fossero nel file (es. file config vecchio o modificato male)
-        self.watchlist_ids = self.app_config.get(
-            "watchlist_ids", 
-            config_manager.DEFAULT_CONFIG["watchlist_ids"]
-        )
-        self.target_currency = self.app_config.get(
-            "default_vs_currency", 
-            config_manager.DEFAULT_CONFIG["default_vs_currency"]
-        )
-        
-        self.api_queue = queue.Queue()
-        self.create_widgets()
-        self.process_api_queue()
-        self.start_fetch_watchlist_thread() # Carica i dati all'avvio della scheda
-    
-    def add_asset_to_watchlist(self):
-        new_asset_id = self.new_asset_entry.get().strip().lower()
-
-        if not new_asset_id:
-            messagebox.showwarning("Input Vuoto", "Inserisci un ID asset da aggiungere.")
-            return
-
-        if new_asset_id in self.watchlist_ids:
-            messagebox.showinfo("Asset Esistente", f"'{new_asset_id.capitalize()}' è già nella watchlist.")
-            self.new_asset_entry.delete(0, tk.END) # Pulisce l'entry
-            return
-        
-        # Qui potremmo aggiungere una validazione API opzionale per l'asset ID
-        # Ma per ora procediamo direttamente con l'aggiunta
-
-        self.watchlist_ids.append(new_asset_id)
-        self.app_config["watchlist_ids"] = self.watchlist_ids # Aggiorna la lista nel dizionario di config
-
-        if config_manager.save_config(self.app_config):
-            messagebox.showinfo("Watchlist Aggiornata", f"'{new_asset_id.capitalize()}' aggiunto alla watchlist e configurazione salvata.")
-            self.new_asset_entry.delete(0, tk.END) # Pulisce l'entry
-            self.start_fetch_watchlist_thread() # Ricarica e aggiorna il Treeview
-        else:
-            messagebox.showerror("Errore Salvataggio", "Impossibile salvare la configurazione aggiornata.")
-            # Rimuovi l'asset aggiunto localmente se il salvataggio fallisce
-            if new_asset_id in self.watchlist_ids:
-                self.watchlist_ids.remove(new_asset_id)
-    
-    def remove_selected_from_watchlist(self):
-        selected_iids = self.tree.selection() # Ottiene gli iid degli elementi selezionati
-
-        if not selected_iids:
-            messagebox.showwarning("Nessuna Selezione", "Seleziona uno o più asset da rimuovere dalla watchlist.")
-            return
-
-        assets_removed_count = 0
-        asset_names_removed = []
-
-        for item_iid in selected_iids:
-            # Grazie all'uso di iid=asset_id, item_iid è l'ID originale lowercase dell'asset
-            # a meno che non sia una riga di errore (che inizierà con "error_")
-            if item_iid.startswith("error_"): 
-                print(f"Tentativo di rimuovere una riga di errore '{item_iid}', ignorato.")
-                continue # Non rimuovere le righe di errore in questo modo
-
-            if item_iid in self.watchlist_ids:
-                self.watchlist_ids.remove(item_iid)
-                assets_removed_count += 1
-                asset_names_removed.append(item_iid.capitalize())
-        
-        if assets_removed_count > 0:
-            self.app_config["watchlist_ids"] = self.watchlist_ids # Aggiorna la config
-            if config_manager.save_config(self.app_config):
-                removed_names_str = ", ".join(asset_names_removed)
-                messagebox.showinfo("Watchlist Aggiornata", 
-                                    f"{assets_removed_count} asset ({removed_names_str}) rimossi dalla watchlist e configurazione salvata.")
-                self.start_fetch_watchlist_thread() # Ricarica e aggiorna il Treeview
-            else:
-                messagebox.showerror("Errore Salvataggio", "Impossibile salvare la configurazione dopo la rimozione.")
-                # Se il salvataggio fallisce, dovremmo ripristinare self.watchlist_ids? 
-                # Per ora, non lo facciamo per semplicità, ma in un'app reale sarebbe da considerare.
-                # Per ora, ricarichiamo comunque la watchlist per riflettere lo stato attuale di self.watchlist_ids
-                self.start_fetch_watchlist_thread() 
-        else:
-            # Questo caso potrebbe verificarsi se gli iid selezionati non erano più in self.watchlist_ids
-            # o se sono state selezionate solo righe di errore non rimovibili
-            messagebox.showinfo("Nessuna Modifica", "Nessun asset valido selezionato per la rimozione o asset già rimossi.")
-
-    def create_widgets(self):
-        # --- Frame Superiore per Refresh e Status ---
-        top_controls_frame = ttk.Frame(self)
-        top_controls_frame.pack(fill=tk.X, pady=(0,5)) # Leggero padding sotto
-
-        self.refresh_button = ttk.Button(top_controls_frame, text="Aggiorna Watchlist", command=self.start_fetch_watchlist_thread)
-        self.refresh_button.pack(side=tk.LEFT, padx=(0,10))
-        
-        self.status_label = ttk.Label(top_controls_frame, text="", font=("Helvetica", 10, "italic"))
-        self.status_label.pack(side=tk.LEFT, padx=10)
-        if not self.app_config.get("watchlist_ids"): 
-            self.status_label.config(text="Watchlist vuota. Aggiungi asset qui sotto.")
-
-        # --- NUOVO: Frame per Aggiungere/Rimuovere Asset ---
-        edit_frame = ttk.Frame(self, padding=(0, 5, 0, 10)) # Padding sopra e sotto
-        edit_frame.pack(fill=tk.X)
-
-        ttk.Label(edit_frame, text="ID Asset da Aggiungere:").pack(side=tk.LEFT, padx=(0,5))
-        self.new_asset_entry = ttk.Entry(edit_frame, width=20)
-        self.new_asset_entry.pack(side=tk.LEFT, padx=(0,10))
-
-        self.add_button = ttk.Button(edit_frame, text="Aggiungi", command=self.add_asset_to_watchlist)
-        self.add_button.pack(side=tk.LEFT, padx=(0,5))
-
-        self.remove_button = ttk.Button(edit_frame, text="Rimuovi Selezionato", command=self.remove_selected_from_watchlist)
-        self.remove_button.pack(side=tk.LEFT, padx=(5,0))
-        # --- FINE NUOVO FRAME ---
-
-        # Treeview per mostrare i dati della watchlist (come prima)
-        columns = ('asset_id', 'price', 'change_24h', 'volume_24h', 'last_updated')
-        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=15)
-        # ... (configurazione treeview, headings, columns, scrollbar rimane come prima) ...
-        self.tree.heading('asset_id', text='Asset ID')
-        self.tree.heading('price', text=f'Prezzo ({self.target_currency.upper()})')
-        self.tree.heading('change_24h', text='Variazione 24h (%)')
-        self.tree.heading('volume_24h', text=f'Volume 24h ({self.target_currency.upper()})')
-        self.tree.heading('last_updated', text='Ultimo Agg.')
-
-        self.tree.column('asset_id', width=120, anchor=tk.W)
-        self.tree.column('price', width=120, anchor=tk.E)
-        self.tree.column('change_24h', width=150, anchor=tk.E)
-        self.tree.column('volume_24h', width=180, anchor=tk.E)
-        self.tree.column('last_updated', width=150, anchor=tk.CENTER)
-        
-        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    def start_fetch_watchlist_thread(self):
-        self.refresh_button.config(state=tk.DISABLED)
-        self.status_label.config(text="Aggiornamento watchlist...")
-
-        # Pulisce il treeview prima di ricaricare
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-            
-        api_thread = threading.Thread(target=self.fetch_watchlist_in_thread,
-                                      args=(self.api_queue, self.watchlist_ids, [self.target_currency]),
-                                      daemon=True)
-        api_thread.start()
-
-    def fetch_watchlist_in_thread(self, q, asset_ids_list, vs_currencies_list):
-        print(f"THREAD WATCHLIST: Richiedo dati per {asset_ids_list} in {vs_currencies_list}...")
-        data = api_handler.get_watchlist_prices(asset_ids_list, vs_currencies_list)
-        q.put(data)
-        print(f"THREAD WATCHLIST: Dati messi in coda: {len(data) if not 'error' in data else 'ERRORE'}")
-
-
-    def process_api_queue(self):
-        try:
-            message = self.api_queue.get_nowait()
-            current_status_text = "" 
-
-            if isinstance(message, dict) and "error" in message:
-                error_msg = message['error']
-                current_status_text = f"Errore API Watchlist: {error_msg[:70]}"
-                print(f"Errore API Watchlist dalla coda: {error_msg}")
-                messagebox.showerror("Errore API Watchlist", f"Impossibile aggiornare la watchlist:\n{error_msg}")
-            elif isinstance(message, dict): 
-                items_processed = 0
-                for asset_id, data_by_currency in message.items(): # asset_id qui è già lowercase
-                    items_processed += 1
-                    if "error" in data_by_currency:
-                        # --- MODIFICA QUI: Aggiungi iid anche per le righe di errore ---
-                        self.tree.insert('', tk.END, iid=f"error_{asset_id}", values=( # iid univoco per errori
-                            asset_id.capitalize(), 
-                            "Errore", 
-                            data_by_currency['error'][:30], 
-                            "-", 
-                            "-"
-                        ))
-                        continue
-
-                    details = data_by_currency.get(self.target_currency)
-                    if details:
-                        price_str = f"{details.get('price', 'N/D'):,.2f}" if isinstance(details.get('price'), (int, float)) else "N/D"
-                        change_str = f"{details.get('change_24h', 0):.2f}" if isinstance(details.get('change_24h'), (int, float)) else "N/D"
-                        volume_str = f"{details.get('volume_24h', 'N/D'):,.2f}" if isinstance(details.get('volume_24h'), (int, float)) else "N/D"
-                        
-                        # --- MODIFICA QUI: Aggiungi iid=asset_id ---
-                        self.tree.insert('', tk.END, iid=asset_id, values=( # Usa l'asset_id originale come iid
-                            asset_id.capitalize(), # Visualizza capitalizzato
-                            price_str,
-                            change_str,
-                            volume_str,
-                            data_by_currency.get('last_updated', 'N/D')
-                        ))
-                        # --- FINE MODIFICA ---
-                if items_processed > 0:
-                    current_status_text = "Watchlist aggiornata!"
-                else: 
-                    current_status_text = "Nessun dato ricevuto per la watchlist."
-            else: 
-                current_status_text = "Risposta API Watchlist non riconosciuta."
-                messagebox.showwarning("Risposta Sconosciuta", "L'API ha restituito una risposta non prevista per la Watchlist.")
-
-            self.status_label.config(text=current_status_text)
-            self.refresh_button.config(state=tk.NORMAL)
-
-        except queue.Empty:
-            pass
-        except Exception as e:
-            self.status_label.config(text=f"Errore UI Watchlist: {e}")
-            messagebox.showerror("Errore Interfaccia", f"Si è verificato un errore nell'interfaccia Watchlist:\n{e}")
-            print(f"Errore in process_api_queue (WatchlistTab): {e}")
-            if hasattr(self, 'refresh_button'):
-                self.refresh_button.config(state=tk.NORMAL)
-        finally:
-            self.after(100, self.process_api_queue)
\ No newline at end of file
+import tkinter as tk
+from tkinter import ttk, messagebox
+import time
+from datetime import datetime
+
+# Import dell'api_handler come nel price_tab
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import api_handler
+from gui_tabs.dispatcher import get_dispatcher
+from gui_tabs.tree_utils import reconcile_tree
+from gui_tabs.worker_pool import get_worker_pool, PRIORITY_USER, PRIORITY_BACKGROUND
+import config_manager
+
+class WatchlistTab(ttk.Frame):
+    def __init__(self, parent_notebook, *args, **kwargs):
+        super().__init__(parent_notebook, *args, **kwargs)
+        self.padding = kwargs.get('padding', (10, 10, 10, 10))
+
+        self.app_config = config_manager.load_config() # Carica l'intera configurazione
+        
+        # Usa i valori dalla configurazione, con fallback ai default del config_manager
+        # se per qualche motivo non fossero nel file (es. file config vecchio o modificato male).
+        # La lista della watchlist invece viene letta a ogni uso (vedi la proprietà watchlist_ids)
+        self.target_currency = self.app_config.get(
+            "default_vs_currency", 
+            config_manager.DEFAULT_CONFIG["default_vs_currency"]
+        )
+        
+        # --- Aggiornamento automatico ---
+        self.auto_refresh_seconds = self._config_seconds("watchlist_auto_refresh_seconds")
+        self.auto_refresh_max_seconds = max(self.auto_refresh_seconds, self._config_seconds("watchlist_auto_refresh_max_seconds"))
+        self.idle_after_seconds = self._config_seconds("watchlist_idle_after_seconds")
+        self.auto_refresh_interval = self.auto_refresh_seconds # Cresce quando rallentiamo, torna al valore base con dati nuovi
+        self.auto_refresh_after_id = None
+        self.last_seen_update_ts = None # last_updated_at più recente visto nell'ultima risposta
+        self.last_response_time = None  # time.monotonic() dell'ultima risposta ricevuta
+        self.last_user_activity = time.monotonic()
+        self.automatic_fetch = False # True se la richiesta in corso è partita dall'aggiornamento automatico
+        self.auto_refresh_var = tk.BooleanVar(value=bool(self.app_config.get(
+            "watchlist_auto_refresh", config_manager.DEFAULT_CONFIG["watchlist_auto_refresh"])) and self.auto_refresh_seconds > 0)
+
+        self.api_queue = get_dispatcher(self).channel(self.process_api_message) # Risultati consegnati dal dispatcher centrale
+        self.create_widgets()
+
+        # Qualsiasi input nella finestra conta come attività (i binding sulla finestra principale valgono per tutti i widget)
+        toplevel = self.winfo_toplevel()
+        for sequence in ("<Motion>", "<KeyPress>", "<ButtonPress>"):
+            toplevel.bind(sequence, self._on_user_activity, add="+")
+        self.bind("<<TabShown>>", self._on_tab_shown) # Inviato da gui_app quando la scheda torna visibile
+        # Ripristino della finestra ridotta a icona: <<TabShown>> non arriva, quindi riprendiamo da qui
+        toplevel.bind("<Map>", self._on_toplevel_map, add="+")
+
+        self.start_fetch_watchlist_thread(priority=PRIORITY_BACKGROUND) # Carica i dati all'avvio della scheda
+    
+    def _config_seconds(self, key):
+        try:
+            return max(0, int(self.app_config.get(key, config_manager.DEFAULT_CONFIG[key])))
+        except (TypeError, ValueError):
+            return config_manager.DEFAULT_CONFIG[key]
+
+    @property
+    def watchlist_ids(self):
+        """
+        Lista della watchlist dalla configurazione condivisa, letta a ogni uso: se il file è stato
+        modificato da fuori, ConfigStore lo rilegge e mette nel dizionario una lista nuova, e le
+        modifiche della scheda devono finire in quella (non in una copia vecchia che le sovrascriverebbe).
+        """
+        self.app_config = config_manager.load_config() # Stesso dizionario condiviso, aggiornato se il file è cambiato
+        return self.app_config.setdefault("watchlist_ids", list(config_manager.DEFAULT_CONFIG["watchlist_ids"]))
+
+    def add_asset_to_watchlist(self):
+        new_asset_id = self.new_asset_entry.get().strip().lower()
+
+        if not new_asset_id:
+            messagebox.showwarning("Input Vuoto", "Inserisci un ID asset da aggiungere.")
+            return
+
+        watchlist_ids = self.watchlist_ids
+        if new_asset_id in watchlist_ids:
+            messagebox.showinfo("Asset Esistente", f"'{new_asset_id.capitalize()}' è già nella watchlist.")
+            self.new_asset_entry.delete(0, tk.END) # Pulisce l'entry
+            return
+        
+        # Qui potremmo aggiungere una validazione API opzionale per l'asset ID
+        # Ma per ora procediamo direttamente con l'aggiunta
+
+        watchlist_ids.append(new_asset_id) # La lista è quella del dizionario di config condiviso
+
+        # Il salvataggio su disco avviene in background e raggruppa le modifiche ravvicinate
+        if config_manager.schedule_save(self.app_config):
+            messagebox.showinfo("Watchlist Aggiornata", f"'{new_asset_id.capitalize()}' aggiunto alla watchlist e configurazione salvata.")
+            self.new_asset_entry.delete(0, tk.END) # Pulisce l'entry
+            self.start_fetch_watchlist_thread() # Ricarica e aggiorna il Treeview
+        else:
+            messagebox.showerror("Errore Salvataggio", "Impossibile salvare la configurazione aggiornata.")
+            # Rimuovi l'asset aggiunto localmente se il salvataggio fallisce
+            if new_asset_id in watchlist_ids:
+                watchlist_ids.remove(new_asset_id)
+    
+    def remove_selected_from_watchlist(self):
+        selected_iids = self.tree.selection() # Ottiene gli iid degli elementi selezionati
+
+        if not selected_iids:
+            messagebox.showwarning("Nessuna Selezione", "Seleziona uno o più asset da rimuovere dalla watchlist.")
+            return
+
+        assets_removed_count = 0
+        asset_names_removed = []
+        watchlist_ids = self.watchlist_ids
+
+        for item_iid in selected_iids:
+            # Grazie all'uso di iid=asset_id, item_iid è l'ID originale lowercase dell'asset
+            # a meno che non sia una riga di errore (che inizierà con "error_")
+            if item_iid.startswith("error_"): 
+                print(f"Tentativo di rimuovere una riga di errore '{item_iid}', ignorato.")
+                continue # Non rimuovere le righe di errore in questo modo
+
+            if item_iid in watchlist_ids:
+                watchlist_ids.remove(item_iid)
+                assets_removed_count += 1
+                asset_names_removed.append(item_iid.capitalize())
+        
+        if assets_removed_count > 0:
+            if config_manager.schedule_save(self.app_config):
+                removed_names_str = ", ".join(asset_names_removed)
+                messagebox.showinfo("Watchlist Aggiornata", 
+                                    f"{assets_removed_count} asset ({removed_names_str}) rimossi dalla watchlist e configurazione salvata.")
+                self.start_fetch_watchlist_thread() # Ricarica e aggiorna il Treeview
+            else:
+                messagebox.showerror("Errore Salvataggio", "Impossibile salvare la configurazione dopo la rimozione.")
+                # Se il salvataggio fallisce, dovremmo ripristinare self.watchlist_ids? 
+                # Per ora, non lo facciamo per semplicità, ma in un'app reale sarebbe da considerare.
+                # Per ora, ricarichiamo comunque la watchlist per riflettere lo stato attuale di self.watchlist_ids
+                self.start_fetch_watchlist_thread() 
+        else:
+            # Questo caso potrebbe verificarsi se gli iid selezionati non erano più in self.watchlist_ids
+            # o se sono state selezionate solo righe di errore non rimovibili
+            messagebox.showinfo("Nessuna Modifica", "Nessun asset valido selezionato per la rimozione o asset già rimossi.")
+
+    def create_widgets(self):
+        # --- Frame Superiore per Refresh e Status ---
+        top_controls_frame = ttk.Frame(self)
+        top_controls_frame.pack(fill=tk.X, pady=(0,5)) # Leggero padding sotto
+
+        self.refresh_button = ttk.Button(top_controls_frame, text="Aggiorna Watchlist", command=self.start_fetch_watchlist_thread)
+        self.refresh_button.pack(side=tk.LEFT, padx=(0,10))
+        
+        self.auto_refresh_check = ttk.Checkbutton(top_controls_frame, text="Aggiornamento automatico",
+                                                  variable=self.auto_refresh_var, command=self.toggle_auto_refresh)
+        self.auto_refresh_check.pack(side=tk.LEFT, padx=(0,10))
+        if self.auto_refresh_seconds <= 0: # Disattivato da config.json
+            self.auto_refresh_check.config(state=tk.DISABLED)
+
+        self.status_label = ttk.Label(top_controls_frame, text="", font=("Helvetica", 10, "italic"))
+        self.status_label.pack(side=tk.LEFT, padx=10)
+        if not self.app_config.get("watchlist_ids"): 
+            self.status_label.config(text="Watchlist vuota. Aggiungi asset qui sotto.")
+
+        # --- NUOVO: Frame per Aggiungere/Rimuovere Asset ---
+        edit_frame = ttk.Frame(self, padding=(0, 5, 0, 10)) # Padding sopra e sotto
+        edit_frame.pack(fill=tk.X)
+
+        ttk.Label(edit_frame, text="ID Asset da Aggiungere:").pack(side=tk.LEFT, padx=(0,5))
+        self.new_asset_entry = ttk.Entry(edit_frame, width=20)
+        self.new_asset_entry.pack(side=tk.LEFT, padx=(0,10))
+
+        self.add_button = ttk.Button(edit_frame, text="Aggiungi", command=self.add_asset_to_watchlist)
+        self.add_button.pack(side=tk.LEFT, padx=(0,5))
+
+        self.remove_button = ttk.Button(edit_frame, text="Rimuovi Selezionato", command=self.remove_selected_from_watchlist)
+        self.remove_button.pack(side=tk.LEFT, padx=(5,0))
+        # --- FINE NUOVO FRAME ---
+
+        # Treeview per mostrare i dati della watchlist (come prima)
+        columns = ('asset_id', 'price', 'change_24h', 'volume_24h', 'last_updated')
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=15)
+        # ... (configurazione treeview, headings, columns, scrollbar rimane come prima) ...
+        self.tree.heading('asset_id', text='Asset ID')
+        self.tree.heading('price', text=f'Prezzo ({self.target_currency.upper()})')
+        self.tree.heading('change_24h', text='Variazione 24h (%)')
+        self.tree.heading('volume_24h', text=f'Volume 24h ({self.target_currency.upper()})')
+        self.tree.heading('last_updated', text='Ultimo Agg.')
+
+        self.tree.column('asset_id', width=120, anchor=tk.W)
+        self.tree.column('price', width=120, anchor=tk.E)
+        self.tree.column('change_24h', width=150, anchor=tk.E)
+        self.tree.column('volume_24h', width=180, anchor=tk.E)
+        self.tree.column('last_updated', width=150, anchor=tk.CENTER)
+        
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscroll=scrollbar.set)
+        
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    def start_fetch_watchlist_thread(self, priority=PRIORITY_USER, automatic=False):
+        if not automatic: # L'aggiornamento automatico non blocca il pulsante e non cambia lo stato
+            self.refresh_button.config(state=tk.DISABLED)
+            self.status_label.config(text="Aggiornamento watchlist...")
+
+        # La tabella resta visibile durante l'aggiornamento: all'arrivo dei dati cambiano solo le righe diverse
+        self.automatic_fetch = automatic
+        # Pool condiviso: una nuova richiesta di questa scheda annulla quella precedente
+        token = get_worker_pool().submit(self, self.fetch_watchlist_in_thread, self.api_queue, list(self.watchlist_ids), [self.target_currency], priority=priority)
+        if token is None:
+            self.refresh_button.config(state=tk.NORMAL)
+            self.status_label.config(text="Troppe richieste in corso, riprova fra poco.")
+
+    def fetch_watchlist_in_thread(self, q, asset_ids_list, vs_currencies_list):
+        print(f"THREAD WATCHLIST: Richiedo dati per {asset_ids_list} in {vs_currencies_list}...")
+        data = api_handler.get_watchlist_prices(asset_ids_list, vs_currencies_list)
+        q.put(data)
+        print(f"THREAD WATCHLIST: Dati messi in coda: {len(data) if not 'error' in data else 'ERRORE'}")
+
+
+    def process_api_message(self, message):
+        try:
+            current_status_text = "" 
+
+            if isinstance(message, dict) and "error" in message:
+                error_msg = message['error']
+                current_status_text = f"Errore API Watchlist: {error_msg[:70]}"
+                print(f"Errore API Watchlist dalla coda: {error_msg}")
+                if not self.automatic_fetch: # Negli aggiornamenti automatici basta la riga di stato
+                    messagebox.showerror("Errore API Watchlist", f"Impossibile aggiornare la watchlist:\n{error_msg}")
+            elif isinstance(message, dict): 
+                items_processed = 0
+                rows = [] # (iid, valori) nell'ordine della risposta
+                for asset_id, data_by_currency in message.items(): # asset_id qui è già lowercase
+                    items_processed += 1
+                    if "error" in data_by_currency:
+                        # --- MODIFICA QUI: Aggiungi iid anche per le righe di errore ---
+                        rows.append((f"error_{asset_id}", ( # iid univoco per errori
+                            asset_id.capitalize(), 
+                            "Errore", 
+                            data_by_currency['error'][:30], 
+                            "-", 
+                            "-"
+                        )))
+                        continue
+
+                    details = data_by_currency.get(self.target_currency)
+                    if details:
+                        price_str = f"{details.get('price', 'N/D'):,.2f}" if isinstance(details.get('price'), (int, float)) else "N/D"
+                        change_str = f"{details.get('change_24h', 0):.2f}" if isinstance(details.get('change_24h'), (int, float)) else "N/D"
+                        volume_str = f"{details.get('volume_24h', 'N/D'):,.2f}" if isinstance(details.get('volume_24h'), (int, float)) else "N/D"
+                        
+                        # --- MODIFICA QUI: Aggiungi iid=asset_id ---
+                        rows.append((asset_id, ( # Usa l'asset_id originale come iid
+                            asset_id.capitalize(), # Visualizza capitalizzato
+                            price_str,
+                            change_str,
+                            volume_str,
+                            data_by_currency.get('last_updated', 'N/D')
+                        )))
+                        # --- FINE MODIFICA ---
+                # Aggiorna solo le celle cambiate, mantenendo selezione e scorrimento
+                reconcile_tree(self.tree, rows)
+                if items_processed > 0:
+                    current_status_text = f"Watchlist aggiornata alle {datetime.now().strftime('%H:%M:%S')}"
+                else: 
+                    current_status_text = "Nessun dato ricevuto per la watchlist."
+            else: 
+                current_status_text = "Risposta API Watchlist non riconosciuta."
+                messagebox.showwarning("Risposta Sconosciuta", "L'API ha restituito una risposta non prevista per la Watchlist.")
+
+            next_refresh = self._plan_next_auto_refresh(message)
+            if next_refresh is not None and not (isinstance(message, dict) and "error" in message):
+                current_status_text += f" (prossimo aggiornamento fra {next_refresh:.0f}s)"
+            self.status_label.config(text=current_status_text)
+            self.refresh_button.config(state=tk.NORMAL)
+
+        except Exception as e:
+            self.status_label.config(text=f"Errore UI Watchlist: {e}")
+            messagebox.showerror("Errore Interfaccia", f"Si è verificato un errore nell'interfaccia Watchlist:\n{e}")
+            print(f"Errore in process_api_message (WatchlistTab): {e}")
+            if hasattr(self, 'refresh_button'):
+                self.refresh_button.config(state=tk.NORMAL)
+
+    # --- Aggiornamento automatico ---
+
+    def _on_user_activity(self, event=None):
+        self.last_user_activity = time.monotonic()
+
+    def _on_tab_shown(self, event=None):
+        # Se mentre la scheda era nascosta è passato più dell'intervallo, aggiorniamo subito
+        elapsed = time.monotonic() - self.last_response_time if self.last_response_time is not None else 0
+        self.schedule_auto_refresh(max(0, self.auto_refresh_interval - elapsed))
+
+    def _on_toplevel_map(self, event):
+        # Il binding sulla finestra principale riceve anche il <Map> di ogni widget figlio: ci interessa solo il suo
+        if event.widget is not self.winfo_toplevel():
+            return
+        # Dopo il <Map> la scheda diventa visibile solo se è quella selezionata (controllato al primo momento libero)
+        self.after_idle(self._resume_after_restore)
+
+    def _resume_after_restore(self):
+        if self.auto_refresh_after_id is None and self.winfo_viewable():
+            self._on_tab_shown()
+
+    def _is_idle(self):
+        return self.idle_after_seconds > 0 and time.monotonic() - self.last_user_activity > self.idle_after_seconds
+
+    def toggle_auto_refresh(self):
+        self.app_config["watchlist_auto_refresh"] = self.auto_refresh_var.get()
+        config_manager.schedule_save(self.app_config)
+        if self.auto_refresh_var.get():
+            self.auto_refresh_interval = self.auto_refresh_seconds
+            self.schedule_auto_refresh()
+        else:
+            self.cancel_auto_refresh()
+
+    def cancel_auto_refresh(self):
+        if self.auto_refresh_after_id is not None:
+            self.after_cancel(self.auto_refresh_after_id)
+            self.auto_refresh_after_id = None
+
+    def schedule_auto_refresh(self, delay=None):
+        """Programma il prossimo aggiornamento automatico (sostituisce quello già programmato)."""
+        self.cancel_auto_refresh()
+        if not self.auto_refresh_var.get():
+            return
+        if delay is None:
+            delay = self.auto_refresh_interval
+        self.auto_refresh_after_id = self.after(int(delay * 1000), self.auto_refresh_tick)
+
+    def auto_refresh_tick(self):
+        self.auto_refresh_after_id = None
+        if not self.auto_refresh_var.get() or not self.watchlist_ids:
+            return
+        if not self.winfo_viewable():
+            return # Scheda nascosta o finestra ridotta a icona: si riparte con <<TabShown>> o con il <Map> della finestra
+
+        status = api_handler.get_rate_limit_status()
+        if status["queue_depth"] > 0 or status["paused_for"] > 0:
+            # Il limitatore è sotto pressione: saltiamo questo giro e allunghiamo l'intervallo
+            self.auto_refresh_interval = min(self.auto_refresh_max_seconds, self.auto_refresh_interval * 2)
+            self.schedule_auto_refresh(max(self.auto_refresh_interval, status["paused_for"]))
+            return
+        if get_worker_pool().pending_count(self) > 0:
+            self.schedule_auto_refresh() # C'è già una richiesta in corso: la sua risposta riprogramma il timer
+            return
+        self.start_fetch_watchlist_thread(priority=PRIORITY_BACKGROUND, automatic=True)
+
+    def _plan_next_auto_refresh(self, message):
+        """
+        Adatta l'intervallo dopo ogni risposta (automatica o manuale) e programma il prossimo giro.
+        Se last_updated_at non è avanzato i dati a monte sono fermi: raddoppiamo l'intervallo (saltiamo
+        dei giri) fino a auto_refresh_max_seconds; con dati nuovi torniamo all'intervallo base.
+        Anche errori e finestra inattiva allungano l'attesa. Restituisce i secondi di attesa (o None).
+        """
+        self.last_response_time = time.monotonic()
+        if not self.auto_refresh_var.get():
+            return None
+        newest = None
+        if isinstance(message, dict) and "error" not in message:
+            timestamps = [data.get("last_updated_ts") for data in message.values() if isinstance(data, dict)]
+            timestamps = [timestamp for timestamp in timestamps if timestamp]
+            newest = max(timestamps) if timestamps else None
+
+        if newest is None or newest == self.last_seen_update_ts:
+            self.auto_refresh_interval = min(self.auto_refresh_max_seconds, self.auto_refresh_interval * 2)
+        else:
+            self.auto_refresh_interval = self.auto_refresh_seconds
+        if newest is not None:
+            self.last_seen_update_ts = newest
+
+        delay = self.auto_refresh_interval
+        if self._is_idle():
+            delay = self.auto_refresh_max_seconds
+        self.schedule_auto_refresh(delay)
+        return delay
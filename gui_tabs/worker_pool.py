@@ -0,0 +1,141 @@
+import queue
+import threading
+import itertools
+
+WORKER_POOL_SIZE = 4         # Thread fissi condivisi da tutte le schede
+MAX_PENDING_PER_OWNER = 3    # Richieste non ancora concluse (in coda o in esecuzione) per scheda
+
+# Classi di priorità: numero più basso = eseguito prima
+PRIORITY_USER = 0            # Clic dell'utente
+PRIORITY_BACKGROUND = 10     # Caricamenti all'avvio e aggiornamenti automatici
+
+_local = threading.local()
+
+
+class CancelToken:
+    """
+    Segnala a una richiesta in corso che il suo risultato non serve più (es. l'utente ha
+    chiesto un altro asset). Il lavoro già partito non viene interrotto, ma chi lo esegue
+    può controllare 'cancelled' e fermarsi prima della parte costosa; i risultati messi
+    in api_queue da una richiesta annullata vengono scartati dal dispatcher.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class _Task:
+    def __init__(self, owner, function, args, kwargs):
+        self.owner = owner
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.token = CancelToken()
+        self.started = False
+
+
+class WorkerPool:
+    """
+    Pool di thread condiviso per le richieste delle schede, al posto di un nuovo Thread per ogni clic.
+    - Numero fisso di thread: un uso frenetico dell'interfaccia non crea thread senza limite.
+    - Coda a priorità: le richieste dell'utente passano davanti agli aggiornamenti in background.
+    - Ogni richiesta ha un CancelToken; con supersede=True una nuova richiesta della stessa
+      scheda annulla le precedenti, e quelle ancora in coda non vengono nemmeno eseguite.
+    - Al massimo MAX_PENDING_PER_OWNER richieste non concluse per scheda.
+    """
+    def __init__(self, workers=WORKER_POOL_SIZE, max_pending_per_owner=MAX_PENDING_PER_OWNER):
+        self.max_pending_per_owner = max_pending_per_owner
+        self._queue = queue.PriorityQueue() # (priorità, ordine di arrivo, task)
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = {}                  # owner -> lista dei task non conclusi
+        self._threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"gui-worker-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, owner, function, *args, priority=PRIORITY_USER, supersede=True, **kwargs):
+        """
+        Mette in coda function(*args, **kwargs) per conto di 'owner' (di solito la scheda).
+        Restituisce il CancelToken della richiesta, oppure None se la scheda ha già troppe
+        richieste in sospeso (il chiamante deve riabilitare i pulsanti e avvisare l'utente).
+        """
+        task = _Task(owner, function, args, kwargs)
+        with self._lock:
+            tasks = self._pending.setdefault(owner, [])
+            if supersede:
+                for old_task in tasks:
+                    old_task.token.cancel()
+                # Quelle ancora in coda non partiranno: non occupano più un posto
+                tasks[:] = [old_task for old_task in tasks if old_task.started]
+            if len(tasks) >= self.max_pending_per_owner:
+                print(f"WorkerPool: troppe richieste in sospeso per {type(owner).__name__}, richiesta rifiutata.")
+                return None
+            tasks.append(task)
+        self._queue.put((priority, next(self._order), task))
+        return task.token
+
+    def cancel(self, owner):
+        """Annulla tutte le richieste di 'owner' (in coda o in esecuzione)."""
+        with self._lock:
+            tasks = self._pending.get(owner, [])
+            for task in tasks:
+                task.token.cancel()
+            tasks[:] = [task for task in tasks if task.started]
+
+    def pending_count(self, owner):
+        with self._lock:
+            return len(self._pending.get(owner, []))
+
+    def _worker_loop(self):
+        while True:
+            _, _, task = self._queue.get()
+            with self._lock:
+                if task.token.cancelled:
+                    continue # Annullata mentre era in coda: già tolta da _pending
+                task.started = True
+            _local.token = task.token
+            try:
+                task.function(*task.args, **task.kwargs)
+            except Exception as e:
+                print(f"Errore in una richiesta in background ({getattr(task.function, '__name__', task.function)}): {e}")
+            finally:
+                _local.token = None
+                self._finish(task)
+
+    def _finish(self, task):
+        with self._lock:
+            tasks = self._pending.get(task.owner)
+            if tasks is not None and task in tasks:
+                tasks.remove(task)
+                if not tasks:
+                    del self._pending[task.owner]
+
+
+def current_token():
+    """CancelToken della richiesta eseguita dal thread corrente (None fuori dal pool)."""
+    return getattr(_local, "token", None)
+
+def is_cancelled():
+    """True se la richiesta in esecuzione nel thread corrente è stata annullata."""
+    token = current_token()
+    return token is not None and token.cancelled
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_worker_pool():
+    """Restituisce il pool condiviso, avviandolo al primo utilizzo."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool
@@ -0,0 +1,109 @@
+import numpy as np
+from datetime import datetime
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+COLUMNS = ("timestamp", "price", "market_cap", "total_volume")
+
+
+def _value_column(pairs, length):
+    """
+    Estrae la colonna dei valori da una lista di coppie [timestamp, valore] dell'API.
+    La colonna viene allineata per posizione a 'length' elementi: i valori mancanti
+    (lista più corta o null nel JSON) diventano NaN.
+    """
+    column = np.full(length, np.nan, dtype=np.float64)
+    if not pairs:
+        return column
+    try:
+        values = np.asarray(pairs, dtype=np.float64).reshape(-1, 2)[:, 1]
+    except (TypeError, ValueError):
+        # Percorso lento: ci sono dei null o coppie malformate
+        values = np.array([pair[1] if pair[1] is not None else np.nan for pair in pairs], dtype=np.float64)
+    count = min(length, len(values))
+    column[:count] = values[:count]
+    return column
+
+def _to_python(value):
+    """Converte un float NaN in None (come nel JSON originale) e gli scalari numpy in tipi Python."""
+    return None if value != value else value
+
+
+class HistoricalSeries:
+    """
+    Dati storici in forma colonnare: array contigui numpy per timestamp (int64, millisecondi)
+    e per prezzo, market cap e volume (float64, NaN se mancanti).
+    Occupa molta meno memoria della lista di dizionari e si converte direttamente in
+    array per grafici ed esportazioni. Le date in formato testo vengono create solo
+    quando servono (dates(), iter_rows(), to_data_points()).
+    """
+    def __init__(self, timestamp, price, market_cap=None, total_volume=None):
+        self.timestamp = np.ascontiguousarray(timestamp, dtype=np.int64)
+        length = len(self.timestamp)
+        self.price = np.ascontiguousarray(price, dtype=np.float64)
+        self.market_cap = (np.full(length, np.nan) if market_cap is None
+                           else np.ascontiguousarray(market_cap, dtype=np.float64))
+        self.total_volume = (np.full(length, np.nan) if total_volume is None
+                             else np.ascontiguousarray(total_volume, dtype=np.float64))
+
+    @classmethod
+    def from_market_chart(cls, data):
+        """Costruisce la serie dalla risposta di /coins/{id}/market_chart ('prices', 'market_caps', 'total_volumes')."""
+        prices = data.get('prices') or []
+        try:
+            price_pairs = np.asarray(prices, dtype=np.float64).reshape(-1, 2)
+            timestamp = price_pairs[:, 0].astype(np.int64)
+        except (TypeError, ValueError):
+            timestamp = np.array([int(pair[0]) for pair in prices], dtype=np.int64)
+        length = len(timestamp)
+        return cls(
+            timestamp,
+            _value_column(prices, length),
+            _value_column(data.get('market_caps'), length),
+            _value_column(data.get('total_volumes'), length),
+        )
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def columns(self):
+        """Dizionario nome colonna -> array, nell'ordine di COLUMNS."""
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def slice(self, start=None, stop=None):
+        """Sotto-serie per posizione (come series[start:stop]); gli array sono viste, non copie."""
+        return HistoricalSeries(self.timestamp[start:stop], self.price[start:stop],
+                                self.market_cap[start:stop], self.total_volume[start:stop])
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns().values())
+
+    def dates(self, date_format=DATE_FORMAT, start=None, stop=None):
+        """Date formattate (ora locale, come l'API originale) per le righe fra start e stop."""
+        return [datetime.fromtimestamp(timestamp_ms / 1000).strftime(date_format)
+                for timestamp_ms in self.timestamp[start:stop].tolist()]
+
+    def iter_rows(self, chunk_size=10000, date_format=DATE_FORMAT):
+        """
+        Restituisce le righe come tuple (timestamp, date, price, market_cap, total_volume),
+        formattando le date un blocco alla volta: la memoria usata non dipende dalla lunghezza della serie.
+        """
+        for start in range(0, len(self), chunk_size):
+            stop = start + chunk_size
+            rows = zip(self.timestamp[start:stop].tolist(), self.dates(date_format, start, stop),
+                       self.price[start:stop].tolist(), self.market_cap[start:stop].tolist(),
+                       self.total_volume[start:stop].tolist())
+            for timestamp_ms, date_str, price, market_cap, total_volume in rows:
+                yield (timestamp_ms, date_str, _to_python(price), _to_python(market_cap), _to_python(total_volume))
+
+    def to_data_points(self, date_format=DATE_FORMAT):
+        """Vista compatibile con il vecchio formato: lista di dizionari, uno per punto."""
+        return [
+            {"timestamp": timestamp_ms, "date": date_str, "price": price,
+             "market_cap": market_cap, "total_volume": total_volume}
+            for timestamp_ms, date_str, price, market_cap, total_volume in self.iter_rows(date_format=date_format)
+        ]
@@ -0,0 +1,262 @@
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from historical_series import HistoricalSeries
+
+HISTORY_STORE_PATH = "history_store.sqlite3"
+
+DAY_MS = 24 * 60 * 60 * 1000
+HOUR_MS = 60 * 60 * 1000
+
+# Dopo quanto tempo (secondi) l'ultimo punto salvato va considerato vecchio e riscaricato.
+# I punti passati non cambiano mai, ma l'ultimo (la giornata/ora in corso) sì.
+STORE_MAX_AGE = {
+    "daily": 3600,
+}
+STORE_DEFAULT_MAX_AGE = 300
+# Con la sincronizzazione incrementale non richiediamo la coda se l'ultima è di meno di così (secondi)
+STORE_SYNC_MIN_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS market_chart (
+    asset_id TEXT NOT NULL,
+    vs_currency TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    price REAL,
+    market_cap REAL,
+    total_volume REAL,
+    PRIMARY KEY (asset_id, vs_currency, granularity, timestamp)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS coverage (
+    asset_id TEXT NOT NULL,
+    vs_currency TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    first_timestamp INTEGER NOT NULL,
+    last_timestamp INTEGER NOT NULL,
+    full_history INTEGER NOT NULL DEFAULT 0,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (asset_id, vs_currency, granularity)
+);
+"""
+
+
+def granularity_step_ms(granularity):
+    """Distanza attesa fra due punti per una granularità ('daily' -> un giorno, altrimenti un'ora)."""
+    return DAY_MS if granularity == "daily" else HOUR_MS
+
+
+class HistoryStore:
+    """
+    Archivio locale (SQLite) dei dati storici restituiti da get_historical_market_data,
+    indicizzato per asset, valuta e granularità ('daily', 'hourly', ...).
+    Oltre ai punti, per ogni serie tiene la "copertura": primo e ultimo timestamp salvati,
+    se contiene tutta la storia ('max') e quando è stata aggiornata l'ultima volta.
+    Ogni operazione apre la propria connessione, quindi l'archivio si può usare da più thread.
+    """
+    def __init__(self, path=HISTORY_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock() # Una scrittura alla volta (SQLite ha un solo writer)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL") # I lettori non bloccano lo scrittore
+        return conn
+
+    def save(self, asset_id, vs_currency, granularity, series, full_history=False):
+        """
+        Salva i punti della serie al posto di quelli già presenti dal suo primo timestamp in poi e aggiorna
+        la copertura. La serie arriva da uno scaricamento completo fino ad adesso: i punti salvati in quel
+        periodo che non ci sono più (candele parziali di un aggiornamento precedente) vanno tolti.
+        """
+        if len(series) == 0:
+            return
+        rows = zip([asset_id] * len(series), [vs_currency] * len(series), [granularity] * len(series),
+                   series.timestamp.tolist(), series.price.tolist(),
+                   series.market_cap.tolist(), series.total_volume.tolist())
+        first_timestamp = int(series.timestamp.min())
+        last_timestamp = int(series.timestamp.max())
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn: # Transazione unica: o tutto o niente
+                    conn.execute(
+                        "DELETE FROM market_chart WHERE asset_id = ? AND vs_currency = ? AND granularity = ? "
+                        "AND timestamp >= ?", (asset_id, vs_currency, granularity, first_timestamp))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO market_chart VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                    conn.execute(
+                        """
+                        INSERT INTO coverage VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (asset_id, vs_currency, granularity) DO UPDATE SET
+                            first_timestamp = MIN(first_timestamp, excluded.first_timestamp),
+                            last_timestamp = excluded.last_timestamp,
+                            full_history = MAX(full_history, excluded.full_history),
+                            fetched_at = excluded.fetched_at
+                        """,
+                        (asset_id, vs_currency, granularity, first_timestamp, last_timestamp,
+                         int(bool(full_history)), time.time()))
+            finally:
+                conn.close()
+
+    def query(self, asset_id, vs_currency, granularity, start_ms=None, end_ms=None):
+        """Restituisce i punti salvati fra start_ms e end_ms (inclusi) come HistoricalSeries ordinata."""
+        sql = ("SELECT timestamp, price, market_cap, total_volume FROM market_chart "
+               "WHERE asset_id = ? AND vs_currency = ? AND granularity = ?")
+        args = [asset_id, vs_currency, granularity]
+        if start_ms is not None:
+            sql += " AND timestamp >= ?"
+            args.append(int(start_ms))
+        if end_ms is not None:
+            sql += " AND timestamp <= ?"
+            args.append(int(end_ms))
+        sql += " ORDER BY timestamp"
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return HistoricalSeries.empty()
+        # I NULL di SQLite (valori mancanti) diventano NaN grazie al dtype float64
+        values = np.array(rows, dtype=np.float64)
+        timestamps = np.array([row[0] for row in rows], dtype=np.int64) # Senza passare da float: niente perdita di precisione
+        return HistoricalSeries(timestamps, values[:, 1], values[:, 2], values[:, 3])
+
+    def coverage(self, asset_id, vs_currency, granularity):
+        """Copertura della serie salvata (dizionario) o None se non c'è nulla."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT first_timestamp, last_timestamp, full_history, fetched_at FROM coverage "
+                "WHERE asset_id = ? AND vs_currency = ? AND granularity = ?",
+                (asset_id, vs_currency, granularity)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {"first_timestamp": row[0], "last_timestamp": row[1],
+                "full_history": bool(row[2]), "fetched_at": row[3]}
+
+    def replace_tail(self, asset_id, vs_currency, granularity, after_ms, series):
+        """
+        Sostituisce tutti i punti successivi ad after_ms con quelli di 'series' (sincronizzazione incrementale):
+        le candele parziali della giornata in corso vengono sovrascritte invece di essere duplicate.
+        """
+        rows = zip([asset_id] * len(series), [vs_currency] * len(series), [granularity] * len(series),
+                   series.timestamp.tolist(), series.price.tolist(),
+                   series.market_cap.tolist(), series.total_volume.tolist())
+        key = (asset_id, vs_currency, granularity)
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "DELETE FROM market_chart WHERE asset_id = ? AND vs_currency = ? AND granularity = ? "
+                        "AND timestamp > ?", key + (int(after_ms),))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO market_chart VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                    conn.execute(
+                        """
+                        UPDATE coverage SET
+                            last_timestamp = (SELECT MAX(timestamp) FROM market_chart
+                                              WHERE asset_id = ? AND vs_currency = ? AND granularity = ?),
+                            fetched_at = ?
+                        WHERE asset_id = ? AND vs_currency = ? AND granularity = ?
+                        """,
+                        key + (time.time(),) + key)
+            finally:
+                conn.close()
+
+    @staticmethod
+    def covers(coverage, granularity, days):
+        """True se la copertura salvata include tutto il periodo richiesto (ultimi 'days' giorni o 'max')."""
+        if coverage is None:
+            return False
+        if coverage["full_history"]:
+            return True
+        if str(days) == "max":
+            return False
+        start_ms = int(time.time() * 1000) - int(float(days) * DAY_MS)
+        # Il primo punto restituito dall'API può cadere fino a un passo dopo l'inizio richiesto
+        return coverage["first_timestamp"] <= start_ms + granularity_step_ms(granularity)
+
+    def load_period(self, asset_id, vs_currency, granularity, days):
+        """Punti salvati degli ultimi 'days' giorni (tutti, se days='max')."""
+        if str(days) == "max":
+            return self.query(asset_id, vs_currency, granularity)
+        start_ms = int(time.time() * 1000) - int(float(days) * DAY_MS)
+        return self.query(asset_id, vs_currency, granularity, start_ms=start_ms)
+
+    def load_if_covered(self, asset_id, vs_currency, granularity, days, max_age=None):
+        """
+        Restituisce la serie degli ultimi 'days' giorni (o tutta, se days='max') solo se l'archivio
+        la copre interamente ed è stata aggiornata da meno di max_age secondi; altrimenti None.
+        """
+        coverage = self.coverage(asset_id, vs_currency, granularity)
+        if not self.covers(coverage, granularity, days):
+            return None
+        if max_age is None:
+            max_age = STORE_MAX_AGE.get(granularity, STORE_DEFAULT_MAX_AGE)
+        if time.time() - coverage["fetched_at"] > max_age:
+            return None
+        return self.load_period(asset_id, vs_currency, granularity, days)
+
+
+def last_complete_timestamp(last_timestamp, granularity):
+    """
+    Inizio dell'ultima candela completa che contiene last_timestamp (mezzanotte UTC per 'daily',
+    inizio dell'ora altrimenti). I punti salvati dopo questo istante sono candele parziali.
+    """
+    step = granularity_step_ms(granularity)
+    return (int(last_timestamp) // step) * step
+
+def resample_tail(series, granularity, after_ms):
+    """
+    Riporta i punti scaricati con /market_chart/range (che per pochi giorni sono orari)
+    alla granularità salvata: per ogni candela completa successiva ad after_ms si prende il primo
+    punto della candela, con il timestamp allineato all'inizio della candela (come fa l'API per
+    'daily'); l'ultimo punto, se cade a metà candela, viene aggiunto come candela parziale.
+    """
+    if len(series) == 0:
+        return series
+    step = granularity_step_ms(granularity)
+    buckets = series.timestamp // step
+    unique_buckets, first_indices = np.unique(buckets, return_index=True)
+    keep = unique_buckets * step > after_ms
+    unique_buckets, first_indices = unique_buckets[keep], first_indices[keep]
+
+    timestamps = unique_buckets * step
+    indices = first_indices
+    last_index = len(series) - 1
+    if series.timestamp[last_index] > after_ms and series.timestamp[last_index] % step != 0:
+        timestamps = np.append(timestamps, series.timestamp[last_index])
+        indices = np.append(indices, last_index)
+    return HistoricalSeries(timestamps, series.price[indices], series.market_cap[indices], series.total_volume[indices])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_history_store():
+    """Archivio condiviso, creato (insieme al file) al primo utilizzo."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
+
+def configure_history_store(path=HISTORY_STORE_PATH):
+    """Sostituisce l'archivio condiviso con uno salvato in 'path' (es. un file indicato da riga di comando)."""
+    global _store
+    with _store_lock:
+        _store = HistoryStore(path)
+        return _store
@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import DAY_MS, HOUR_MS, HistoryStore
+from historical_series import HistoricalSeries
+
+
+def daily_series(days, partial_hours):
+    """'days' candele giornaliere complete più la candela parziale di oggi dopo 'partial_hours' ore."""
+    timestamps = [day * DAY_MS for day in range(days)] + [days * DAY_MS + int(partial_hours * HOUR_MS)]
+    prices = np.arange(len(timestamps), dtype=np.float64) + 100.0
+    return HistoricalSeries(timestamps, prices, prices * 10, prices * 2)
+
+
+class HistoryStoreSaveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(os.path.join(self.tmpdir.name, "store.sqlite3"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_refetch_replaces_moved_partial_candle(self):
+        self.store.save("bitcoin", "usd", "daily", daily_series(6, 8.27))
+        refetched = daily_series(6, 9.27)
+        self.store.save("bitcoin", "usd", "daily", refetched)
+
+        stored = self.store.query("bitcoin", "usd", "daily")
+        self.assertEqual(len(stored), 7)
+        np.testing.assert_array_equal(stored.timestamp, refetched.timestamp)
+        self.assertEqual(self.store.coverage("bitcoin", "usd", "daily")["last_timestamp"],
+                         int(refetched.timestamp[-1]))
+
+    def test_refetch_of_shorter_period_keeps_older_points(self):
+        self.store.save("bitcoin", "usd", "daily", daily_series(6, 8.27), full_history=True)
+        recent = daily_series(6, 9.27)
+        recent = HistoricalSeries(recent.timestamp[3:], recent.price[3:], recent.market_cap[3:], recent.total_volume[3:])
+        self.store.save("bitcoin", "usd", "daily", recent)
+
+        stored = self.store.query("bitcoin", "usd", "daily")
+        self.assertEqual(len(stored), 7)
+        self.assertEqual(int(stored.timestamp[0]), 0)
+        self.assertEqual(int(stored.timestamp[-1]), int(recent.timestamp[-1]))
+        self.assertTrue(self.store.coverage("bitcoin", "usd", "daily")["full_history"])
+
+
+if __name__ == "__main__":
+    unittest.main()